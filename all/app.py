@@ -1,253 +1,563 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import sqlite3
-import hashlib
-import secrets
-from datetime import datetime
-from typing import Optional, Dict, Any
-
-app = Flask(__name__)
-CORS(app)  # Разрешаем запросы от фронтенда
-
-class BreastCancerDB:
-    def __init__(self, db_name='breast_cancer_database.db'):
-        self.connection = sqlite3.connect(db_name, check_same_thread=False)
-        self.connection.row_factory = sqlite3.Row
-        self.cursor = self.connection.cursor()
-        self._create_tables()
-    
-    def _create_tables(self):
-        # Создаем таблицу для пациентов
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS patients (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_code TEXT UNIQUE NOT NULL,
-            age INTEGER CHECK (age BETWEEN 0 AND 120),
-            gender TEXT CHECK (gender IN ('Мужской', 'Женский', 'Male', 'Female')),
-            weight REAL CHECK (weight BETWEEN 1 AND 700),
-            height INTEGER CHECK (height BETWEEN 20 AND 300),
-            cancer_type TEXT NOT NULL,
-            cancer_stage TEXT CHECK (cancer_stage IN ('1', '2', '3')),
-            initial_tumor_size REAL CHECK (initial_tumor_size BETWEEN 0.01 AND 20),
-            distant_metastases_count INTEGER DEFAULT 0,
-            treatment_type TEXT,
-            menopausal_status TEXT,
-            histological_grading TEXT CHECK (histological_grading IN ('G1', 'G2', 'G3', 'G4')),
-            ecog INTEGER CHECK (ecog BETWEEN 0 AND 4),
-            er_status BOOLEAN,
-            pr_status BOOLEAN,
-            her2_status BOOLEAN,
-            ki67 REAL,
-            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        # Таблица динамики опухоли
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS tumor_dynamics (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_code TEXT NOT NULL,
-            measurement_date DATE DEFAULT CURRENT_DATE,
-            tumor_size REAL NOT NULL,
-            measurement_type TEXT CHECK (measurement_type IN ('before', '3m', '6m', '12m', '24m')),
-            FOREIGN KEY (patient_code) REFERENCES patients(patient_code) ON DELETE CASCADE,
-            UNIQUE(patient_code, measurement_type)
-        )
-        ''')
-        
-        # Таблица результатов лечения
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS treatment_results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_code TEXT NOT NULL,
-            survival_months REAL CHECK (survival_months >= 0),
-            performance_status INTEGER CHECK (performance_status BETWEEN 0 AND 4),
-            treatment_response TEXT,
-            distant_metastases_count INTEGER DEFAULT 0,
-            created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_code) REFERENCES patients(patient_code) ON DELETE CASCADE
-        )
-        ''')
-        
-        # Индексы для ускорения поиска
-        self.cursor.executescript('''
-        CREATE INDEX IF NOT EXISTS idx_patients_code ON patients(patient_code);
-        CREATE INDEX IF NOT EXISTS idx_patients_stage ON patients(cancer_stage);
-        CREATE INDEX IF NOT EXISTS idx_tumor_patient ON tumor_dynamics(patient_code);
-        CREATE INDEX IF NOT EXISTS idx_results_patient ON treatment_results(patient_code);
-        ''')
-        
-        self.connection.commit()
-
-    def create_patient_code(self, patient_data: Dict[str, Any]) -> str:
-        """Создание уникального кода пациента"""
-        medical_info = f"{patient_data['age']}_{patient_data['cancer_type']}_{patient_data.get('cancer_stage', 'Unknown')}"
-        random_part = secrets.token_hex(4)
-        full_string = f"{medical_info}_{random_part}_{datetime.now().timestamp()}"
-        patient_hash = hashlib.sha256(full_string.encode()).hexdigest()[:8]
-        return f"BC_{patient_hash.upper()}"
-
-    def add_patient(self, patient_info: Dict[str, Any]) -> Optional[str]:
-        """Добавление нового пациента"""
-        try:
-            patient_code = self.create_patient_code(patient_info)
-            
-            self.cursor.execute('''
-                INSERT INTO patients (
-                    patient_code, age, gender, weight, height, cancer_type, cancer_stage,
-                    initial_tumor_size, distant_metastases_count, histological_grading, ecog,
-                    menopausal_status, treatment_type, er_status, pr_status, her2_status, ki67
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                patient_code,
-                patient_info.get('age'),
-                patient_info.get('gender', 'Женский'),
-                patient_info.get('weight'),
-                patient_info.get('height'),
-                patient_info.get('cancer_type'),
-                patient_info.get('cancer_stage'),
-                patient_info.get('initial_tumor_size'),
-                patient_info.get('distant_metastases_count', 0),
-                patient_info.get('histological_grading', 'G2'),
-                patient_info.get('ecog', 0),
-                patient_info.get('menopausal_status'),
-                patient_info.get('treatment_type'),
-                patient_info.get('er_status'),
-                patient_info.get('pr_status'),
-                patient_info.get('her2_status'),
-                patient_info.get('ki67')
-            ))
-            
-            self.connection.commit()
-            print(f"Пациент добавлен со стадией: {patient_info.get('cancer_stage')}")
-            return patient_code
-            
-        except sqlite3.Error as e:
-            print(f"Ошибка при добавлении пациента: {e}")
-            self.connection.rollback()
-            return None
-
-    def get_all_patients(self, limit: int = 100) -> list:
-        """Получение списка всех пациентов"""
-        self.cursor.execute('SELECT * FROM patients ORDER BY created_date DESC LIMIT ?', (limit,))
-        return [dict(row) for row in self.cursor.fetchall()]
-
-    def get_stage_statistics(self) -> Dict:
-        """Статистика по стадиям рака"""
-        self.cursor.execute('''
-            SELECT cancer_stage, COUNT(*) as count 
-            FROM patients 
-            GROUP BY cancer_stage 
-            ORDER BY cancer_stage
-        ''')
-        stats = {row['cancer_stage']: row['count'] for row in self.cursor.fetchall()}
-        
-        for stage in ['1', '2', '3']:
-            if stage not in stats:
-                stats[stage] = 0
-                
-        return stats
-
-    def close(self):
-        """Закрытие соединения с бд"""
-        self.connection.close()
-
-# Инициализация базы данных
-db = BreastCancerDB()
-
-# API endpoints
-@app.route('/api/patients', methods=['POST'])
-def add_patient():
-    try:
-        data = request.json
-        print("Получены данные пациента:", data)
-        
-        # Преобразуем данные из фронтенда в формат БД
-        patient_data = {
-            'age': data.get('age'),
-            'gender': 'Женский' if data.get('sex') == 'female' else 'Мужской',
-            'weight': data.get('weight'),
-            'height': data.get('height'),
-            'cancer_type': data.get('molecular_subtype', {}).get('code', 'Unknown'),
-            'cancer_stage': data.get('cancer_stage'),
-            'initial_tumor_size': data.get('tumour_size_cm'),
-            'distant_metastases_count': data.get('distant_metastasis_count', 0),
-            'histological_grading': 'G2',
-            'ecog': 0,
-            'menopausal_status': data.get('menopause_status'),
-            'treatment_type': data.get('recommended_treatment', {}).get('therapy_type', 'unknown'),
-            'er_status': data.get('ER_status'),
-            'pr_status': data.get('PR_status'),
-            'her2_status': data.get('HER2_status'),
-            'ki67': data.get('ki67')
-        }
-        
-        patient_code = db.add_patient(patient_data)
-        
-        if patient_code:
-            return jsonify({
-                'success': True,
-                'patient_code': patient_code,
-                'message': 'Пациент успешно добавлен в базу данных'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': 'Ошибка при добавлении пациента в базу данных'
-            }), 400
-            
-    except Exception as e:
-        print(f"Ошибка при добавлении пациента: {str(e)}")
-        return jsonify({
-            'success': False,
-            'message': f'Ошибка сервера: {str(e)}'
-        }), 500
-
-@app.route('/api/patients', methods=['GET'])
-def get_patients():
-    try:
-        patients = db.get_all_patients()
-        return jsonify({
-            'success': True,
-            'patients': patients
-        })
-    except Exception as e:
-        print(f"Ошибка при получении пациентов: {str(e)}")
-        return jsonify({
-            'success': False,
-            'message': f'Ошибка при получении пациентов: {str(e)}'
-        }), 500
-
-@app.route('/api/stage-statistics', methods=['GET'])
-def get_stage_statistics():
-    try:
-        stats = db.get_stage_statistics()
-        return jsonify({
-            'success': True,
-            'statistics': stats
-        })
-    except Exception as e:
-        print(f"Ошибка при получении статистики: {str(e)}")
-        return jsonify({
-            'success': False,
-            'message': f'Ошибка при получении статистики: {str(e)}'
-        }), 500
-
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Проверка работоспособности API"""
-    return jsonify({
-        'success': True,
-        'message': 'API работает корректно',
-        'timestamp': datetime.now().isoformat()
-    })
-
-if __name__ == '__main__':
-    print("Запуск сервера Breast Cancer API...")
-    print("API доступно по адресу: http://localhost:5000")
-    print("Доступные endpoints:")
-    print("  POST /api/patients - добавление пациента")
-    print("  GET  /api/patients - получение списка пациентов")
-    print("  GET  /api/health - проверка работоспособности")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+"""
+WSGI-вариант API (Flask).
+
+Запуск:  python app.py
+         gunicorn -w 4 --preload 'app:create_app()'
+
+Импорт модуля ничего не открывает и не загружает: миграции схемы, модель
+прогноза и numpy – в create_app(). С --preload это происходит один раз
+в мастере, и воркеры делят модули и массивы модели (copy-on-write);
+соединения SQLite и поток write-behind каждый воркер открывает сам.
+"""
+from flask import Blueprint, Flask, request, jsonify, Response, stream_with_context, g, current_app
+from flask_cors import CORS
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Iterator, Optional
+
+from database import (
+    BreastCancerDB, coerce_patient_row, patient_from_frontend,
+    MEASUREMENT_TYPES, PATIENTS_PAGE_MAX
+)
+from http_cache import (
+    COMPRESS_MIN_SIZE, cache_headers, choose_encoding, compress, compressible, is_not_modified, json_dumps
+)
+from metrics import (
+    REGISTRY, CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, register_cache_metrics
+)
+from sqlite_pool import PoolExhaustedError
+from structured_log import get_logger, log_event, log_request
+
+DB_NAME = os.environ.get('BREAST_CANCER_DB', 'breast_cancer_database.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# через сколько секунд клиенту повторить запрос, если пул соединений исчерпан (503)
+DB_POOL_RETRY_AFTER = int(os.environ.get('DB_POOL_RETRY_AFTER', 1))
+
+logger = get_logger('api')
+
+api = Blueprint('api', __name__)
+
+
+def create_app(db_name: str = DB_NAME, model_dir: Optional[str] = None) -> Flask:
+    """
+    Приложение с базой и моделью прогноза. Модель загружается один раз
+    на процесс, кэш прогнозов сбрасывается при загрузке модели другой версии.
+    """
+    # numpy и артефакты модели – только здесь, а не при импорте модуля
+    from model_service import MODEL_DIR, TumorModel, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL
+    from prediction_cache import PredictionCache
+
+    app = Flask(__name__)
+    CORS(app)  # Разрешаем запросы от фронтенда
+
+    prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+    register_cache_metrics(prediction_cache)
+    try:
+        tumor_model = TumorModel.load(model_dir or MODEL_DIR, cache=prediction_cache)
+    except (OSError, ValueError, KeyError) as e:
+        log_event(logger, 'model_not_loaded', level=logging.WARNING, error=str(e))
+        tumor_model = None
+
+    app.extensions['api'] = SimpleNamespace(
+        db=BreastCancerDB(db_name, pool_size=DB_POOL_SIZE),
+        tumor_model=tumor_model,
+        prediction_cache=prediction_cache,
+    )
+    app.register_blueprint(api)
+    return app
+
+
+def __getattr__(name):
+    # `gunicorn app:app`, `flask --app app` и `from app import app` – приложение по умолчанию
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()['app'] = create_app()
+    return globals()['app']
+
+
+def _state() -> SimpleNamespace:
+    """База, модель и кэш текущего приложения (как app.state в asgi_app)"""
+    return current_app.extensions['api']
+
+
+# Метрики и журнал запросов: метка endpoint – шаблон маршрута, а не сам URL
+@api.before_app_request
+def start_request_timer():
+    g.endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.started = time.perf_counter()
+    HTTP_REQUESTS_IN_FLIGHT.inc(request.method, g.endpoint)
+
+@api.after_app_request
+def remember_status(response):
+    g.status = response.status_code
+    return response
+
+@api.after_app_request
+def compress_response(response):
+    # потоковые ответы (ndjson) не трогаем: тело пришлось бы собрать в памяти
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers or not compressible(response.mimetype)):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+@api.teardown_app_request
+def finish_request_timer(exc):
+    # при потоковом ответе (stream_with_context) teardown вызывается дважды
+    started = g.pop('started', None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    status = 500 if exc is not None else g.get('status', 500)
+    HTTP_REQUESTS_IN_FLIGHT.dec(request.method, g.endpoint)
+    HTTP_REQUEST_DURATION.observe(duration, request.method, g.endpoint, status)
+    log_request(logger, request.method, g.endpoint, status, duration)
+
+def _json_response(payload, headers: Optional[dict] = None, status: int = 200) -> Response:
+    """Как jsonify, но через http_cache.json_dumps (orjson, если установлен) – для длинных списков строк"""
+    return Response(json_dumps(payload), status=status, headers=headers, mimetype='application/json')
+
+
+def _server_error(e: Exception, message: str = 'Ошибка сервера') -> tuple:
+    """
+    Ответ на непредвиденную ошибку обработчика: 503 с Retry-After, если все
+    соединения пула заняты (перегрузка, запрос можно повторить), иначе 500
+    """
+    log_event(logger, 'request_failed', level=logging.ERROR, exc_info=True,
+              endpoint=request.path, error=str(e))
+    if isinstance(e, PoolExhaustedError):
+        return jsonify({
+            'success': False,
+            'message': f'Сервер перегружен, повторите запрос: {str(e)}'
+        }), 503, {'Retry-After': str(DB_POOL_RETRY_AFTER)}
+    return jsonify({
+        'success': False,
+        'message': f'{message}: {str(e)}'
+    }), 500
+
+
+def _cache_validators(table: str = 'patients') -> tuple:
+    """
+    Заголовки ETag/Last-Modified по счётчику изменений table и готовый ответ 304,
+    если у клиента актуальная версия (иначе None). Версия читается до запроса
+    данных: запись между ними даст клиенту старый ETag и лишний 200 в следующий раз,
+    но не устаревший 304.
+    """
+    version, modified = _state().db.get_data_version(table)
+    headers = cache_headers(version, modified)
+    if is_not_modified(request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since'),
+                       version, modified):
+        return headers, Response(status=304, headers=headers)
+    return headers, None
+
+
+# API endpoints
+@api.route('/api/patients', methods=['POST'])
+def add_patient():
+    db = _state().db
+    try:
+        data = request.json
+        patient_data = patient_from_frontend(data)
+        
+        patient_code = db.add_patient(patient_data)
+        
+        if patient_code:
+            return jsonify({
+                'success': True,
+                'patient_code': patient_code,
+                'message': 'Пациент успешно добавлен в базу данных'
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'message': 'Ошибка при добавлении пациента в базу данных'
+            }), 400
+            
+    except Exception as e:
+        return _server_error(e, 'Ошибка сервера')
+
+def _coerce_bulk_row(row: Any) -> Any:
+    if not isinstance(row, dict):
+        return row
+    try:
+        return coerce_patient_row(row)
+    except ValueError as e:
+        return e
+
+
+def _body_lines() -> Iterator[Any]:
+    """
+    Строки тела запроса по мере чтения, декодированные из UTF-8 по одной:
+    строка с битыми байтами – ValueError вместо неё, а не исключение на весь поток
+    """
+    for number, raw in enumerate(request.stream, 1):
+        try:
+            yield raw.decode('utf-8')
+        except UnicodeDecodeError as e:
+            yield ValueError(f'Строка {number} тела запроса не в UTF-8: {e}')
+
+
+def _iter_bulk_rows() -> Iterator[Any]:
+    """
+    Строки пациентов из тела запроса: JSON-массив, NDJSON (построчно из потока)
+    или CSV с заголовком (тоже потоково). Нераспознанная строка отдаётся как есть,
+    а ошибка приведения типов или кодировки – как ValueError: add_patients вернёт
+    ошибку только этой строке, и уже записанные пачки не теряют своих кодов в ответе.
+    Испорченный CSV дочитывается до места ошибки, она – последняя строка ответа.
+    """
+    content_type = (request.mimetype or '').lower()
+
+    if content_type in ('application/x-ndjson', 'application/jsonl', 'application/ndjson'):
+        for line in _body_lines():
+            if isinstance(line, ValueError):
+                yield line
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                yield line
+                continue
+            yield _coerce_bulk_row(row)
+
+    elif content_type == 'text/csv':
+        # запись CSV может занимать несколько строк, поэтому после битой строки
+        # разбор останавливается: следующие записи уже не выровнены
+        tail = []
+
+        def text_lines():
+            for line in _body_lines():
+                if isinstance(line, ValueError):
+                    tail.append(line)
+                    return
+                yield line
+
+        try:
+            for row in csv.DictReader(text_lines()):
+                yield _coerce_bulk_row(row)
+        except csv.Error as e:
+            tail.append(ValueError(f'Ошибка разбора CSV: {e}'))
+        yield from tail
+
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('patients')
+        if not isinstance(data, list):
+            raise ValueError('Ожидается JSON-массив пациентов, NDJSON или CSV')
+        for row in data:
+            yield _coerce_bulk_row(row)
+
+
+@api.route('/api/patients/bulk', methods=['POST'])
+def add_patients_bulk():
+    """Массовая загрузка пациентов (поля в формате таблицы patients)"""
+    db = _state().db
+    try:
+        results = db.add_patients(_iter_bulk_rows())
+        inserted = sum(1 for r in results if r['patient_code'])
+        log_event(logger, 'bulk_insert', inserted=inserted, failed=len(results) - inserted)
+        return jsonify({
+            'success': True,
+            'inserted': inserted,
+            'failed': len(results) - inserted,
+            'results': results
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return _server_error(e, 'Ошибка сервера')
+
+@api.route('/api/patients', methods=['GET'])
+def get_patients():
+    """
+    Список пациентов, новые сначала.
+    ?limit=&cursor= – постраничный режим (next_cursor в ответе),
+    ?format=ndjson – потоковая выгрузка всех пациентов по строке JSON.
+    """
+    db = _state().db
+    try:
+        cursor = request.args.get('cursor') or None
+        if cursor is not None:
+            db.decode_cursor(cursor)
+
+        if request.args.get('format') == 'ndjson':
+            def generate():
+                for patient in db.iter_patients(after=cursor):
+                    yield json.dumps(patient, ensure_ascii=False) + '\n'
+
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+        headers, not_modified = _cache_validators('patients')
+        if not_modified is not None:
+            return not_modified
+
+        limit = min(max(request.args.get('limit', 100, type=int), 1), PATIENTS_PAGE_MAX)
+        patients, next_cursor = db.get_patients_page(limit, after=cursor)
+        return _json_response({
+            'success': True,
+            'patients': patients,
+            'next_cursor': next_cursor
+        }, headers)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return _server_error(e, 'Ошибка при получении пациентов')
+
+@api.route('/api/patients/<patient_code>/measurements', methods=['POST'])
+def add_measurements(patient_code):
+    """
+    Измерения опухоли с произвольными датами: JSON-массив
+    [{"measurement_date": "2024-03-15", "tumor_size": 2.1}, ...] или {"measurements": [...]}
+    """
+    db = _state().db
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('measurements')
+        if not isinstance(data, list) or not all(isinstance(m, dict) for m in data):
+            raise ValueError('Ожидается JSON-массив измерений')
+
+        written = db.add_tumor_series({**m, 'patient_code': patient_code} for m in data)
+        return jsonify({
+            'success': True,
+            'patient_code': patient_code,
+            'added': written
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return _server_error(e, 'Ошибка сервера')
+
+@api.route('/api/patients/<patient_code>/measurements', methods=['GET'])
+def get_measurements(patient_code):
+    """Ряд измерений пациента; ?from=&to= – диапазон дат (включительно)"""
+    db = _state().db
+    try:
+        series = db.get_tumor_series(patient_code, request.args.get('from'), request.args.get('to'))
+        if series is None:
+            return jsonify({
+                'success': False,
+                'message': 'Измерений пациента не найдено'
+            }), 404
+        return jsonify({'success': True, **series})
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return _server_error(e, 'Ошибка при получении измерений')
+
+@api.route('/api/stage-statistics', methods=['GET'])
+def get_stage_statistics():
+    db = _state().db
+    try:
+        headers, not_modified = _cache_validators('patients')
+        if not_modified is not None:
+            return not_modified
+
+        stats = db.get_stage_statistics()
+        return _json_response({
+            'success': True,
+            'statistics': stats
+        }, headers)
+    except Exception as e:
+        return _server_error(e, 'Ошибка при получении статистики')
+
+@api.route('/api/statistics', methods=['GET'])
+def get_statistics():
+    """Число пациентов по стадии, типу рака и типу лечения"""
+    db = _state().db
+    try:
+        headers, not_modified = _cache_validators('patients')
+        if not_modified is not None:
+            return not_modified
+
+        return _json_response({
+            'success': True,
+            'statistics': db.get_patient_counts()
+        }, headers)
+    except Exception as e:
+        return _server_error(e, 'Ошибка при получении статистики')
+
+@api.route('/api/analytics/response-curves', methods=['GET'])
+def get_response_curves():
+    """Кривые размера опухоли и доли ответа по ?group_by=cancer_stage|cancer_type|treatment_type"""
+    db = _state().db
+    try:
+        curves = db.get_response_curves(request.args.get('group_by', 'cancer_stage'))
+        return jsonify({
+            'success': True,
+            'measurement_types': list(MEASUREMENT_TYPES),
+            'curves': curves
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return _server_error(e, 'Ошибка при расчёте кривых ответа')
+
+@api.route('/api/predict', methods=['POST'])
+def predict():
+    tumor_model = _state().tumor_model
+    if tumor_model is None:
+        return jsonify({
+            'success': False,
+            'message': 'Модель прогноза не загружена'
+        }), 503
+
+    try:
+        data = request.get_json(silent=True) or {}
+        patient = data.get('patient') or {}
+
+        missing = tumor_model.missing_fields(patient)
+        if missing:
+            return jsonify({
+                'success': False,
+                'message': f"Не хватает полей: {', '.join(missing)}"
+            }), 400
+
+        with_intervals = bool(data.get('intervals'))
+        if with_intervals and tumor_model.interval_sampler is None:
+            return jsonify({
+                'success': False,
+                'message': 'Модель экспортирована без распределений для интервалов'
+            }), 503
+
+        grid = dict(
+            t_grid=data.get('times'),
+            t_end=float(data.get('t_end', 36.0)),
+            dt=float(data.get('dt', 0.25)),
+        )
+        t_grid, V_pred, params = tumor_model.predict(patient, **grid)
+        result = {
+            'success': True,
+            'times': t_grid.tolist(),
+            'tumor_size': V_pred.tolist(),
+            'params': params,
+            'model_version': tumor_model.version
+        }
+        # p5/p50/p95 по Монте-Карло, если в теле запроса "intervals": true
+        if with_intervals:
+            result['intervals'] = tumor_model.predict_intervals(patient, **grid)
+        return jsonify(result)
+
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Некорректные данные для прогноза: {str(e)}'
+        }), 400
+    except Exception as e:
+        return _server_error(e, 'Ошибка сервера')
+
+@api.route('/api/predict/batch', methods=['POST'])
+def predict_batch():
+    tumor_model = _state().tumor_model
+    if tumor_model is None:
+        return jsonify({
+            'success': False,
+            'message': 'Модель прогноза не загружена'
+        }), 503
+
+    try:
+        data = request.get_json(silent=True) or {}
+        patients = data.get('patients') or []
+
+        for i, patient in enumerate(patients):
+            missing = tumor_model.missing_fields(patient)
+            if missing:
+                return jsonify({
+                    'success': False,
+                    'message': f"Пациент #{i}: не хватает полей: {', '.join(missing)}"
+                }), 400
+
+        if not patients:
+            return jsonify({'success': True, 'times': [], 'predictions': []})
+
+        t_grid, V_pred, params = tumor_model.predict_batch(
+            patients,
+            t_grid=data.get('times'),
+            t_end=float(data.get('t_end', 36.0)),
+            dt=float(data.get('dt', 0.25)),
+        )
+        return jsonify({
+            'success': True,
+            'times': t_grid.tolist(),
+            'predictions': [
+                {'tumor_size': V.tolist(), 'params': p}
+                for V, p in zip(V_pred, params)
+            ],
+            'model_version': tumor_model.version
+        })
+
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Некорректные данные для прогноза: {str(e)}'
+        }), 400
+    except Exception as e:
+        return _server_error(e, 'Ошибка сервера')
+
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    """Метрики процесса в формате Prometheus"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@api.route('/api/health', methods=['GET'])
+def health_check():
+    """Проверка работоспособности API"""
+    state = _state()
+    return jsonify({
+        'success': True,
+        'message': 'API работает корректно',
+        'model_loaded': state.tumor_model is not None,
+        'prediction_cache': state.prediction_cache.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+if __name__ == '__main__':
+    print("Запуск сервера Breast Cancer API...")
+    print("API доступно по адресу: http://localhost:5000")
+    print("Доступные endpoints:")
+    print("  POST /api/patients - добавление пациента")
+    print("  POST /api/patients/bulk - массовая загрузка пациентов (JSON/NDJSON/CSV)")
+    print("  GET  /api/patients - получение списка пациентов (?limit=&cursor=, ?format=ndjson)")
+    print("  POST /api/patients/<code>/measurements - измерения опухоли с произвольными датами")
+    print("  GET  /api/patients/<code>/measurements - ряд измерений пациента (?from=&to=)")
+    print("  POST /api/predict - прогноз динамики опухоли")
+    print("  POST /api/predict/batch - пакетный прогноз")
+    print("  GET  /api/stage-statistics - статистика по стадиям")
+    print("  GET  /api/statistics - статистика по стадиям, типам рака и лечения")
+    print("  GET  /api/analytics/response-curves - кривые ответа по группам (?group_by=)")
+    print("  GET  /api/health - проверка работоспособности")
+    print("  GET  /metrics - метрики в формате Prometheus")
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
     
\ No newline at end of file
@@ -0,0 +1,340 @@
+"""
+ASGI-вариант API (Starlette) для большого числа одновременных клиентов.
+
+Запуск:  uvicorn asgi_app:app --host 0.0.0.0 --port 5000
+         gunicorn -w 4 -k uvicorn.workers.UvicornWorker --preload 'asgi_app:create_app()'
+
+Медленные клиенты обслуживаются циклом событий и не занимают потоки:
+запросы к SQLite идут через AsyncBreastCancerDB (пул потоков размером
+с пул соединений), прогнозы модели – в отдельный пул потоков.
+
+Модель прогноза (и numpy) загружается в create_app(), а не при импорте:
+с --preload – один раз в мастере, воркеры делят её через copy-on-write.
+База и пулы потоков открываются в lifespan каждого воркера.
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Match, Route
+
+from async_database import AsyncBreastCancerDB
+from database import BreastCancerDB, patient_from_frontend, PATIENTS_PAGE_MAX
+from http_cache import COMPRESS_MIN_SIZE, GZIP_LEVEL, cache_headers, is_not_modified, json_dumps
+from metrics import (
+    REGISTRY, CONTENT_TYPE, HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_FLIGHT, register_cache_metrics
+)
+from sqlite_pool import PoolExhaustedError
+from structured_log import get_logger, log_event, log_request
+
+DB_NAME = os.environ.get('BREAST_CANCER_DB', 'breast_cancer_database.db')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# через сколько секунд клиенту повторить запрос, если пул соединений исчерпан (503)
+DB_POOL_RETRY_AFTER = int(os.environ.get('DB_POOL_RETRY_AFTER', 1))
+MODEL_WORKERS = int(os.environ.get('MODEL_WORKERS', os.cpu_count() or 1))
+
+logger = get_logger('api')
+
+
+def error(message: str, status_code: int) -> JSONResponse:
+    return JSONResponse({'success': False, 'message': message}, status_code=status_code)
+
+
+def server_error(request, e: Exception, message: str = 'Ошибка сервера') -> JSONResponse:
+    """Непредвиденная ошибка обработчика: 503 с Retry-After при исчерпанном пуле соединений, иначе 500"""
+    log_event(logger, 'request_failed', level=logging.ERROR, exc_info=True,
+              endpoint=request.url.path, error=str(e))
+    if isinstance(e, PoolExhaustedError):
+        response = error(f'Сервер перегружен, повторите запрос: {str(e)}', 503)
+        response.headers['Retry-After'] = str(DB_POOL_RETRY_AFTER)
+        return response
+    return error(f'{message}: {str(e)}', 500)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse через http_cache.json_dumps (orjson, если установлен) – для длинных списков строк"""
+
+    def render(self, content) -> bytes:
+        return json_dumps(content)
+
+
+async def cache_validators(request, table: str = 'patients') -> tuple:
+    """Заголовки ETag/Last-Modified по счётчику изменений table и ответ 304 (или None), как в app.py"""
+    version, modified = await request.app.state.db.get_data_version(table)
+    headers = cache_headers(version, modified)
+    if is_not_modified(request.headers.get('if-none-match'), request.headers.get('if-modified-since'),
+                       version, modified):
+        return headers, Response(status_code=304, headers=headers)
+    return headers, None
+
+
+async def run_model(request, func, *args, **kwargs):
+    """CPU-вызов модели (CatBoost, numpy) в пуле потоков модели"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        request.app.state.model_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def add_patient(request):
+    db = request.app.state.db
+    try:
+        data = await request.json()
+        patient_code = await db.add_patient(patient_from_frontend(data))
+
+        if patient_code:
+            return JSONResponse({
+                'success': True,
+                'patient_code': patient_code,
+                'message': 'Пациент успешно добавлен в базу данных'
+            })
+        return error('Ошибка при добавлении пациента в базу данных', 400)
+
+    except Exception as e:
+        return server_error(request, e, 'Ошибка сервера')
+
+
+async def get_patients(request):
+    """
+    Список пациентов, новые сначала.
+    ?limit=&cursor= – постраничный режим (next_cursor в ответе),
+    ?format=ndjson – потоковая выгрузка всех пациентов по строке JSON.
+    """
+    db = request.app.state.db
+    try:
+        cursor = request.query_params.get('cursor') or None
+        if cursor is not None:
+            BreastCancerDB.decode_cursor(cursor)
+
+        if request.query_params.get('format') == 'ndjson':
+            async def generate():
+                async for patient in db.iter_patients(after=cursor):
+                    yield json.dumps(patient, ensure_ascii=False) + '\n'
+
+            return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            limit = 100
+        limit = min(max(limit, 1), PATIENTS_PAGE_MAX)
+
+        headers, not_modified = await cache_validators(request, 'patients')
+        if not_modified is not None:
+            return not_modified
+
+        patients, next_cursor = await db.get_patients_page(limit, after=cursor)
+        return FastJSONResponse({
+            'success': True,
+            'patients': patients,
+            'next_cursor': next_cursor
+        }, headers=headers)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return server_error(request, e, 'Ошибка при получении пациентов')
+
+
+async def get_stage_statistics(request):
+    try:
+        headers, not_modified = await cache_validators(request, 'patients')
+        if not_modified is not None:
+            return not_modified
+
+        stats = await request.app.state.db.get_stage_statistics()
+        return FastJSONResponse({
+            'success': True,
+            'statistics': stats
+        }, headers=headers)
+    except Exception as e:
+        return server_error(request, e, 'Ошибка при получении статистики')
+
+
+async def get_statistics(request):
+    """Число пациентов по стадии, типу рака и типу лечения"""
+    try:
+        headers, not_modified = await cache_validators(request, 'patients')
+        if not_modified is not None:
+            return not_modified
+
+        return FastJSONResponse({
+            'success': True,
+            'statistics': await request.app.state.db.get_patient_counts()
+        }, headers=headers)
+    except Exception as e:
+        return server_error(request, e, 'Ошибка при получении статистики')
+
+
+async def predict(request):
+    tumor_model = request.app.state.tumor_model
+    if tumor_model is None:
+        return error('Модель прогноза не загружена', 503)
+
+    try:
+        try:
+            data = await request.json()
+        except ValueError:
+            data = None
+        data = data or {}
+        patient = data.get('patient') or {}
+
+        missing = tumor_model.missing_fields(patient)
+        if missing:
+            return error(f"Не хватает полей: {', '.join(missing)}", 400)
+
+        with_intervals = bool(data.get('intervals'))
+        if with_intervals and tumor_model.interval_sampler is None:
+            return error('Модель экспортирована без распределений для интервалов', 503)
+
+        grid = dict(
+            t_grid=data.get('times'),
+            t_end=float(data.get('t_end', 36.0)),
+            dt=float(data.get('dt', 0.25)),
+        )
+        t_grid, V_pred, params = await run_model(request, tumor_model.predict, patient, **grid)
+        result = {
+            'success': True,
+            'times': t_grid.tolist(),
+            'tumor_size': V_pred.tolist(),
+            'params': params,
+            'model_version': tumor_model.version
+        }
+        # p5/p50/p95 по Монте-Карло, если в теле запроса "intervals": true
+        if with_intervals:
+            result['intervals'] = await run_model(request, tumor_model.predict_intervals, patient, **grid)
+        return JSONResponse(result)
+
+    except (TypeError, ValueError) as e:
+        return error(f'Некорректные данные для прогноза: {str(e)}', 400)
+    except Exception as e:
+        return server_error(request, e, 'Ошибка сервера')
+
+
+async def health_check(request):
+    """Проверка работоспособности API"""
+    return JSONResponse({
+        'success': True,
+        'message': 'API работает корректно',
+        'model_loaded': request.app.state.tumor_model is not None,
+        'prediction_cache': request.app.state.prediction_cache.stats(),
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+async def metrics(request):
+    """Метрики процесса в формате Prometheus"""
+    return Response(REGISTRY.render(), headers={'Content-Type': CONTENT_TYPE})
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: время ответа, запросы в обработке и журнал запросов.
+    Метка endpoint – путь маршрута (без параметров), время – до конца тела ответа,
+    включая потоковые ответы.
+    """
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    def _endpoint(self, scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                return route.path
+        return 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        endpoint = self._endpoint(scope)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method, endpoint)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_REQUESTS_IN_FLIGHT.dec(method, endpoint)
+            HTTP_REQUEST_DURATION.observe(duration, method, endpoint, status)
+            log_request(logger, method, endpoint, status, duration)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.db = AsyncBreastCancerDB(BreastCancerDB(app.state.db_name, pool_size=DB_POOL_SIZE))
+    app.state.model_executor = ThreadPoolExecutor(
+        max_workers=MODEL_WORKERS, thread_name_prefix='model'
+    )
+
+    try:
+        yield
+    finally:
+        app.state.model_executor.shutdown(wait=True)
+        app.state.db.close()
+
+
+routes = [
+    Route('/api/patients', add_patient, methods=['POST']),
+    Route('/api/patients', get_patients, methods=['GET']),
+    Route('/api/stage-statistics', get_stage_statistics, methods=['GET']),
+    Route('/api/statistics', get_statistics, methods=['GET']),
+    Route('/api/predict', predict, methods=['POST']),
+    Route('/api/health', health_check, methods=['GET']),
+    Route('/metrics', metrics, methods=['GET']),
+]
+
+def create_app(db_name: str = DB_NAME, model_dir: Optional[str] = None) -> Starlette:
+    """Приложение с моделью прогноза; кэш прогнозов сбрасывается при загрузке модели другой версии"""
+    from model_service import MODEL_DIR, TumorModel, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL
+    from prediction_cache import PredictionCache
+
+    app = Starlette(
+        routes=routes,
+        middleware=[
+            Middleware(MetricsMiddleware, routes=routes),
+            Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+            Middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_SIZE, compresslevel=GZIP_LEVEL),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.db_name = db_name
+
+    app.state.prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+    register_cache_metrics(app.state.prediction_cache)
+    try:
+        app.state.tumor_model = TumorModel.load(model_dir or MODEL_DIR, cache=app.state.prediction_cache)
+    except (OSError, ValueError, KeyError) as e:
+        log_event(logger, 'model_not_loaded', level=logging.WARNING, error=str(e))
+        app.state.tumor_model = None
+    return app
+
+
+def __getattr__(name):
+    # `uvicorn asgi_app:app` – приложение по умолчанию, создаётся при первом обращении
+    if name != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()['app'] = create_app()
+    return globals()['app']
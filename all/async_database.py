@@ -0,0 +1,77 @@
+import asyncio
+import functools
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, AsyncIterator
+
+from database import BreastCancerDB, EXPORT_FETCH_SIZE
+from structured_log import get_logger, log_event
+
+logger = get_logger('database')
+
+
+class AsyncBreastCancerDB:
+    """
+    Неблокирующий доступ к BreastCancerDB для ASGI-сервера.
+
+    Запросы к SQLite выполняются в отдельном пуле потоков размером с пул
+    соединений: цикл событий не ждёт диск, а потоков никогда не больше, чем
+    соединений, – лишние запросы стоят в очереди исполнителя, а не
+    в ожидании соединения с таймаутом.
+    """
+
+    def __init__(self, db: BreastCancerDB):
+        self.db = db
+        self._executor = ThreadPoolExecutor(
+            max_workers=db.pool.size, thread_name_prefix='sqlite'
+        )
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def add_patient(self, patient_info: Dict[str, Any]) -> Optional[str]:
+        """
+        Добавление пациента. В режиме write-behind поток исполнителя
+        только ставит запись в очередь, а подтверждение коммита ждёт цикл событий.
+        """
+        patient_code, done = await self._run(self.db.submit_patient, patient_info)
+        try:
+            await asyncio.wrap_future(done)
+        except sqlite3.Error as e:
+            log_event(logger, 'add_patient_failed', level=logging.ERROR, error=str(e))
+            return None
+        return patient_code
+
+    async def get_patients_page(self, limit: int = 100, after: Optional[str] = None) -> tuple:
+        return await self._run(self.db.get_patients_page, limit, after)
+
+    async def iter_patients(self, after: Optional[str] = None,
+                            fetch_size: int = EXPORT_FETCH_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Все пациенты страницами по fetch_size. Соединение занято только
+        на время чтения страницы, а не пока медленный клиент читает ответ.
+        """
+        while True:
+            patients, after = await self.get_patients_page(fetch_size, after)
+            for patient in patients:
+                yield patient
+            if after is None:
+                break
+
+    async def get_patient_counts(self) -> Dict[str, Dict]:
+        return await self._run(self.db.get_patient_counts)
+
+    async def get_data_version(self, table: str = 'patients') -> tuple:
+        return await self._run(self.db.get_data_version, table)
+
+    async def get_stage_statistics(self) -> Dict:
+        return await self._run(self.db.get_stage_statistics)
+
+    def close(self):
+        """Остановка пула потоков и закрытие соединений с бд"""
+        self._executor.shutdown(wait=True)
+        self.db.close()
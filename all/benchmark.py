@@ -0,0 +1,284 @@
+"""
+Микробенчмарки слоя БД и горячих путей модели.
+
+  python benchmark.py                                       # всё, БД на 10^3, 10^5, 10^6 строк
+  python benchmark.py --only db --sizes 1000,100000
+  python benchmark.py --compare benchmark_results/old.json  # код возврата 1 при регрессии
+
+Результат – JSON в benchmark_results/<время>_<коммит>.json: окружение запуска
+и по записи на бенчмарк (секунды на операцию: min, median, mean, p95).
+Записи сравниваются между запусками по (group, name, params).
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List
+
+import numpy as np
+
+RESULTS_DIR = 'benchmark_results'
+DB_SIZES = (1000, 100000, 1000000)
+COHORT_SIZES = (1000, 10000)
+REPEAT = 5
+REGRESSION_THRESHOLD = 0.2  # медиана медленнее на 20% – регрессия
+
+
+def measure(func: Callable[[], Any], repeat: int = REPEAT) -> Dict[str, Any]:
+    """Время одного вызова func: число вызовов на замер подбирается как в timeit (>= 0.2 с)"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    per_op = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+    median = statistics.median(per_op)
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min': per_op[0],
+        'median': median,
+        'mean': statistics.fmean(per_op),
+        'p95': per_op[min(len(per_op) - 1, int(round(0.95 * (len(per_op) - 1))))],
+        'ops_per_sec': 1.0 / median if median > 0 else None,
+    }
+
+
+class Results:
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+
+    def add(self, group: str, name: str, params: Dict[str, Any], func: Callable[[], Any],
+            repeat: int = REPEAT, items: int = 1):
+        """items – сколько объектов (пациентов) обрабатывает один вызов; per_item – время на объект"""
+        stats = measure(func, repeat)
+        record = {'group': group, 'name': name, 'params': params, **stats}
+        if items != 1:
+            record['items'] = items
+            record['per_item'] = stats['median'] / items
+        self.records.append(record)
+        print(f"  {name:<32} {json.dumps(params):<36} {stats['median'] * 1e3:10.3f} мс/оп", file=sys.stderr)
+
+
+def synthetic_patients(n: int, seed: int = 0) -> list:
+    """Строки таблицы patients для наполнения БД"""
+    rnd = random.Random(seed)
+    return [{
+        'age': rnd.randint(25, 85),
+        'gender': 'Женский',
+        'weight': round(rnd.uniform(45, 110), 1),
+        'height': rnd.randint(150, 185),
+        'cancer_type': rnd.choice(['TNBC', 'HR-HER2+', 'HR+HER2+B', 'HR+HER2-B', 'HR+HER2-A']),
+        'cancer_stage': rnd.choice(['1', '2', '3']),
+        'initial_tumor_size': round(rnd.uniform(0.5, 6.0), 2),
+        'treatment_type': rnd.choice(['chemotherapy', 'hormone_therapy', 'chemotherapy_her2']),
+        'er_status': rnd.random() < 0.7,
+        'pr_status': rnd.random() < 0.6,
+        'her2_status': rnd.random() < 0.2,
+        'ki67': round(rnd.uniform(5, 60), 1),
+    } for _ in range(n)]
+
+
+def synthetic_cohort(n: int, seed: int = 0):
+    """Когорта в формате ноутбука с динамикой по точному решению и шумом"""
+    import pandas as pd
+    from tumor_growth import add_molecular_subtype, gompertz_treated_exact, treatment_effect_coeffs
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'patient_id': [f'P{i}' for i in range(n)],
+        'er_status': rng.integers(0, 2, n), 'pr_status': rng.integers(0, 2, n),
+        'her2_status': rng.integers(0, 2, n), 'ki67_level': rng.uniform(5, 60, n),
+        'treatment': rng.choice(['no_treatment', 'surgery_only', 'surgery_chemo', 'surgery_target'], n),
+        'age': rng.integers(30, 80, n), 'tumor_grade': rng.choice(['G1', 'G2', 'G3'], n).astype(object),
+        'molecular_subtype': rng.choice(['A', 'B', 'C'], n).astype(object),
+        'performance_status': rng.integers(0, 3, n),
+        'menopausal_status': rng.choice(['pre', 'post'], n).astype(object),
+        'tumor_size_before': rng.uniform(0.5, 5.0, n),
+    })
+    df['treatment'] = df['treatment'].astype(object)
+    df = add_molecular_subtype(df)
+
+    base_eff = treatment_effect_coeffs(df['treatment'], df['new_molecular_subtype'])
+    r = rng.uniform(0.05, 0.6, n)
+    gamma = rng.uniform(0.0, 0.3, n)
+    for col, month in (('tumor_size_3m', 3), ('tumor_size_6m', 6), ('tumor_size_12m', 12), ('tumor_size_24m', 24)):
+        V = gompertz_treated_exact(month, df['tumor_size_before'].to_numpy(), r, 8.0, base_eff, gamma)
+        df[col] = V * np.exp(rng.normal(0, 0.05, n))
+    return df
+
+
+def bench_db(results: Results, sizes, workdir: str):
+    from database import BreastCancerDB
+    from synthetic_cohort import generate_chunks, write_sqlite
+
+    for size in sizes:
+        print(f"БД: {size} пациентов", file=sys.stderr)
+        db_name = os.path.join(workdir, f'bench_{size}.db')
+        started = time.perf_counter()
+        write_sqlite(generate_chunks(size, seed=0), db_name)
+        print(f"  наполнение: {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+        db = BreastCancerDB(db_name)
+        one = synthetic_patients(1, seed=-1)[0]
+        params = {'rows': size}
+        results.add('db', 'add_patient', params, lambda: db.add_patient(one))
+        results.add('db', 'get_all_patients', params, lambda: db.get_all_patients(100))
+        results.add('db', 'get_stage_statistics', params, db.get_stage_statistics)
+        results.add('db', 'get_patients_by_stage', params, lambda: db.get_patients_by_stage('2'),
+                    repeat=3)
+
+        # ряды измерений: вся история пациента одним чтением и пачка новых визитов
+        codes = [p['patient_code'] for p in db.get_all_patients(1000)]
+        results.add('db', 'get_tumor_series', params, lambda: db.get_tumor_series(codes[0]))
+        visit_days = itertools.count(1)
+
+        def add_visits():
+            visit = datetime(2030, 1, 1) + timedelta(days=next(visit_days))
+            db.add_tumor_series({'patient_code': code, 'measurement_date': visit, 'tumor_size': 1.0}
+                                for code in codes)
+
+        results.add('db', 'add_tumor_series', {**params, 'batch': len(codes)}, add_visits, items=len(codes))
+        db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_name + suffix):
+                os.remove(db_name + suffix)
+
+
+def bench_model(results: Results, cohort_sizes, workdir: str):
+    from tumor_growth import (
+        add_molecular_subtype, cohort_K, fit_cohort, fit_patient, simulate_patient, treatment_effect_coeffs
+    )
+    from tumor_growth.artifacts import load_model
+    from tumor_growth.training import export_model, select_training_rows, train_model_r
+    from model_service import TumorModel
+
+    print("Модель", file=sys.stderr)
+    df = synthetic_cohort(2000, seed=1)
+    K = cohort_K(df)
+    rows = df.to_dict('records')
+    row = rows[0]
+
+    results.add('model', 'simulate_patient', {}, lambda: simulate_patient((0.3, 0.05), row, K))
+    results.add('model', 'fit_patient', {}, lambda: fit_patient(row, K))
+
+    for n in cohort_sizes:
+        cohort = synthetic_cohort(n, seed=2)
+        K_n = cohort_K(cohort)
+        results.add('model', 'fit_cohort_vectorized', {'patients': n},
+                    lambda: fit_cohort(cohort, K_n), repeat=3, items=n)
+        # подтип и base_eff для всей когорты (подготовка признаков)
+        raw = cohort.drop(columns='new_molecular_subtype')
+        results.add('model', 'cohort_subtype_base_eff', {'patients': n},
+                    lambda: treatment_effect_coeffs(raw['treatment'], add_molecular_subtype(raw)['new_molecular_subtype']),
+                    repeat=3, items=n)
+
+    # CatBoost: модель на синтетической когорте, как её грузит API
+    df_train_r = select_training_rows(df, fit_cohort(df, K))
+    model_r, feature_cols, cat_features_idx, X_train, _ = train_model_r(df_train_r)
+    model_dir = os.path.join(workdir, 'model')
+    export_model(model_dir, model_r, feature_cols, cat_features_idx, K, df_train_r, X_train)
+    batch = rows[:1000]
+
+    # имена без суффикса – CatBoost, как до появления model_r.npz: --compare
+    # со старыми базовыми замерами сравнивает тот же путь
+    catboost_model = TumorModel(*load_model(model_dir, compiled=False))
+    results.add('model', 'estimate_r', {'batch': 1}, lambda: catboost_model.estimate_r(row))
+    results.add('model', 'estimate_r_batch', {'batch': len(batch)},
+                lambda: catboost_model.estimate_r_batch(batch), items=len(batch))
+
+    # скомпилированные деревья (так модель грузит API, если есть model_r.npz)
+    compiled_model = TumorModel.load(model_dir)
+    results.add('model', 'estimate_r_compiled', {'batch': 1}, lambda: compiled_model.estimate_r(row))
+    results.add('model', 'estimate_r_batch_compiled', {'batch': len(batch)},
+                lambda: compiled_model.estimate_r_batch(batch), items=len(batch))
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+    }
+
+
+def _key(record: Dict[str, Any]) -> tuple:
+    return record['group'], record['name'], json.dumps(record['params'], sort_keys=True)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = REGRESSION_THRESHOLD) -> list:
+    """Сравнение медиан с прошлым запуском; возвращает список регрессий"""
+    old = {_key(r): r for r in baseline['results']}
+    regressions = []
+    print(f"\nСравнение с {baseline['environment'].get('git_commit')} ({baseline['environment'].get('timestamp')})")
+    for record in current['results']:
+        prev = old.get(_key(record))
+        if prev is None:
+            continue
+        ratio = record['median'] / prev['median'] if prev['median'] else float('inf')
+        mark = ''
+        if ratio > 1.0 + threshold:
+            mark = '  РЕГРЕССИЯ'
+            regressions.append({'key': _key(record), 'ratio': ratio})
+        print(f"  {record['group']}/{record['name']} {json.dumps(record['params'])}: "
+              f"{prev['median'] * 1e3:.3f} -> {record['median'] * 1e3:.3f} мс (x{ratio:.2f}){mark}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Бенчмарки БД и модели')
+    parser.add_argument('--only', choices=['db', 'model'], help='только одна группа')
+    parser.add_argument('--sizes', default=','.join(map(str, DB_SIZES)), help='размеры БД через запятую')
+    parser.add_argument('--cohort-sizes', default=','.join(map(str, COHORT_SIZES)),
+                        help='размеры когорты для fit_cohort_vectorized')
+    parser.add_argument('--out', help=f'файл результата (по умолчанию в {RESULTS_DIR}/)')
+    parser.add_argument('--compare', help='JSON прошлого запуска для сравнения')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = Results()
+    with tempfile.TemporaryDirectory(prefix='bc_bench_') as workdir:
+        if args.only in (None, 'db'):
+            bench_db(results, [int(s) for s in args.sizes.split(',') if s], workdir)
+        if args.only in (None, 'model'):
+            bench_model(results, [int(s) for s in args.cohort_sizes.split(',') if s], workdir)
+
+    report = {'environment': environment(), 'results': results.records}
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        out = os.path.join(RESULTS_DIR, f"{stamp}_{report['environment']['git_commit']}.json")
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты: {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
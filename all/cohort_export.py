@@ -0,0 +1,243 @@
+"""
+Выгрузка когорты из breast_cancer_database.db в типизированный столбцовый файл
+для обучения модели (вместо CSV с десятичной запятой).
+
+Одна строка на пациента: поля patients под именами из ноутбука,
+размеры опухоли tumor_dynamics развёрнуты в tumor_size_before ... tumor_size_24m,
+survival_months – из последнего treatment_results.
+
+Форматы (по расширению пути):
+  .arrow / .feather – Arrow IPC без сжатия, читается через memory map без копирования;
+  .parquet          – сжатый Parquet, по row group на пачку;
+  иначе             – папка с .npy на каждую колонку (строки – коды словаря,
+                      числа – float64 с NaN вместо NULL) и schema.json.
+
+Запуск:  python cohort_export.py breast_cancer_database.db export/cohort.arrow
+"""
+import argparse
+import json
+import os
+import sqlite3
+from typing import Optional, Dict, Iterator, Sequence
+
+import numpy as np
+import pandas as pd
+
+from database import MEASUREMENT_TYPES
+
+COHORT_CHUNK_SIZE = 50000
+
+# колонка когорты -> (выражение SQL над patients p, тип: str / int / float)
+COHORT_COLUMNS = {
+    'patient_id': ('p.patient_code', 'str'),
+    'age': ('p.age', 'int'),
+    'cancer_stage': ('p.cancer_stage', 'str'),
+    'molecular_subtype': ('p.cancer_type', 'str'),
+    'tumor_grade': ('p.histological_grading', 'str'),
+    'performance_status': ('p.ecog', 'int'),
+    'menopausal_status': ('p.menopausal_status', 'str'),
+    'treatment': ('p.treatment_type', 'str'),
+    'er_status': ('p.er_status', 'int'),
+    'pr_status': ('p.pr_status', 'int'),
+    'her2_status': ('p.her2_status', 'int'),
+    'ki67_level': ('p.ki67', 'float'),
+    'distant_metastases_count': ('p.distant_metastases_count', 'int'),
+}
+# каждое измерение – поиск по покрывающему индексу idx_tumor_patient_type;
+# без измерения 'before' берём исходный размер из patients
+for _mt in MEASUREMENT_TYPES:
+    _size = (f"(SELECT t.tumor_size FROM tumor_dynamics t "
+             f"WHERE t.patient_code = p.patient_code AND t.measurement_type = '{_mt}')")
+    if _mt == 'before':
+        _size = f'COALESCE({_size}, p.initial_tumor_size)'
+    COHORT_COLUMNS[f'tumor_size_{_mt}'] = (_size, 'float')
+COHORT_COLUMNS['survival_months'] = (
+    '(SELECT r.survival_months FROM treatment_results r WHERE r.patient_code = p.patient_code '
+    'ORDER BY r.created_date DESC, r.id DESC LIMIT 1)',
+    'float'
+)
+
+
+def _cohort_sql() -> str:
+    select = ',\n    '.join(f'{sql} AS {name}' for name, (sql, _) in COHORT_COLUMNS.items())
+    # keyset по id: каждая пачка – короткий проход по первичному ключу
+    return f'''
+    SELECT p.id,
+    {select}
+    FROM patients p
+    WHERE p.id > ?
+    ORDER BY p.id
+    LIMIT ?
+    '''
+
+
+def iter_cohort_chunks(connection: sqlite3.Connection,
+                       chunk_size: int = COHORT_CHUNK_SIZE) -> Iterator[Dict[str, tuple]]:
+    """Когорта пачками по chunk_size пациентов: {колонка: значения}"""
+    sql = _cohort_sql()
+    last_id = 0
+    while True:
+        rows = connection.execute(sql, (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        yield dict(zip(COHORT_COLUMNS, list(zip(*rows))[1:]))
+
+
+def _arrow_schema():
+    import pyarrow as pa
+
+    types = {'str': pa.string(), 'int': pa.int64(), 'float': pa.float64()}
+    return pa.schema([(name, types[kind]) for name, (_, kind) in COHORT_COLUMNS.items()])
+
+
+def _write_arrow(chunks: Iterator[Dict[str, Sequence]], path: str, fmt: str) -> int:
+    import pyarrow as pa
+
+    schema = _arrow_schema()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(path, schema)
+
+    rows = 0
+    try:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pydict({
+                name: values if isinstance(values, np.ndarray) else list(values)
+                for name, values in chunk.items()
+            }, schema=schema))
+            rows += len(chunk['patient_id'])
+    finally:
+        writer.close()
+    return rows
+
+
+def _write_npy(chunks: Iterator[Dict[str, Sequence]], path: str, total: int) -> int:
+    os.makedirs(path, exist_ok=True)
+
+    arrays = {}
+    categories = {}
+    for name, (_, kind) in COHORT_COLUMNS.items():
+        dtype = np.int32 if kind == 'str' else np.float64
+        arrays[name] = np.lib.format.open_memmap(
+            os.path.join(path, f'{name}.npy'), mode='w+', dtype=dtype, shape=(total,)
+        )
+        if kind == 'str':
+            categories[name] = {}
+
+    rows = 0
+    for chunk in chunks:
+        n = len(chunk['patient_id'])
+        for name, values in chunk.items():
+            if name in categories:
+                codes = categories[name]
+                values = np.array([-1 if v is None else codes.setdefault(v, len(codes)) for v in values],
+                                  dtype=np.int32)
+            else:
+                values = np.array(values, dtype=np.float64)
+            arrays[name][rows:rows + n] = values
+        rows += n
+
+    for array in arrays.values():
+        array.flush()
+
+    schema = {
+        'rows': rows,
+        'columns': {
+            name: {'kind': kind, 'categories': list(categories[name]) if name in categories else None}
+            for name, (_, kind) in COHORT_COLUMNS.items()
+        },
+    }
+    with open(os.path.join(path, 'schema.json'), 'w', encoding='utf-8') as f:
+        json.dump(schema, f, ensure_ascii=False)
+    return rows
+
+
+def _format_of(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.parquet':
+        return 'parquet'
+    if ext in ('.arrow', '.feather'):
+        return 'arrow'
+    return 'npy'
+
+
+def write_cohort(chunks: Iterator[Dict[str, Sequence]], path: str, total: Optional[int] = None) -> int:
+    """
+    Запись пачек {колонка из COHORT_COLUMNS: значения} в path (формат по расширению).
+    Для папки .npy нужно заранее знать число строк total. Возвращает число строк.
+    """
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    fmt = _format_of(path)
+    if fmt == 'npy':
+        if total is None:
+            raise ValueError('Для формата .npy нужно заранее знать число строк')
+        return _write_npy(chunks, path, total)
+    return _write_arrow(chunks, path, fmt)
+
+
+def export_cohort(db_name: str, path: str, chunk_size: int = COHORT_CHUNK_SIZE) -> int:
+    """
+    Выгрузка когорты в path (формат по расширению). Все пачки читаются
+    в одной транзакции чтения, т.е. из одного снимка базы. Возвращает число строк.
+    """
+    connection = sqlite3.connect(f'file:{db_name}?mode=ro', uri=True)
+    try:
+        connection.execute('BEGIN')
+        # снимок фиксируется первым SELECT – число строк и пачки из одной версии
+        total = connection.execute('SELECT COUNT(*) FROM patients').fetchone()[0]
+        return write_cohort(iter_cohort_chunks(connection, chunk_size), path, total)
+    finally:
+        connection.close()
+
+
+def load_cohort(path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Когорта из файла export_cohort в DataFrame с готовыми типами –
+    без разбора строк. Arrow и .npy отображаются в память (memory map).
+    """
+    fmt = _format_of(path)
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        df = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+    elif fmt == 'arrow':
+        import pyarrow as pa
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        if columns is not None:
+            table = table.select(list(columns))
+        df = table.to_pandas()
+
+    else:
+        with open(os.path.join(path, 'schema.json'), encoding='utf-8') as f:
+            schema = json.load(f)
+
+        data = {}
+        for name in columns or schema['columns']:
+            info = schema['columns'][name]
+            values = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            if info['kind'] == 'str':
+                values = pd.Categorical.from_codes(values, categories=info['categories'])
+            data[name] = values
+        df = pd.DataFrame(data)
+
+    # строки – object, как после pd.read_csv (CatBoost не принимает строковые dtype pandas)
+    for name in df.columns:
+        if COHORT_COLUMNS[name][1] == 'str':
+            df[name] = df[name].astype(object)
+    return df
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Выгрузка когорты для обучения модели')
+    parser.add_argument('db_name', nargs='?', default='breast_cancer_database.db')
+    parser.add_argument('path', nargs='?', default=os.path.join('export', 'cohort.arrow'))
+    parser.add_argument('--chunk-size', type=int, default=COHORT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    rows = export_cohort(args.db_name, args.path, args.chunk_size)
+    print(f"Выгружено пациентов: {rows} -> {args.path}")
@@ -0,0 +1,1008 @@
+import sqlite3
+import base64
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, Iterable, Iterator, Sequence, Tuple
+
+from patient_codes import SEQUENCE_SCHEMA, PatientCodeAllocator
+from sqlite_pool import SQLiteConnectionPool
+from structured_log import get_logger, log_event
+import tumor_series
+from write_queue import GroupCommitWriter
+
+logger = get_logger('database')
+
+PATIENT_INSERT_SQL = '''
+    INSERT INTO patients (
+        patient_code, age, gender, weight, height, cancer_type, cancer_stage,
+        initial_tumor_size, distant_metastases_count, histological_grading, ecog,
+        menopausal_status, treatment_type, er_status, pr_status, her2_status, ki67
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Типы колонок patients для приведения строк из CSV
+PATIENT_FIELD_TYPES = {
+    'age': int,
+    'weight': float,
+    'height': int,
+    'initial_tumor_size': float,
+    'distant_metastases_count': int,
+    'ecog': int,
+    'ki67': float,
+    'er_status': bool,
+    'pr_status': bool,
+    'her2_status': bool,
+}
+
+BULK_CHUNK_SIZE = 1000
+
+# Режим write-behind: одиночные записи копятся в очереди и коммитятся пачкой
+# (до WRITE_BATCH_SIZE строк или раз в WRITE_FLUSH_MS миллисекунд)
+WRITE_BEHIND = os.environ.get('DB_WRITE_BEHIND', '0') == '1'
+WRITE_BATCH_SIZE = int(os.environ.get('DB_WRITE_BATCH_SIZE', 256))
+WRITE_FLUSH_MS = float(os.environ.get('DB_WRITE_FLUSH_MS', 5))
+
+# Колонки patients, по которым ведутся счётчики в patient_counts
+COUNTED_COLUMNS = ('cancer_stage', 'cancer_type', 'treatment_type')
+# ключ для NULL / пустого значения (в patient_counts хранится как '') – строка,
+# чтобы ответ сериализовался и с сортировкой ключей
+UNKNOWN_VALUE = 'unknown'
+
+
+def _patient_counts_script() -> str:
+    """
+    Таблица-сводка patient_counts и триггеры, которые поддерживают её
+    при INSERT/DELETE/UPDATE в patients (NULL хранится как '').
+    """
+    def bump(prefix, delta):
+        return ''.join(f'''
+            INSERT INTO patient_counts (dimension, value, count)
+            VALUES ('{col}', IFNULL({prefix}.{col}, ''), {delta})
+            ON CONFLICT(dimension, value) DO UPDATE SET count = count + ({delta});'''
+            for col in COUNTED_COLUMNS)
+
+    return f'''
+        CREATE TABLE IF NOT EXISTS patient_counts (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_patient_counts_insert AFTER INSERT ON patients
+        BEGIN{bump('NEW', 1)}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_patient_counts_delete AFTER DELETE ON patients
+        BEGIN{bump('OLD', -1)}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_patient_counts_update
+        AFTER UPDATE OF {', '.join(COUNTED_COLUMNS)} ON patients
+        BEGIN{bump('OLD', -1)}{bump('NEW', 1)}
+        END;
+    '''
+
+
+def _patient_counts_backfill() -> str:
+    """Заполнение patient_counts по уже имеющимся пациентам (таблица должна быть пустой)"""
+    return ''.join(f'''
+        INSERT INTO patient_counts (dimension, value, count)
+        SELECT '{col}', IFNULL({col}, ''), COUNT(*) FROM patients GROUP BY IFNULL({col}, '');'''
+        for col in COUNTED_COLUMNS)
+
+
+# Таблицы, для которых ведётся счётчик изменений data_versions (ETag ответов API)
+VERSIONED_TABLES = ('patients', 'tumor_dynamics')
+
+# время изменения – секунды Unix, как у Last-Modified
+_NOW_UNIX = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def _data_versions_script(tables: Sequence[str] = VERSIONED_TABLES) -> str:
+    """
+    Счётчик изменений data_versions: триггеры увеличивают version таблицы
+    при любом INSERT/DELETE/UPDATE. Проверка «изменилось ли что-нибудь» –
+    одно чтение по ключу вместо запроса к самой таблице.
+    """
+    def bump(table):
+        return (f"UPDATE data_versions SET version = version + 1, modified_at = {_NOW_UNIX} "
+                f"WHERE name = '{table}';")
+
+    script = '''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            modified_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    '''
+    for table in tables:
+        script += f'''
+        INSERT OR IGNORE INTO data_versions (name, version, modified_at) VALUES ('{table}', 0, {_NOW_UNIX});
+        '''
+        script += ''.join(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_data_version_{table}_{event.lower()} AFTER {event} ON {table}
+        BEGIN {bump(table)} END;
+        ''' for event in ('INSERT', 'DELETE', 'UPDATE'))
+    return script
+
+
+def bump_data_version(connection: sqlite3.Connection, table: str):
+    """Отметить изменение table вручную – для загрузок со снятыми триггерами"""
+    connection.execute(
+        f'UPDATE data_versions SET version = version + 1, modified_at = {_NOW_UNIX} WHERE name = ?',
+        (table,)
+    )
+
+
+# Точки измерения опухоли в tumor_dynamics (по порядку) и группировки для аналитики
+MEASUREMENT_TYPES = ('before', '3m', '6m', '12m', '24m')
+ANALYTICS_GROUPS = ('cancer_stage', 'cancer_type', 'treatment_type')
+CURVE_QUANTILES = {'q25': 0.25, 'median': 0.5, 'q75': 0.75}
+# от каких таблиц зависят кривые – по их счётчикам data_versions сбрасывается кэш
+CURVES_TABLES = ('patients', 'tumor_dynamics')
+# Ответ / прогрессия относительно размера до лечения (пороги RECIST по диаметру)
+RESPONSE_RATIO = 0.7
+PROGRESSION_RATIO = 1.2
+
+
+def _curve_points_select(where: str) -> str:
+    """
+    Точки кривых: по строке на измерение и группировку (ANALYTICS_GROUPS),
+    с признаками ответа/прогрессии относительно измерения 'before'
+    (NULL, если размера до лечения нет). NULL и '' – группа UNKNOWN_VALUE,
+    одна с настоящим значением 'unknown', как в get_patient_counts.
+    """
+    return '\n        UNION ALL'.join(f'''
+        SELECT '{col}', IFNULL(NULLIF(p.{col}, ''), '{UNKNOWN_VALUE}'), d.measurement_type, d.tumor_size, d.patient_code,
+            CASE WHEN b.tumor_size > 0 THEN d.tumor_size <= {RESPONSE_RATIO} * b.tumor_size END,
+            CASE WHEN b.tumor_size > 0 THEN d.tumor_size >= {PROGRESSION_RATIO} * b.tumor_size END
+        FROM tumor_dynamics d
+        JOIN patients p ON p.patient_code = d.patient_code
+        LEFT JOIN tumor_dynamics b
+            ON b.patient_code = d.patient_code AND b.measurement_type = 'before'
+        WHERE d.measurement_type IS NOT NULL AND {where}'''
+        for col in ANALYTICS_GROUPS)
+
+
+def _curve_stats_upsert(sign: int, where: str) -> str:
+    """Прибавить (sign=1) или вычесть (sign=-1) точки curve_points WHERE where из curve_stats"""
+    return f'''
+        INSERT INTO curve_stats (dimension, grp, measurement_type, n, total, rated, responses, progressions)
+        SELECT dimension, grp, measurement_type, {sign} * COUNT(*), {sign} * SUM(tumor_size),
+            {sign} * COUNT(response), {sign} * IFNULL(SUM(response), 0), {sign} * IFNULL(SUM(progression), 0)
+        FROM curve_points
+        WHERE {where}
+        GROUP BY dimension, grp, measurement_type
+        ON CONFLICT(dimension, grp, measurement_type) DO UPDATE SET
+            n = n + excluded.n, total = total + excluded.total, rated = rated + excluded.rated,
+            responses = responses + excluded.responses, progressions = progressions + excluded.progressions;'''
+
+
+def _curves_recompute(code: str, apply: bool = True) -> str:
+    """Тело триггера: убрать точки пациента code и (apply) построить их заново"""
+    script = _curve_stats_upsert(-1, f'patient_code = {code}') + f'''
+        DELETE FROM curve_points WHERE patient_code = {code};'''
+    if apply:
+        script += f'''
+        INSERT INTO curve_points {_curve_points_select(f'd.patient_code = {code}')};''' + \
+            _curve_stats_upsert(1, f'patient_code = {code}')
+    return script
+
+
+def _response_curves_script() -> str:
+    """
+    Сводки для кривых ответа, которые поддерживают триггеры (как patient_counts):
+    curve_stats – n, сумма размеров и счётчики ответа/прогрессии на
+    (группировка, группа, точка измерения), curve_points – размеры в порядке
+    ключа, так что квантиль – поиск по ключу со смещением, а не сортировка
+    всей tumor_dynamics. Любое изменение пациента или его измерений
+    пересчитывает только его точки (до 5 измерений x 3 группировки).
+    """
+    return f'''
+        CREATE TABLE IF NOT EXISTS curve_points (
+            dimension TEXT NOT NULL,
+            grp TEXT NOT NULL,
+            measurement_type TEXT NOT NULL,
+            tumor_size REAL NOT NULL,
+            patient_code TEXT NOT NULL,
+            response INTEGER,
+            progression INTEGER,
+            PRIMARY KEY (dimension, grp, measurement_type, tumor_size, patient_code)
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS idx_curve_points_patient ON curve_points(patient_code);
+
+        CREATE TABLE IF NOT EXISTS curve_stats (
+            dimension TEXT NOT NULL,
+            grp TEXT NOT NULL,
+            measurement_type TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            rated INTEGER NOT NULL DEFAULT 0,
+            responses INTEGER NOT NULL DEFAULT 0,
+            progressions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, grp, measurement_type)
+        ) WITHOUT ROWID;
+
+        CREATE TRIGGER IF NOT EXISTS trg_curves_dynamics_insert AFTER INSERT ON tumor_dynamics
+        BEGIN{_curves_recompute('NEW.patient_code')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_curves_dynamics_delete AFTER DELETE ON tumor_dynamics
+        BEGIN{_curves_recompute('OLD.patient_code')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_curves_dynamics_update AFTER UPDATE ON tumor_dynamics
+        BEGIN{_curves_recompute('OLD.patient_code')}{_curves_recompute('NEW.patient_code')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_curves_patients_insert AFTER INSERT ON patients
+        BEGIN{_curves_recompute('NEW.patient_code')}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_curves_patients_delete AFTER DELETE ON patients
+        BEGIN{_curves_recompute('OLD.patient_code', apply=False)}
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_curves_patients_update
+        AFTER UPDATE OF patient_code, {', '.join(ANALYTICS_GROUPS)} ON patients
+        BEGIN{_curves_recompute('OLD.patient_code')}{_curves_recompute('NEW.patient_code')}
+        END;
+    '''
+
+
+def _response_curves_backfill() -> str:
+    """Заполнение curve_points и curve_stats по всем измерениям (таблицы должны быть пустыми)"""
+    return f'''
+        INSERT INTO curve_points {_curve_points_select('1')};
+        INSERT INTO curve_stats (dimension, grp, measurement_type, n, total, rated, responses, progressions)
+        SELECT dimension, grp, measurement_type, COUNT(*), SUM(tumor_size),
+            COUNT(response), IFNULL(SUM(response), 0), IFNULL(SUM(progression), 0)
+        FROM curve_points
+        GROUP BY dimension, grp, measurement_type;'''
+
+
+# значения со смещением k и k + 1 в порядке размера – для квантиля с интерполяцией
+_CURVE_QUANTILE_SQL = '''
+    SELECT tumor_size FROM curve_points
+    WHERE dimension = ? AND grp = ? AND measurement_type = ?
+    ORDER BY tumor_size
+    LIMIT 2 OFFSET ?
+'''
+
+
+# Версия схемы хранится в PRAGMA user_version: миграция i переводит базу
+# с версии i на i + 1. Базы, созданные до версионирования (user_version = 0),
+# проходят все миграции – поэтому в них IF NOT EXISTS.
+_SCHEMA_BASE = '''
+    -- Таблица пациентов
+    CREATE TABLE IF NOT EXISTS patients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_code TEXT UNIQUE NOT NULL,
+        age INTEGER CHECK (age BETWEEN 0 AND 120),
+        gender TEXT CHECK (gender IN ('Мужской', 'Женский', 'Male', 'Female')),
+        weight REAL CHECK (weight BETWEEN 1 AND 700),
+        height INTEGER CHECK (height BETWEEN 20 AND 300),
+        cancer_type TEXT NOT NULL,
+        cancer_stage TEXT CHECK (cancer_stage IN ('1', '2', '3')),
+        initial_tumor_size REAL CHECK (initial_tumor_size BETWEEN 0.01 AND 20),
+        distant_metastases_count INTEGER DEFAULT 0,
+        treatment_type TEXT,
+        menopausal_status TEXT,
+        histological_grading TEXT CHECK (histological_grading IN ('G1', 'G2', 'G3', 'G4')),
+        ecog INTEGER CHECK (ecog BETWEEN 0 AND 4),
+        er_status BOOLEAN,
+        pr_status BOOLEAN,
+        her2_status BOOLEAN,
+        ki67 REAL,
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- Таблица динамики опухоли
+    CREATE TABLE IF NOT EXISTS tumor_dynamics (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_code TEXT NOT NULL,
+        measurement_date DATE DEFAULT CURRENT_DATE,
+        tumor_size REAL NOT NULL,
+        measurement_type TEXT CHECK (measurement_type IN ('before', '3m', '6m', '12m', '24m')),
+        FOREIGN KEY (patient_code) REFERENCES patients(patient_code) ON DELETE CASCADE,
+        UNIQUE(patient_code, measurement_type)
+    );
+
+    -- Таблица результатов лечения
+    CREATE TABLE IF NOT EXISTS treatment_results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_code TEXT NOT NULL,
+        survival_months REAL CHECK (survival_months >= 0),
+        performance_status INTEGER CHECK (performance_status BETWEEN 0 AND 4),
+        treatment_response TEXT,
+        distant_metastases_count INTEGER DEFAULT 0,
+        created_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (patient_code) REFERENCES patients(patient_code) ON DELETE CASCADE
+    );
+
+    -- Индексы для ускорения поиска
+    CREATE INDEX IF NOT EXISTS idx_patients_code ON patients(patient_code);
+    CREATE INDEX IF NOT EXISTS idx_patients_stage ON patients(cancer_stage);
+    CREATE INDEX IF NOT EXISTS idx_patients_created ON patients(created_date, id);
+    CREATE INDEX IF NOT EXISTS idx_patients_stage_created ON patients(cancer_stage, created_date, id);
+    CREATE INDEX IF NOT EXISTS idx_tumor_patient ON tumor_dynamics(patient_code);
+    CREATE INDEX IF NOT EXISTS idx_tumor_patient_type ON tumor_dynamics(patient_code, measurement_type, tumor_size);
+    CREATE INDEX IF NOT EXISTS idx_results_patient ON treatment_results(patient_code);
+'''
+
+
+# у старых баз сводка уже могла быть – пересоздаём её вместе с триггерами
+_PATIENT_COUNTS_MIGRATION = '''
+    DROP TRIGGER IF EXISTS trg_patient_counts_insert;
+    DROP TRIGGER IF EXISTS trg_patient_counts_delete;
+    DROP TRIGGER IF EXISTS trg_patient_counts_update;
+    DROP TABLE IF EXISTS patient_counts;
+''' + _patient_counts_script() + _patient_counts_backfill()
+
+
+
+def _tumor_series_migration(connection: sqlite3.Connection):
+    for statement in split_sql_script(tumor_series.SERIES_SCHEMA):
+        connection.execute(statement)
+    tumor_series.backfill_from_dynamics(connection)
+
+
+# SQL-скрипт или функция f(connection) – для миграций, которым нужен Python
+MIGRATIONS = (
+    _SCHEMA_BASE,
+    _PATIENT_COUNTS_MIGRATION,
+    _tumor_series_migration,
+    SEQUENCE_SCHEMA,
+    _data_versions_script(('patients',)),
+    _data_versions_script(('tumor_dynamics',)),
+    _response_curves_script() + _response_curves_backfill(),
+)
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def split_sql_script(script: str) -> Iterator[str]:
+    """
+    Скрипт по отдельным операторам: executescript фиксирует открытую
+    транзакцию, а миграция или загрузка должна остаться одной транзакцией.
+    """
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ''
+    if statement.strip():
+        yield statement
+
+
+def migrate(db_name: str, busy_timeout: float = 5.0) -> int:
+    """
+    Применение недостающих миграций одной транзакцией. Если схема актуальна,
+    это одно чтение PRAGMA user_version – без DDL и коммита. BEGIN IMMEDIATE
+    и повторная проверка версии под блокировкой: воркеры, стартующие
+    одновременно, не применяют миграцию дважды. Возвращает версию схемы.
+    """
+    connection = sqlite3.connect(db_name, timeout=busy_timeout, isolation_level=None)
+    try:
+        version = connection.execute('PRAGMA user_version').fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return version
+
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            for step in MIGRATIONS[version:]:
+                if callable(step):
+                    step(connection)
+                    continue
+                for statement in split_sql_script(step):
+                    connection.execute(statement)
+            if version < SCHEMA_VERSION:
+                connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        if version < SCHEMA_VERSION:
+            log_event(logger, 'schema_migrated', db=db_name,
+                      from_version=version, to_version=SCHEMA_VERSION)
+        return max(version, SCHEMA_VERSION)
+    finally:
+        connection.close()
+
+
+# Пагинация списка пациентов
+PATIENTS_PAGE_MAX = 1000
+EXPORT_FETCH_SIZE = 500
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'да', '+')
+    return bool(value)
+
+
+def coerce_patient_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Приведение строковых значений (CSV) к типам колонок; пустые значения пропускаются"""
+    result = {}
+    for key, value in row.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        if key in PATIENT_FIELD_TYPES:
+            cast = PATIENT_FIELD_TYPES[key]
+            try:
+                if cast is bool:
+                    value = _to_bool(value)
+                elif cast is int:
+                    value = int(float(value))
+                else:
+                    value = float(str(value).replace(',', '.'))
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"{key} должен быть числом, получено {value!r}")
+        result[key] = value
+    return result
+
+
+def validate_patient(patient_info: Dict[str, Any]) -> list:
+    """Проверка полей пациента по тем же правилам, что CHECK-ограничения таблицы patients"""
+    errors = []
+
+    def check_range(field, low, high):
+        value = patient_info.get(field)
+        if value is None:
+            return
+        try:
+            if not low <= float(value) <= high:
+                errors.append(f"{field} должен быть от {low} до {high}")
+        except (TypeError, ValueError):
+            errors.append(f"{field} должен быть числом")
+
+    def check_choice(field, choices):
+        value = patient_info.get(field)
+        if value is not None and str(value) not in choices:
+            errors.append(f"{field} должен быть одним из: {', '.join(choices)}")
+
+    if patient_info.get('age') is None:
+        errors.append("age обязателен")
+    if not patient_info.get('cancer_type'):
+        errors.append("cancer_type обязателен")
+
+    check_range('age', 0, 120)
+    check_range('weight', 1, 700)
+    check_range('height', 20, 300)
+    check_range('initial_tumor_size', 0.01, 20)
+    check_range('ecog', 0, 4)
+    check_choice('gender', ('Мужской', 'Женский', 'Male', 'Female'))
+    check_choice('cancer_stage', ('1', '2', '3'))
+    check_choice('histological_grading', ('G1', 'G2', 'G3', 'G4'))
+
+    return errors
+
+def patient_from_frontend(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Преобразуем данные формы фронтенда в формат БД"""
+    return {
+        'age': data.get('age'),
+        'gender': 'Женский' if data.get('sex') == 'female' else 'Мужской',
+        'weight': data.get('weight'),
+        'height': data.get('height'),
+        'cancer_type': data.get('molecular_subtype', {}).get('code', 'Unknown'),
+        'cancer_stage': data.get('cancer_stage'),
+        'initial_tumor_size': data.get('tumour_size_cm'),
+        'distant_metastases_count': data.get('distant_metastasis_count', 0),
+        'histological_grading': 'G2',
+        'ecog': 0,
+        'menopausal_status': data.get('menopause_status'),
+        'treatment_type': data.get('recommended_treatment', {}).get('therapy_type', 'unknown'),
+        'er_status': data.get('ER_status'),
+        'pr_status': data.get('PR_status'),
+        'her2_status': data.get('HER2_status'),
+        'ki67': data.get('ki67')
+    }
+
+
+def _insert_tumor_measurement(connection: sqlite3.Connection, patient_code: str, measurement_date: str,
+                              tumor_size: float, measurement_type: str, day: float):
+    previous = connection.execute(
+        'SELECT measurement_date FROM tumor_dynamics WHERE patient_code = ? AND measurement_type = ?',
+        (patient_code, measurement_type)
+    ).fetchone()
+    connection.execute('''
+        INSERT OR REPLACE INTO tumor_dynamics
+        (patient_code, measurement_date, tumor_size, measurement_type)
+        VALUES (?, ?, ?, ?)
+    ''', (patient_code, measurement_date, tumor_size, measurement_type))
+
+    removed = []
+    if previous is not None:
+        try:
+            removed.append(tumor_series.to_day(previous[0]))
+        except (TypeError, ValueError):
+            pass
+    tumor_series.append_points(connection, {patient_code: {day: tumor_size}}, {patient_code: removed})
+
+
+class BreastCancerDB:
+    def __init__(self, db_name='breast_cancer_database.db', pool_size: int = 8,
+                 write_behind: bool = WRITE_BEHIND,
+                 write_batch_size: int = WRITE_BATCH_SIZE,
+                 write_flush_ms: float = WRITE_FLUSH_MS):
+        # DDL – только если схема отстала от SCHEMA_VERSION
+        migrate(db_name)
+
+        # у каждого потока запроса своё соединение из пула (WAL, busy_timeout);
+        # соединения открываются при первом запросе, а не в конструкторе
+        self.db_name = db_name
+        self.pool = SQLiteConnectionPool(db_name, size=pool_size)
+        self.codes = PatientCodeAllocator(self.pool)
+
+        # в режиме write-behind add_patient / add_tumor_measurement / add_treatment_result
+        # идут через один поток-писатель с групповым коммитом
+        self._writer_options = dict(
+            batch_size=write_batch_size, flush_interval=write_flush_ms / 1000.0
+        ) if write_behind else None
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        # кэш get_response_curves: group_by -> (счётчики data_versions, кривые)
+        self._curves_cache = {}
+        self._curves_locks = {group: threading.Lock() for group in ANALYTICS_GROUPS}
+
+    @property
+    def writer(self) -> Optional[GroupCommitWriter]:
+        """
+        Очередь write-behind (None, если режим выключен). Поток-писатель
+        запускается при первой записи: объект, созданный в мастере
+        gunicorn --preload, переживает fork без потока, которого нет в воркере.
+        """
+        if self._writer is None and self._writer_options is not None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = GroupCommitWriter(self.db_name, **self._writer_options)
+        return self._writer
+
+    def create_patient_code(self, patient_data: Optional[Dict[str, Any]] = None) -> str:
+        """Новый уникальный код пациента из последовательности (patient_codes)"""
+        return self.codes.next_code()
+
+    def _patient_row(self, patient_code: str, patient_info: Dict[str, Any]) -> tuple:
+        """Значения для PATIENT_INSERT_SQL (со значениями по умолчанию)"""
+        return (
+            patient_code,
+            patient_info.get('age'),
+            patient_info.get('gender', 'Женский'),
+            patient_info.get('weight'),
+            patient_info.get('height'),
+            patient_info.get('cancer_type'),
+            patient_info.get('cancer_stage'),
+            patient_info.get('initial_tumor_size'),
+            patient_info.get('distant_metastases_count', 0),
+            patient_info.get('histological_grading', 'G2'),
+            patient_info.get('ecog', 0),
+            patient_info.get('menopausal_status'),
+            patient_info.get('treatment_type'),
+            patient_info.get('er_status'),
+            patient_info.get('pr_status'),
+            patient_info.get('her2_status'),
+            patient_info.get('ki67')
+        )
+
+    def _write(self, sql, params: Sequence) -> Future:
+        """
+        Одиночная запись: через очередь группового коммита, если она включена,
+        иначе сразу своей транзакцией. sql – запрос или функция
+        f(connection, *params) для записи из нескольких операторов.
+        Future завершается после COMMIT (True или исключение sqlite3.Error).
+        """
+        if self.writer is not None:
+            return self.writer.submit(sql, params)
+
+        done = Future()
+        with self.pool.connection() as connection:
+            try:
+                if callable(sql):
+                    sql(connection, *params)
+                else:
+                    connection.execute(sql, params)
+                connection.commit()
+                done.set_result(True)
+            except sqlite3.Error as e:
+                connection.rollback()
+                done.set_exception(e)
+        return done
+
+    def submit_patient(self, patient_info: Dict[str, Any]) -> Tuple[str, Future]:
+        """Код нового пациента сразу и Future подтверждения записи"""
+        patient_code = self.create_patient_code(patient_info)
+        return patient_code, self._write(PATIENT_INSERT_SQL, self._patient_row(patient_code, patient_info))
+
+    def add_patient(self, patient_info: Dict[str, Any]) -> Optional[str]:
+        """Добавление нового пациента"""
+        patient_code, done = self.submit_patient(patient_info)
+        try:
+            done.result()
+        except sqlite3.Error as e:
+            log_event(logger, 'add_patient_failed', level=logging.ERROR, error=str(e))
+            return None
+
+        return patient_code
+
+    def add_patients(self, patients: Iterable[Dict[str, Any]],
+                     chunk_size: int = BULK_CHUNK_SIZE) -> list:
+        """
+        Массовое добавление пациентов.
+
+        Строки проверяются validate_patient (ValueError вместо строки – ошибка
+        её разбора), корректные вставляются через
+        executemany – одна транзакция на chunk_size строк. Если вставка пачки
+        падает (например, UNIQUE), пачка повторяется построчно, чтобы
+        ошибка досталась только виноватой строке.
+        Возвращает [{'index', 'patient_code', 'error'}] в порядке входа.
+        """
+        results = []
+        chunk = []
+
+        def flush():
+            if not chunk:
+                return
+            # соединение – только на запись пачки: пока клиент досылает
+            # следующие строки, оно свободно для других запросов
+            with self.pool.connection() as connection:
+                # коды пачки – один непрерывный блок последовательности
+                codes = self.codes.allocate(len(chunk), connection)
+                self._insert_patient_chunk(connection, [
+                    (index, code, info) for code, (index, info) in zip(codes, chunk)
+                ], results)
+            chunk.clear()
+
+        for index, patient_info in enumerate(patients):
+            if isinstance(patient_info, ValueError):
+                # строка, которую не удалось разобрать (coerce_patient_row)
+                results.append({'index': index, 'patient_code': None, 'error': str(patient_info)})
+                continue
+            if not isinstance(patient_info, dict):
+                results.append({'index': index, 'patient_code': None, 'error': 'Ожидался объект пациента'})
+                continue
+
+            errors = validate_patient(patient_info)
+            if errors:
+                results.append({'index': index, 'patient_code': None, 'error': '; '.join(errors)})
+                continue
+
+            chunk.append((index, patient_info))
+            if len(chunk) >= chunk_size:
+                flush()
+        flush()
+
+        results.sort(key=lambda r: r['index'])
+        return results
+
+    def _insert_patient_chunk(self, connection: sqlite3.Connection, chunk: list, results: list):
+        rows = [self._patient_row(code, info) for _, code, info in chunk]
+        try:
+            connection.executemany(PATIENT_INSERT_SQL, rows)
+            connection.commit()
+            results.extend({'index': index, 'patient_code': code, 'error': None}
+                           for index, code, _ in chunk)
+            return
+        except sqlite3.Error:
+            connection.rollback()
+
+        # построчно, но всё ещё одной транзакцией
+        connection.execute('BEGIN')
+        for (index, code, _), row in zip(chunk, rows):
+            try:
+                connection.execute('SAVEPOINT bulk_row')
+                connection.execute(PATIENT_INSERT_SQL, row)
+                connection.execute('RELEASE bulk_row')
+                results.append({'index': index, 'patient_code': code, 'error': None})
+            except sqlite3.Error as e:
+                connection.execute('ROLLBACK TO bulk_row')
+                connection.execute('RELEASE bulk_row')
+                results.append({'index': index, 'patient_code': None, 'error': str(e)})
+        connection.commit()
+
+    def submit_tumor_measurement(self, patient_code: str, measurement_data: Dict[str, Any]) -> Future:
+        """
+        Измерение опухоли в очередь записи; Future подтверждения записи.
+        Точка попадает и в ряд tumor_series: замена точки того же
+        measurement_type убирает из ряда её прежнюю дату.
+        Некорректные дата или размер – ValueError сразу.
+        """
+        measurement_date = measurement_data.get('measurement_date') or tumor_series.today()
+        day, tumor_size = tumor_series.measurement_point(
+            {'measurement_date': measurement_date, 'tumor_size': measurement_data['tumor_size']}
+        )
+        return self._write(_insert_tumor_measurement, (
+            patient_code, measurement_date, tumor_size, measurement_data['measurement_type'], day
+        ))
+
+    def add_tumor_measurement(self, patient_code: str, measurement_data: Dict[str, Any]) -> bool:
+        """Добавление измерения опухоли"""
+        try:
+            self.submit_tumor_measurement(patient_code, measurement_data).result()
+            return True
+        except (sqlite3.Error, ValueError) as e:
+            log_event(logger, 'add_tumor_measurement_failed', level=logging.ERROR,
+                      patient_code=patient_code, error=str(e))
+            return False
+
+    def add_tumor_series(self, measurements: Iterable[Dict[str, Any]]) -> int:
+        """
+        Пачка измерений с произвольными датами {'patient_code', 'measurement_date',
+        'tumor_size'} в ряды tumor_series – одной транзакцией, по одной перезаписи
+        ряда на пациента. Некорректная строка – ValueError, пачка не пишется.
+        Возвращает число записанных точек.
+        """
+        points = {}
+        for index, measurement in enumerate(measurements):
+            try:
+                day, size = tumor_series.measurement_point(measurement)
+                points.setdefault(str(measurement['patient_code']), {})[day] = size
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f'Измерение #{index}: {e}')
+        if not points:
+            return 0
+
+        with self.pool.connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            written = tumor_series.append_points(connection, points)
+            connection.commit()
+        return written
+
+    def get_tumor_series(self, patient_code: str, start=None, end=None) -> Optional[Dict[str, Any]]:
+        """
+        Ряд измерений пациента (None, если измерений нет) – одно чтение по ключу;
+        start/end – даты, границы включительно.
+        """
+        start, end = self._series_range(start, end)
+        with self.pool.connection() as connection:
+            series = tumor_series.read_series(connection, patient_code)
+        if series is None:
+            return None
+        return tumor_series.series_record(patient_code, *series, start, end)
+
+    def iter_tumor_series(self, start=None, end=None,
+                          fetch_size: int = EXPORT_FETCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """Ряды всех пациентов с измерениями в [start, end] (только точки диапазона)"""
+        start, end = self._series_range(start, end)
+        with self.pool.connection() as connection:
+            cursor = connection.execute(
+                'SELECT patient_code, days, sizes FROM tumor_series WHERE last_day >= ? AND first_day <= ?',
+                (float('-inf') if start is None else start, float('inf') if end is None else end)
+            )
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield tumor_series.series_record(
+                        row['patient_code'], tumor_series.unpack(row['days']),
+                        tumor_series.unpack(row['sizes']), start, end
+                    )
+
+    @staticmethod
+    def _series_range(start, end) -> tuple:
+        try:
+            return (None if start is None else tumor_series.to_day(start),
+                    None if end is None else tumor_series.to_day(end))
+        except (TypeError, ValueError):
+            raise ValueError('Некорректная граница диапазона дат')
+
+    def submit_treatment_result(self, patient_code: str, result_data: Dict[str, Any]) -> Future:
+        """Результат лечения в очередь записи; Future подтверждения записи"""
+        return self._write('''
+            INSERT INTO treatment_results (
+                patient_code, survival_months, performance_status,
+                treatment_response, distant_metastases_count
+            ) VALUES (?, ?, ?, ?, ?)
+        ''', (
+            patient_code,
+            result_data.get('survival_months'),
+            result_data.get('performance_status'),
+            result_data.get('treatment_response'),
+            result_data.get('distant_metastases_count', 0)
+        ))
+
+    def add_treatment_result(self, patient_code: str, result_data: Dict[str, Any]) -> bool:
+        """Добавление результатов лечения"""
+        try:
+            self.submit_treatment_result(patient_code, result_data).result()
+            return True
+        except sqlite3.Error as e:
+            log_event(logger, 'add_treatment_result_failed', level=logging.ERROR,
+                      patient_code=patient_code, error=str(e))
+            return False
+
+    def get_response_curves(self, group_by: str = 'cancer_stage') -> Dict[str, Dict]:
+        """
+        Кривые динамики опухоли по когорте: для каждой группы (стадия, тип рака
+        или тип лечения) и точки измерения – n, среднее, квартили/медиана
+        и доли ответа (<= 70% исходного размера) и прогрессии (>= 120%).
+
+        Считается по сводкам curve_stats / curve_points, которые ведут триггеры:
+        запрос на группу и точку, квантиль – поиск по ключу. Результат ещё и
+        кэшируется до изменения patients или tumor_dynamics (data_versions).
+        Возвращаемый словарь общий для вызовов – не изменять.
+        """
+        if group_by not in ANALYTICS_GROUPS:
+            raise ValueError(f"group_by должен быть одним из: {', '.join(ANALYTICS_GROUPS)}")
+
+        # счётчики читаются до данных: запись между ними лишь заставит пересчитать
+        versions = self._data_versions(CURVES_TABLES)
+        cached = self._curves_cache.get(group_by)
+        if cached is not None and cached[0] == versions:
+            return cached[1]
+
+        # одну группировку считает один поток; остальные группировки не ждут
+        with self._curves_locks[group_by]:
+            cached = self._curves_cache.get(group_by)
+            if cached is not None and cached[0] == versions:
+                return cached[1]
+            curves = self._compute_response_curves(group_by)
+            self._curves_cache[group_by] = (versions, curves)
+        return curves
+
+    def _data_versions(self, tables: Sequence[str]) -> tuple:
+        with self.pool.connection() as connection:
+            return tuple(tuple(row) for row in connection.execute(
+                f"SELECT name, version, modified_at FROM data_versions "
+                f"WHERE name IN ({', '.join('?' * len(tables))}) ORDER BY name",
+                tuple(tables)
+            ))
+
+    def _compute_response_curves(self, group_by: str) -> Dict[str, Dict]:
+        order = {mt: i for i, mt in enumerate(MEASUREMENT_TYPES)}
+        curves = {}
+        with self.pool.connection() as connection:
+            # сводка и точки – из одного снимка
+            connection.execute('BEGIN')
+            try:
+                stats = connection.execute(
+                    'SELECT grp, measurement_type, n, total, rated, responses, progressions '
+                    'FROM curve_stats WHERE dimension = ? AND n > 0', (group_by,)
+                ).fetchall()
+                for row in sorted(stats, key=lambda r: (r['grp'], order.get(r['measurement_type'], 99))):
+                    n = row['n']
+                    point = {'n': n, 'mean': row['total'] / n}
+                    # линейная интерполяция между соседними по порядку значениями
+                    for name, q in CURVE_QUANTILES.items():
+                        position = (n - 1) * q
+                        k = int(position)
+                        values = [r[0] for r in connection.execute(
+                            _CURVE_QUANTILE_SQL, (group_by, row['grp'], row['measurement_type'], k)
+                        )]
+                        point[name] = values[0] + (position - k) * (values[-1] - values[0])
+                    point['response_rate'] = row['responses'] / row['rated'] if row['rated'] else None
+                    point['progression_rate'] = row['progressions'] / row['rated'] if row['rated'] else None
+                    curves.setdefault(row['grp'], {})[row['measurement_type']] = point
+            finally:
+                connection.commit()
+        return curves
+
+    @staticmethod
+    def encode_cursor(row: Dict[str, Any]) -> str:
+        """Курсор страницы – (created_date, id) последней строки"""
+        raw = json.dumps([row['created_date'], row['id']])
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        try:
+            created_date, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return str(created_date), int(row_id)
+        except (ValueError, TypeError):
+            raise ValueError('Некорректный курсор страницы')
+
+    def _patients_query(self, after: Optional[str]) -> tuple:
+        # keyset: идём по индексу idx_patients_created от новых к старым,
+        # глубокие страницы не требуют OFFSET
+        if after is None:
+            return 'SELECT * FROM patients ORDER BY created_date DESC, id DESC', ()
+        return (
+            'SELECT * FROM patients WHERE (created_date, id) < (?, ?) '
+            'ORDER BY created_date DESC, id DESC',
+            self.decode_cursor(after)
+        )
+
+    def get_patients_page(self, limit: int = 100, after: Optional[str] = None) -> tuple:
+        """Страница пациентов (новые сначала) и курсор следующей страницы (или None)"""
+        sql, params = self._patients_query(after)
+        with self.pool.connection() as connection:
+            rows = connection.execute(f'{sql} LIMIT ?', (*params, limit)).fetchall()
+        patients = [dict(row) for row in rows]
+        next_cursor = self.encode_cursor(patients[-1]) if len(patients) == limit else None
+        return patients, next_cursor
+
+    def get_all_patients(self, limit: int = 100) -> list:
+        """Получение списка всех пациентов"""
+        return self.get_patients_page(limit)[0]
+
+    def get_patients_by_stage(self, stage: str) -> list:
+        """Пациенты со стадией рака 1, 2 или 3, новые сначала"""
+        if stage not in ['1', '2', '3']:
+            raise ValueError("Стадия должна быть '1', '2' или '3'")
+
+        # порядок берётся из индекса idx_patients_stage_created, без сортировки
+        with self.pool.connection() as connection:
+            rows = connection.execute('''
+                SELECT * FROM patients
+                WHERE cancer_stage = ?
+                ORDER BY created_date DESC, id DESC
+            ''', (stage,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_patients(self, after: Optional[str] = None,
+                      fetch_size: int = EXPORT_FETCH_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Все пациенты страницами get_patients_page по fetch_size (как
+        AsyncBreastCancerDB.iter_patients): соединение и снимок заняты только
+        на время чтения страницы, а не пока медленный клиент читает выгрузку
+        """
+        while True:
+            patients, after = self.get_patients_page(fetch_size, after)
+            yield from patients
+            if after is None:
+                break
+
+    def get_patient_counts(self) -> Dict[str, Dict]:
+        """Число пациентов по стадии, типу рака и типу лечения (из сводки patient_counts)"""
+        with self.pool.connection() as connection:
+            rows = connection.execute('''
+                SELECT dimension, value, count
+                FROM patient_counts
+                WHERE count > 0
+                ORDER BY dimension, value
+            ''').fetchall()
+
+        counts = {col: {} for col in COUNTED_COLUMNS}
+        for row in rows:
+            # '' (NULL) и настоящее значение 'unknown' – одна корзина
+            bucket = counts[row['dimension']]
+            key = row['value'] or UNKNOWN_VALUE
+            bucket[key] = bucket.get(key, 0) + row['count']
+        return counts
+
+    def get_data_version(self, table: str = 'patients') -> Tuple[int, float]:
+        """
+        (номер изменения, время изменения в секундах Unix) таблицы из
+        VERSIONED_TABLES – для ETag и Last-Modified без запроса к самой таблице
+        """
+        with self.pool.connection() as connection:
+            row = connection.execute(
+                'SELECT version, modified_at FROM data_versions WHERE name = ?', (table,)
+            ).fetchone()
+        if row is None:
+            raise ValueError(f'Для таблицы {table} счётчик изменений не ведётся')
+        return row[0], row[1]
+
+    def get_stage_statistics(self) -> Dict:
+        """Статистика по стадиям рака"""
+        with self.pool.connection() as connection:
+            rows = connection.execute('''
+                SELECT value AS cancer_stage, count
+                FROM patient_counts
+                WHERE dimension = 'cancer_stage' AND count > 0
+                ORDER BY value
+            ''').fetchall()
+        stats = {row['cancer_stage'] or UNKNOWN_VALUE: row['count'] for row in rows}
+        
+        for stage in ['1', '2', '3']:
+            if stage not in stats:
+                stats[stage] = 0
+                
+        return stats
+
+    def close(self):
+        """Закрытие соединений с бд (очередь записи сначала дописывается)"""
+        if self._writer is not None:
+            self._writer.close()
+        self.pool.close()
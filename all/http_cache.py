@@ -0,0 +1,121 @@
+"""
+Условные GET и сжатие ответов API – общее для app.py и asgi_app.py.
+
+Валидаторы ответа (ETag, Last-Modified) строятся из счётчика изменений
+data_versions (BreastCancerDB.get_data_version): если клиент прислал
+тот же ETag, сервер отвечает 304, не выполняя запрос к данным.
+orjson и brotli – необязательные зависимости: без них JSON собирает
+стандартный json, а сжатие – только gzip.
+"""
+import gzip
+import json
+import math
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# ответы меньше этого размера не сжимаются – выигрыш меньше заголовков и CPU
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def json_dumps(payload) -> bytes:
+    """JSON в UTF-8: orjson, если установлен, иначе json; нестроковые ключи (None) – как в json"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def data_etag(version: int, modified: float) -> str:
+    """
+    Слабый ETag: тело зависит от сжатия, а смысл – только от версии данных.
+    Время изменения в теге отличает пересозданную базу с тем же номером версии.
+    """
+    return f'W/"{version}-{int(modified * 1000):x}"'
+
+
+def cache_headers(version: int, modified: float, now: Optional[float] = None) -> Dict[str, str]:
+    """
+    ETag, Last-Modified и no-cache: браузер хранит ответ, но каждый раз сверяет его.
+
+    Last-Modified – время изменения, округлённое вверх до секунды, чтобы
+    вернувшийся в If-Modified-Since заголовок давал 304. Пока эта секунда
+    не прошла, в неё ещё может попасть запись – тогда Last-Modified не
+    отправляется (RFC 9110, 8.8.2.2), и клиент сверяется только по ETag.
+    """
+    headers = {'ETag': data_etag(version, modified), 'Cache-Control': 'no-cache'}
+    last_modified = math.ceil(modified)
+    if (time.time() if now is None else now) >= last_modified:
+        headers['Last-Modified'] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def is_not_modified(if_none_match: Optional[str], if_modified_since: Optional[str],
+                    version: int, modified: float) -> bool:
+    """
+    Можно ли ответить 304 (RFC 9110: If-None-Match со слабым сравнением,
+    If-Modified-Since – только если If-None-Match нет)
+    """
+    if if_none_match:
+        etag = _opaque(data_etag(version, modified))
+        return any(tag.strip() == '*' or _opaque(tag) == etag for tag in if_none_match.split(','))
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        # Last-Modified = ceil(modified) и отправлен только после этой секунды:
+        # свой заголовок клиента даёт 304, а любая запись после ответа – позже since
+        return modified <= since
+    return False
+
+
+def compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """'br' (если есть brotli) или 'gzip' из Accept-Encoding; None – без сжатия"""
+    accepted = set()
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(name.strip().lower())
+
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
@@ -0,0 +1,225 @@
+"""
+Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Гистограммы, счётчики и gauge хранятся в памяти процесса; запись – одно
+сложение под блокировкой, поэтому инструментирование можно не выключать.
+Значения считаются отдельно в каждом процессе (воркере) сервера.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, Dict, Sequence
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# нормализованных запросов больше этого числа – в метку 'other'
+MAX_QUERY_LABELS = 200
+QUERY_LABEL_LENGTH = 160
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _header(self) -> list:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f'{self.name}{_labels(self.labelnames, labels)} {_number(value)}' for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными границами; хранит некумулятивные счётчики корзин"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # labels -> [счётчики корзин + Inf, сумма]
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self) -> list:
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+
+        lines = self._header()
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        # name -> (тип, описание, имена меток, функция {метки: значение}) – считается при запросе
+        self._callbacks: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_callback(self, name: str, kind: str, help_text: str,
+                          func: Callable[[], Dict[tuple, float]], labelnames: Sequence[str] = ()):
+        """Значения, которые уже считает сам объект (например, кэш), без записи на каждой операции"""
+        with self._lock:
+            self._callbacks[name] = (kind, help_text, tuple(labelnames), func)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            callbacks = list(self._callbacks.items())
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, (kind, help_text, labelnames, func) in callbacks:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in func().items():
+                lines.append(f'{name}{_labels(labelnames, labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP-запроса',
+    ('method', 'endpoint', 'status')
+))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'http_requests_in_flight', 'Запросы в обработке', ('method', 'endpoint')
+))
+DB_QUERY_DURATION = REGISTRY.register(Histogram(
+    'db_query_duration_seconds', 'Время выполнения SQL до первой строки по нормализованному запросу',
+    ('query',), buckets=SQL_BUCKETS
+))
+DB_QUERY_ERRORS = REGISTRY.register(Counter(
+    'db_query_errors_total', 'Ошибки SQL по нормализованному запросу', ('query',)
+))
+MODEL_INFERENCE_DURATION = REGISTRY.register(Histogram(
+    'model_inference_duration_seconds', 'Время расчётов модели прогноза', ('operation',)
+))
+
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LISTS = re.compile(r'\?(?:\s*,\s*\?)+')
+_query_labels = set()
+_query_labels_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1024)
+def normalize_query(sql: str) -> str:
+    """
+    Метка запроса: пробелы схлопнуты, литералы и списки параметров заменены
+    на '?', длина ограничена. Число разных меток ограничено MAX_QUERY_LABELS.
+    """
+    query = _WHITESPACE.sub(' ', sql).strip()
+    query = _PLACEHOLDER_LISTS.sub('?+', _LITERALS.sub('?', query))[:QUERY_LABEL_LENGTH]
+    with _query_labels_lock:
+        if query not in _query_labels:
+            if len(_query_labels) >= MAX_QUERY_LABELS:
+                return 'other'
+            _query_labels.add(query)
+    return query
+
+
+def observe_query(sql: str, started: float, failed: bool = False):
+    query = normalize_query(sql)
+    DB_QUERY_DURATION.observe(time.perf_counter() - started, query)
+    if failed:
+        DB_QUERY_ERRORS.inc(query)
+
+
+def register_cache_metrics(cache):
+    """Попадания и промахи PredictionCache – из его собственных счётчиков при каждом /metrics"""
+    def values(key):
+        return lambda: {(): cache.stats()[key]}
+
+    REGISTRY.register_callback('prediction_cache_hits_total', 'counter',
+                               'Попадания в кэш прогнозов', values('hits'))
+    REGISTRY.register_callback('prediction_cache_misses_total', 'counter',
+                               'Промахи кэша прогнозов', values('misses'))
+    REGISTRY.register_callback('prediction_cache_hit_ratio', 'gauge',
+                               'Доля попаданий в кэш прогнозов', values('hit_ratio'))
+    REGISTRY.register_callback('prediction_cache_entries', 'gauge',
+                               'Записей в кэше прогнозов', values('size'))
@@ -0,0 +1,216 @@
+import os
+from typing import Optional, Dict, Any, Sequence
+
+import numpy as np
+
+from metrics import MODEL_INFERENCE_DURATION
+from prediction_cache import PredictionCache
+from tumor_growth.artifacts import load_model
+from tumor_growth.dynamics import gompertz_treated_exact, treatment_effect_coeff, treatment_effect_coeffs
+from tumor_growth.intervals import IntervalSampler, INTERVAL_PERCENTILES
+
+# Артефакты, которые сохраняют ноутбук (раздел "ЭКСПОРТ МОДЕЛИ ДЛЯ API") и `tumor-growth train`;
+# с model_r.npz (`tumor-growth compile`) процесс обходится без catboost и pandas
+MODEL_DIR = os.environ.get(
+    'TUMOR_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model')
+)
+
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 300))
+PREDICTION_INTERVAL_SAMPLES = int(os.environ.get('PREDICTION_INTERVAL_SAMPLES', 1000))
+
+
+class TumorModel:
+    """Модель для r (скомпилированная или CatBoost) и параметры популяции, загруженные один раз на процесс"""
+
+    def __init__(self, model_r, meta: Dict[str, Any],
+                 cache: Optional[PredictionCache] = None):
+        self.model_r = model_r
+        self.feature_cols = list(meta['feature_cols'])
+        self.cat_features_idx = list(meta['cat_features_idx'])
+        self.K_global = float(meta['K_global'])
+        self.gamma_global = float(meta['gamma_global'])
+        self.gamma_by_subtype = {k: float(v) for k, v in meta.get('gamma_by_subtype', {}).items()}
+        self.version = meta.get('version', 'unknown')
+        # интервалы – только для моделей, экспортированных с распределениями остатков
+        self.interval_sampler = (
+            IntervalSampler(meta, n_samples=PREDICTION_INTERVAL_SAMPLES)
+            if 'r_residual_quantiles' in meta else None
+        )
+
+        # кэш прогнозов привязан к версии: новая модель сбрасывает старые записи
+        self.cache = cache if cache is not None else PredictionCache(
+            PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL
+        )
+        self.cache.set_model_version(self.version)
+
+        # первый predict заметно медленнее (у CatBoost и у кэша хэшей категорий) – прогреваем при загрузке
+        example = meta.get('example_patient')
+        if example:
+            self.estimate_r(example)
+
+    @classmethod
+    def load(cls, model_dir: str = MODEL_DIR,
+             cache: Optional[PredictionCache] = None) -> 'TumorModel':
+        """Загрузка модели и метаданных из папки с артефактами"""
+        model_r, meta = load_model(model_dir)
+        return cls(model_r, meta, cache=cache)
+
+    def missing_fields(self, patient_params: Dict[str, Any]) -> list:
+        required = self.feature_cols + ['treatment', 'new_molecular_subtype']
+        return [col for col in required if patient_params.get(col) is None]
+
+    def _feature_row(self, patient_params: Dict[str, Any]) -> list:
+        row = []
+        for i, col in enumerate(self.feature_cols):
+            value = patient_params[col]
+            row.append(str(value) if i in self.cat_features_idx else float(value))
+        return row
+
+    def cache_key(self, patient_params: Dict[str, Any], t_grid: np.ndarray) -> str:
+        """Ключ кэша: нормализованные признаки модели, лечение, подтип и сетка времени"""
+        return self.cache.make_key({
+            'features': self._feature_row(patient_params),
+            'tumor_size_before': float(patient_params['tumor_size_before']),
+            'treatment': patient_params['treatment'],
+            'new_molecular_subtype': patient_params['new_molecular_subtype'],
+            'molecular_subtype': patient_params.get('molecular_subtype'),
+            't_grid': np.round(t_grid, 9).tolist(),
+        })
+
+    def estimate_r(self, patient_params: Dict[str, Any]) -> float:
+        """Оценка скорости роста r по признакам пациента"""
+        return float(self.estimate_r_batch([patient_params])[0])
+
+    def estimate_r_batch(self, patients: Sequence[Dict[str, Any]]) -> np.ndarray:
+        """Оценка r для многих пациентов одним вызовом модели"""
+        rows = [self._feature_row(p) for p in patients]
+        with MODEL_INFERENCE_DURATION.time('catboost_predict'):
+            return np.asarray(self.model_r.predict(rows), dtype=float)
+
+    def estimate_gamma(self, patient_params: Dict[str, Any]) -> float:
+        """Средняя gamma по подтипу, если он был в обучении, иначе общая"""
+        subtype = patient_params.get('molecular_subtype')
+        return self.gamma_by_subtype.get(subtype, self.gamma_global)
+
+    def predict(self,
+                patient_params: Dict[str, Any],
+                t_grid: Optional[Sequence[float]] = None,
+                t_end: float = 36.0,
+                dt: float = 0.25,
+                V0: Optional[float] = None,
+                K: Optional[float] = None,
+                gamma_est: Optional[float] = None):
+        """
+        Прогноз динамики опухоли для пациентки без истории роста
+        (то же, что predict_new_patient_with_catboost в ноутбуке).
+        Возвращает (t_grid, V_pred, params).
+
+        Прогнозы с параметрами по умолчанию (V0, K, gamma из модели) кэшируются.
+        """
+        use_cache = V0 is None and K is None and gamma_est is None
+
+        if t_grid is None:
+            t_grid = np.arange(0.0, t_end + dt, dt)
+        # копия: в кэше массив становится read-only, массив вызывающего – не должен
+        t_grid = np.array(t_grid, dtype=float)
+
+        if use_cache:
+            key = self.cache_key(patient_params, t_grid)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        if V0 is None:
+            V0 = float(patient_params['tumor_size_before'])
+        if K is None:
+            K = self.K_global
+        if gamma_est is None:
+            gamma_est = self.estimate_gamma(patient_params)
+
+        r_est = self.estimate_r(patient_params)
+        base_eff = treatment_effect_coeff(patient_params)
+
+        with MODEL_INFERENCE_DURATION.time('trajectory'):
+            V_pred = gompertz_treated_exact(t_grid, V0, r_est, K, base_eff, gamma_est)
+
+        params = {
+            "r_est": r_est,
+            "K": K,
+            "base_eff": base_eff,
+            "gamma_est": gamma_est,
+        }
+
+        if use_cache:
+            t_grid.setflags(write=False)
+            V_pred.setflags(write=False)
+            self.cache.put(key, (t_grid, V_pred, params))
+
+        return t_grid, V_pred, params
+
+    def predict_intervals(self,
+                          patient_params: Dict[str, Any],
+                          t_grid: Optional[Sequence[float]] = None,
+                          t_end: float = 36.0,
+                          dt: float = 0.25) -> Dict[str, list]:
+        """
+        Перцентили прогноза {'p5': [...], 'p50': [...], 'p95': [...]} на той же
+        сетке, что predict: Монте-Карло по остаткам r, gamma популяции и base_eff.
+        """
+        if self.interval_sampler is None:
+            raise ValueError('Модель экспортирована без распределений для интервалов: переобучите её')
+
+        if t_grid is None:
+            t_grid = np.arange(0.0, t_end + dt, dt)
+        t_grid = np.asarray(t_grid, dtype=float)
+
+        key = self.cache_key(patient_params, t_grid) + ':intervals'
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        with MODEL_INFERENCE_DURATION.time('intervals'):
+            bands = self.interval_sampler.intervals(
+                t_grid,
+                V0=float(patient_params['tumor_size_before']),
+                r_est=self.estimate_r(patient_params),
+                K=self.K_global,
+                base_eff=treatment_effect_coeff(patient_params),
+                subtype=patient_params.get('molecular_subtype'),
+            )
+        intervals = {f'p{p:g}': band.tolist() for p, band in zip(INTERVAL_PERCENTILES, bands)}
+        self.cache.put(key, intervals)
+        return intervals
+
+    def predict_batch(self,
+                      patients: Sequence[Dict[str, Any]],
+                      t_grid: Optional[Sequence[float]] = None,
+                      t_end: float = 36.0,
+                      dt: float = 0.25):
+        """
+        Прогноз сразу для многих пациенток: r одним вызовом модели,
+        траектории – одной операцией numpy над матрицей (пациентки × время).
+        Возвращает (t_grid, V_pred формы (N, T), список params).
+        """
+        if t_grid is None:
+            t_grid = np.arange(0.0, t_end + dt, dt)
+        t_grid = np.asarray(t_grid, dtype=float)
+
+        r_est = self.estimate_r_batch(patients)
+        base_eff = treatment_effect_coeffs([p['treatment'] for p in patients],
+                                           [p['new_molecular_subtype'] for p in patients])
+        gamma_est = np.array([self.estimate_gamma(p) for p in patients], dtype=float)
+        V0 = np.array([float(p['tumor_size_before']) for p in patients])
+
+        with MODEL_INFERENCE_DURATION.time('trajectory_batch'):
+            V_pred = gompertz_treated_exact(
+                t_grid[None, :], V0[:, None], r_est[:, None], self.K_global,
+                base_eff[:, None], gamma_est[:, None]
+            )
+
+        params = [
+            {"r_est": float(r), "K": self.K_global, "base_eff": float(b), "gamma_est": float(g)}
+            for r, b, g in zip(r_est, base_eff, gamma_est)
+        ]
+        return t_grid, V_pred, params
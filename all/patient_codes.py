@@ -0,0 +1,113 @@
+"""
+Коды пациентов из последовательности в базе.
+
+Счётчик patient_code_sequence выдаёт процессу блок номеров одной короткой
+транзакцией (UPDATE ... RETURNING), дальше коды раздаются из памяти без
+обращения к базе. Номера разных блоков не пересекаются, поэтому коды
+уникальны между потоками, воркерами и перезапусками без проверки
+«есть ли такой код» перед вставкой. Код – номер фиксированной ширины
+в hex: строковый порядок совпадает с порядком выдачи, и новые коды
+дописываются в конец idx_patients_code, а не в случайные страницы.
+
+Старые коды (BC_ + 8 hex от SHA-256) короче новых и совпасть с ними не могут.
+Номера блока, не использованного до остановки процесса, пропадают –
+пропуски в нумерации допустимы.
+"""
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+
+CODE_PREFIX = 'BC_'
+CODE_WIDTH = 10  # 16^10 ≈ 10^12 кодов
+
+# сколько номеров процесс забирает у базы за раз
+CODE_BLOCK_SIZE = int(os.environ.get('PATIENT_CODE_BLOCK_SIZE', 256))
+
+SEQUENCE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS patient_code_sequence (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        next_value INTEGER NOT NULL
+    );
+
+    INSERT OR IGNORE INTO patient_code_sequence (id, next_value) VALUES (1, 1);
+'''
+
+_RESERVE_SQL = '''
+    UPDATE patient_code_sequence SET next_value = next_value + ?
+    WHERE id = 1
+    RETURNING next_value
+'''
+
+
+def format_code(value: int) -> str:
+    return f'{CODE_PREFIX}{value:0{CODE_WIDTH}X}'
+
+
+def reserve_block(connection: sqlite3.Connection, n: int) -> int:
+    """
+    Забрать n номеров у последовательности в текущей транзакции соединения.
+    Возвращает первый номер блока [first, first + n).
+    """
+    row = connection.execute(_RESERVE_SQL, (n,)).fetchone()
+    if row is None:
+        raise sqlite3.OperationalError('Нет строки patient_code_sequence – база не мигрирована')
+    return row[0] - n
+
+
+class PatientCodeAllocator:
+    """
+    Раздача кодов из блоков последовательности, потокобезопасно.
+
+    Блок принадлежит процессу: после fork (gunicorn --preload) остаток
+    блока мастера отбрасывается, иначе воркеры выдали бы одни и те же коды.
+    """
+
+    def __init__(self, pool, block_size: int = CODE_BLOCK_SIZE):
+        self.pool = pool
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = self._end = 0
+        self._pid = os.getpid()
+
+    def _reserve(self, n: int, connection: Optional[sqlite3.Connection]) -> int:
+        if connection is None:
+            with self.pool.connection() as connection:
+                return self._reserve(n, connection)
+
+        # своя транзакция: откат вставки не должен вернуть номера,
+        # уже выданные из памяти
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            first = reserve_block(connection, n)
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        return first
+
+    def allocate(self, n: int = 1, connection: Optional[sqlite3.Connection] = None) -> List[str]:
+        """
+        n новых кодов по возрастанию. Остатка блока не хватает – у базы
+        берётся блок не меньше n, так что пачка массовой вставки получает
+        непрерывный диапазон одной транзакцией. connection – соединение
+        вызывающего без открытой транзакции (иначе берётся из пула).
+        """
+        if n <= 0:
+            return []
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._next = self._end = 0
+
+            if self._end - self._next < n:
+                size = max(n, self.block_size)
+                self._next = self._reserve(size, connection)
+                self._end = self._next + size
+
+            first = self._next
+            self._next += n
+        return [format_code(value) for value in range(first, first + n)]
+
+    def next_code(self) -> str:
+        return self.allocate(1)[0]
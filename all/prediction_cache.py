@@ -0,0 +1,77 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+class PredictionCache:
+    """
+    Ограниченный LRU-кэш прогнозов с временем жизни записей (TTL).
+
+    Ключ – хэш нормализованных входов модели вместе с версией модели,
+    поэтому одинаковые формы не пересчитываются. При смене версии модели
+    (set_model_version) кэш очищается.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.model_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def set_model_version(self, version: str):
+        """Привязка к версии модели; новая версия сбрасывает все записи"""
+        with self._lock:
+            if version != self.model_version:
+                self._data.clear()
+                self.model_version = version
+
+    def make_key(self, inputs: Dict[str, Any]) -> str:
+        """Канонический хэш входов (порядок ключей не важен) и версии модели"""
+        payload = json.dumps(
+            {'model_version': self.model_version, 'inputs': inputs},
+            sort_keys=True, ensure_ascii=False, separators=(',', ':')
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий/промахов для мониторинга"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'model_version': self.model_version,
+            }
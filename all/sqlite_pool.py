@@ -0,0 +1,159 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from metrics import observe_query
+
+# PRAGMA для каждого нового соединения:
+#  WAL – читатели не блокируют писателя и наоборот,
+#  synchronous=NORMAL – в режиме WAL безопасно и без fsync на каждый коммит,
+#  cache_size < 0 – размер кэша страниц в КиБ
+CONNECTION_PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA temp_store=MEMORY',
+)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Курсор, который пишет время каждого запроса в db_query_duration_seconds"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        except sqlite3.Error:
+            observe_query(sql, started, failed=True)
+            raise
+        observe_query(sql, started)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+        except sqlite3.Error:
+            observe_query(sql, started, failed=True)
+            raise
+        observe_query(sql, started)
+        return result
+
+    def executescript(self, sql_script):
+        started = time.perf_counter()
+        try:
+            result = super().executescript(sql_script)
+        except sqlite3.Error:
+            observe_query(sql_script, started, failed=True)
+            raise
+        observe_query(sql_script, started)
+        return result
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Соединение с замером запросов (sqlite3.connect(..., factory=TimedConnection)).
+    Для SELECT замеряется время до первой строки; чтение остальных строк
+    (fetchall, итерация) в замер не входит.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class PoolExhaustedError(sqlite3.OperationalError):
+    """Все соединения пула заняты дольше busy_timeout – сервер перегружен, запрос можно повторить"""
+
+
+class SQLiteConnectionPool:
+    """
+    Пул соединений SQLite для многопоточного сервера.
+
+    Каждый поток берёт своё соединение на время запроса (with pool.connection()),
+    поэтому курсоры и транзакции разных запросов не пересекаются.
+    Не используйте с ':memory:' – у каждого соединения была бы своя база.
+    После fork (gunicorn --preload) процесс-потомок не трогает соединения
+    родителя, а открывает свои.
+    """
+
+    def __init__(self, db_name: str, size: int = 8, busy_timeout: float = 5.0):
+        self.db_name = db_name
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        # соединение переходит между потоками, но используется только одним за раз
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout, check_same_thread=False,
+                               factory=TimedConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._after_fork()
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if len(self._all) < self.size:
+                conn = self._connect()
+                self._all.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=self.busy_timeout)
+        except queue.Empty:
+            raise PoolExhaustedError(
+                f'Пул соединений исчерпан: все {self.size} заняты дольше {self.busy_timeout} с'
+            ) from None
+
+    def _after_fork(self):
+        # соединения родителя не закрываем: close() в потомке сбросил бы
+        # блокировки SQLite, которые держит родитель
+        with self._lock:
+            if self._pid != os.getpid():
+                self._all = []
+                self._idle = queue.LifoQueue()
+                self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Соединение из пула; незавершённая транзакция откатывается при возврате"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
+            self._idle = queue.LifoQueue()
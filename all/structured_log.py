@@ -0,0 +1,69 @@
+"""
+Структурированный журнал: одна JSON-строка на событие в stderr.
+
+Частые события (каждый запрос) пишутся с вероятностью LOG_SAMPLE_RATE,
+ошибки, ответы 5xx и медленные запросы (дольше LOG_SLOW_MS) – всегда.
+Содержимое запросов (данные пациентов) в журнал не попадает.
+"""
+import json
+import logging
+import os
+import random
+import sys
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+LOG_SLOW_MS = float(os.environ.get('LOG_SLOW_MS', 1000))
+
+ROOT_LOGGER = 'breast_cancer'
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Логгер breast_cancer.<name>; обработчик JSON в stderr настраивается один раз"""
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter())
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root.getChild(name)
+
+
+def log_event(logger: logging.Logger, event: str, level: int = logging.INFO,
+              sample_rate: float = 1.0, exc_info=None, **fields):
+    """Событие с полями; при sample_rate < 1 пишется только такая доля событий"""
+    if sample_rate < 1.0:
+        if random.random() >= sample_rate:
+            return
+        fields['sample_rate'] = sample_rate
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={'fields': fields})
+
+
+def log_request(logger: logging.Logger, method: str, endpoint: str, status: int, duration: float):
+    """Журнал запроса: ошибки и медленные – всегда, остальные – выборочно"""
+    duration_ms = round(duration * 1000.0, 3)
+    if status >= 500:
+        level, sample_rate = logging.ERROR, 1.0
+    elif duration_ms >= LOG_SLOW_MS:
+        level, sample_rate = logging.WARNING, 1.0
+    else:
+        level, sample_rate = logging.INFO, LOG_SAMPLE_RATE
+    log_event(logger, 'request', level=level, sample_rate=sample_rate,
+              method=method, endpoint=endpoint, status=status, duration_ms=duration_ms)
@@ -0,0 +1,301 @@
+"""
+Генератор синтетической когорты по схеме breast_cancer_database.db
+для нагрузочных тестов и бенчмарков.
+
+Все значения укладываются в CHECK-ограничения таблиц. Динамика опухоли –
+точное решение gompertz_treated_rhs (tumor_growth.gompertz_treated_exact)
+для выбранных случайно r, gamma и base_eff (по лечению и подтипу)
+с мультипликативным шумом измерения. Результаты лечения выводятся из динамики.
+Один и тот же seed даёт одну и ту же когорту; коды пациентов при записи
+в базу берутся из patient_code_sequence, так что повторная загрузка
+добавляет новых пациентов, а не упирается в UNIQUE.
+
+  python synthetic_cohort.py --patients 1000000 --db synthetic.db
+  python synthetic_cohort.py --patients 1000000 --out export/synthetic.arrow
+"""
+import argparse
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterator
+
+import numpy as np
+
+from database import (
+    MEASUREMENT_TYPES, RESPONSE_RATIO, PROGRESSION_RATIO,
+    VERSIONED_TABLES, _patient_counts_script, _patient_counts_backfill, _data_versions_script,
+    _response_curves_script, _response_curves_backfill,
+    bump_data_version, migrate, split_sql_script
+)
+from tumor_growth.dynamics import (
+    SUBTYPE_CODES, TREATMENT_EFFECT_TABLE, TREATMENTS as TREATMENT_TYPES,
+    gompertz_treated_exact, molecular_subtype_index
+)
+from patient_codes import CODE_PREFIX, CODE_WIDTH, reserve_block
+from tumor_series import DAYS_PER_MONTH, SERIES_UPSERT_SQL
+
+GENERATOR_CHUNK_SIZE = 100000
+
+MEASUREMENT_MONTHS = (0.0, 3.0, 6.0, 12.0, 24.0)
+K_SYNTHETIC = 20.0  # верхняя граница initial_tumor_size в CHECK
+MEASUREMENT_NOISE = 0.05
+
+STAGES = np.array(['1', '2', '3'])
+STAGE_P = [0.35, 0.40, 0.25]
+# медиана размера опухоли (см) по стадии
+STAGE_SIZE_MEDIAN = np.array([1.2, 2.6, 4.5])
+
+# порядок – как у строк TREATMENT_EFFECT_TABLE
+TREATMENTS = np.array(TREATMENT_TYPES)
+TREATMENT_P = [0.05, 0.25, 0.45, 0.25]
+
+# неопределённый подтип – 'Unknown' (cancer_type NOT NULL)
+SUBTYPES = np.array(SUBTYPE_CODES + ('Unknown',))
+GRADES = np.array(['G1', 'G2', 'G3', 'G4'])
+GRADE_P = [0.15, 0.45, 0.35, 0.05]
+ECOG_P = [0.50, 0.30, 0.12, 0.06, 0.02]
+
+CREATED_FROM = np.datetime64('2018-01-01T00:00:00')
+CREATED_SPAN_SECONDS = 6 * 365 * 24 * 3600
+
+
+def _patient_codes(first: int, n: int) -> np.ndarray:
+    """Коды n номеров последовательности с first – как patient_codes.format_code"""
+    values = np.char.upper(np.char.mod('%x', np.arange(first, first + n, dtype=np.int64)))
+    return np.char.add(CODE_PREFIX, np.char.zfill(values, CODE_WIDTH))
+
+
+def _timestamps(seconds: np.ndarray) -> np.ndarray:
+    """'YYYY-MM-DD HH:MM:SS', как CURRENT_TIMESTAMP в SQLite"""
+    stamps = np.datetime_as_string(CREATED_FROM + seconds.astype('timedelta64[s]'), unit='s')
+    return np.char.replace(stamps, 'T', ' ')
+
+
+def generate_chunks(n_patients: int, seed: int = 42,
+                    chunk_size: int = GENERATOR_CHUNK_SIZE) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Когорта пачками по chunk_size пациентов: {поле: массив}.
+    Поля patients (как в PATIENT_INSERT_SQL) и created_date,
+    patient_code – номера 1..n_patients (write_sqlite заменяет их блоком последовательности),
+    tumor_size_<тип измерения> для MEASUREMENT_TYPES, measurement_date_<тип>,
+    survival_months, performance_status_result, treatment_response.
+    """
+    for start in range(0, n_patients, chunk_size):
+        n = min(chunk_size, n_patients - start)
+        # у каждой пачки свой поток случайных чисел – пачки не зависят друг от друга
+        rng = np.random.default_rng([seed, start])
+
+        stage_idx = rng.choice(3, size=n, p=STAGE_P)
+        age = np.clip(np.rint(rng.normal(58, 12, n)), 25, 90).astype(np.int64)
+
+        er = rng.random(n) < 0.70
+        pr = np.where(er, rng.random(n) < 0.80, rng.random(n) < 0.08)
+        her2 = rng.random(n) < 0.20
+        ki67 = np.clip(rng.lognormal(np.log(18), 0.6, n), 1.0, 95.0).round(1)
+        subtype_idx = molecular_subtype_index(er, pr, her2, ki67)
+
+        treatment_idx = rng.choice(len(TREATMENTS), size=n, p=TREATMENT_P)
+        base_eff = TREATMENT_EFFECT_TABLE[treatment_idx, subtype_idx]
+
+        V0 = np.clip(rng.lognormal(np.log(STAGE_SIZE_MEDIAN[stage_idx]), 0.35), 0.1, 15.0).round(2)
+        r = np.clip(rng.lognormal(np.log(0.08), 0.5, n), 0.01, 0.5)
+        gamma = rng.uniform(0.0, 0.15, n)
+
+        months = np.array(MEASUREMENT_MONTHS)
+        sizes = gompertz_treated_exact(
+            months[None, :], V0[:, None], r[:, None], K_SYNTHETIC, base_eff[:, None], gamma[:, None]
+        )
+        noise = np.exp(rng.normal(0.0, MEASUREMENT_NOISE, sizes.shape))
+        noise[:, 0] = 1.0  # 'before' – это и есть initial_tumor_size
+        sizes = np.clip(sizes * noise, 0.01, K_SYNTHETIC).round(3)
+
+        created_seconds = rng.integers(0, CREATED_SPAN_SECONDS, n)
+        created_date = _timestamps(created_seconds)
+        created_day = (CREATED_FROM + created_seconds.astype('timedelta64[s]')).astype('datetime64[D]')
+
+        ecog = rng.choice(5, size=n, p=ECOG_P)
+        metastases = np.where(stage_idx == 2, rng.poisson(0.4, n), 0)
+
+        ratio = sizes[:, -1] / sizes[:, 0]
+        response = np.select(
+            [ratio <= 0.05, ratio <= RESPONSE_RATIO, ratio < PROGRESSION_RATIO],
+            ['complete_response', 'partial_response', 'stable_disease'],
+            default='progressive_disease',
+        )
+        survival = np.clip(rng.exponential(60.0 / np.clip(ratio, 0.2, 5.0)), 0.0, 240.0).round(1)
+
+        chunk = {
+            'patient_code': _patient_codes(start + 1, n),
+            'age': age,
+            'gender': np.where(rng.random(n) < 0.99, 'Женский', 'Мужской'),
+            'weight': np.clip(rng.normal(72, 13, n), 40, 160).round(1),
+            'height': np.clip(np.rint(rng.normal(164, 7, n)), 140, 195).astype(np.int64),
+            'cancer_type': SUBTYPES[subtype_idx],
+            'cancer_stage': STAGES[stage_idx],
+            'initial_tumor_size': V0,
+            'distant_metastases_count': metastases,
+            'histological_grading': GRADES[rng.choice(4, size=n, p=GRADE_P)],
+            'ecog': ecog,
+            'menopausal_status': np.where(age + rng.normal(0, 3, n) >= 51, 'post', 'pre'),
+            'treatment_type': TREATMENTS[treatment_idx],
+            'er_status': er,
+            'pr_status': pr,
+            'her2_status': her2,
+            'ki67': ki67,
+            'created_date': created_date,
+            'survival_months': survival,
+            'performance_status_result': np.clip(ecog + rng.integers(-1, 2, n), 0, 4),
+            'treatment_response': response,
+        }
+        for j, mt in enumerate(MEASUREMENT_TYPES):
+            chunk[f'tumor_size_{mt}'] = sizes[:, j]
+            offset = np.rint(months[j] * DAYS_PER_MONTH).astype('timedelta64[D]')
+            chunk[f'measurement_date_{mt}'] = np.datetime_as_string(created_day + offset, unit='D')
+        yield chunk
+
+
+def write_sqlite(chunks: Iterator[Dict[str, np.ndarray]], db_name: str) -> int:
+    """
+    Запись пачек в базу со схемой BreastCancerDB одной транзакцией.
+    Триггеры сводок и вторичные индексы на время загрузки снимаются;
+    в конце индексы строятся заново, patient_counts и сводки кривых
+    пересчитываются одним запросом каждая. Возвращает число пациентов.
+    """
+    migrate(db_name)  # схема и индексы – как у API
+
+    connection = sqlite3.connect(db_name, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=OFF')
+    connection.execute('PRAGMA cache_size=-262144')
+
+    patient_fields = [
+        'patient_code', 'age', 'gender', 'weight', 'height', 'cancer_type', 'cancer_stage',
+        'initial_tumor_size', 'distant_metastases_count', 'histological_grading', 'ecog',
+        'menopausal_status', 'treatment_type', 'er_status', 'pr_status', 'her2_status', 'ki67',
+    ]
+    patient_sql = (f"INSERT INTO patients ({', '.join(patient_fields)}, created_date) "
+                   f"VALUES ({', '.join('?' * (len(patient_fields) + 1))})")
+
+    rows = 0
+    try:
+        connection.execute('BEGIN')
+        connection.execute('DROP TRIGGER IF EXISTS trg_patient_counts_insert')
+        connection.execute('DROP TRIGGER IF EXISTS trg_curves_patients_insert')
+        connection.execute('DROP TRIGGER IF EXISTS trg_curves_dynamics_insert')
+        for table in VERSIONED_TABLES:
+            connection.execute(f'DROP TRIGGER IF EXISTS trg_data_version_{table}_insert')
+        # вторичные индексы строятся заново после загрузки – сортировкой, а не вставкой по одной строке
+        indexes = connection.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+        for name, _ in indexes:
+            connection.execute(f'DROP INDEX {name}')
+
+        for chunk in chunks:
+            # коды – блок последовательности, как у add_patients: повторная загрузка
+            # не столкнётся с уже записанными, а вставки в UNIQUE-индексы идут
+            # по возрастанию кода, в конец индекса
+            n = len(chunk['patient_code'])
+            chunk['patient_code'] = _patient_codes(reserve_block(connection, n), n)
+
+            columns = [chunk[f].tolist() for f in patient_fields + ['created_date']]
+            connection.executemany(patient_sql, zip(*columns))
+
+            codes = chunk['patient_code'].tolist()
+            n_types = len(MEASUREMENT_TYPES)
+            # все измерения пациента подряд – в порядке UNIQUE(patient_code, measurement_type)
+            connection.executemany(
+                'INSERT INTO tumor_dynamics (patient_code, measurement_date, tumor_size, measurement_type) '
+                'VALUES (?, ?, ?, ?)',
+                zip(np.repeat(chunk['patient_code'], n_types).tolist(),
+                    np.column_stack([chunk[f'measurement_date_{mt}'] for mt in MEASUREMENT_TYPES]).ravel().tolist(),
+                    np.column_stack([chunk[f'tumor_size_{mt}'] for mt in MEASUREMENT_TYPES]).ravel().tolist(),
+                    list(MEASUREMENT_TYPES) * len(codes))
+            )
+            # те же точки рядами tumor_series: строка матрицы – упакованный массив пациента
+            days = np.column_stack([
+                chunk[f'measurement_date_{mt}'].astype('datetime64[D]').astype(np.int64) for mt in MEASUREMENT_TYPES
+            ]).astype('<f8')
+            sizes = np.column_stack([chunk[f'tumor_size_{mt}'] for mt in MEASUREMENT_TYPES]).astype('<f8')
+            connection.executemany(
+                SERIES_UPSERT_SQL,
+                zip(codes, [n_types] * len(codes), days[:, 0].tolist(), days[:, -1].tolist(),
+                    [row.tobytes() for row in days], [row.tobytes() for row in sizes])
+            )
+
+            connection.executemany(
+                'INSERT INTO treatment_results (patient_code, survival_months, performance_status, '
+                'treatment_response, distant_metastases_count) VALUES (?, ?, ?, ?, ?)',
+                zip(codes, chunk['survival_months'].tolist(), chunk['performance_status_result'].tolist(),
+                    chunk['treatment_response'].tolist(), chunk['distant_metastases_count'].tolist())
+            )
+            rows += len(codes)
+            print(f"  {rows} пациентов", file=sys.stderr)
+
+        for _, sql in indexes:
+            connection.execute(sql)
+        connection.execute('DELETE FROM patient_counts')
+        connection.execute('DELETE FROM curve_points')
+        connection.execute('DELETE FROM curve_stats')
+        for statement in split_sql_script(_patient_counts_backfill() + _patient_counts_script()
+                                          + _response_curves_backfill() + _response_curves_script()
+                                          + _data_versions_script()):
+            connection.execute(statement)
+        for table in VERSIONED_TABLES:
+            bump_data_version(connection, table)  # один раз вместо триггера на каждую строку
+        connection.execute('COMMIT')
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+    finally:
+        connection.close()
+    return rows
+
+
+def cohort_chunks(chunks: Iterator[Dict[str, np.ndarray]]) -> Iterator[Dict[str, np.ndarray]]:
+    """Пачки генератора в колонках выгрузки cohort_export (для обучения без базы)"""
+    for chunk in chunks:
+        cohort = {
+            'patient_id': chunk['patient_code'].astype(object),
+            'age': chunk['age'],
+            'cancer_stage': chunk['cancer_stage'].astype(object),
+            'molecular_subtype': chunk['cancer_type'].astype(object),
+            'tumor_grade': chunk['histological_grading'].astype(object),
+            'performance_status': chunk['ecog'],
+            'menopausal_status': chunk['menopausal_status'].astype(object),
+            'treatment': chunk['treatment_type'].astype(object),
+            'er_status': chunk['er_status'].astype(np.int64),
+            'pr_status': chunk['pr_status'].astype(np.int64),
+            'her2_status': chunk['her2_status'].astype(np.int64),
+            'ki67_level': chunk['ki67'],
+            'distant_metastases_count': chunk['distant_metastases_count'],
+        }
+        for mt in MEASUREMENT_TYPES:
+            cohort[f'tumor_size_{mt}'] = chunk[f'tumor_size_{mt}']
+        cohort['survival_months'] = chunk['survival_months']
+        yield cohort
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Синтетическая когорта пациентов')
+    parser.add_argument('--patients', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--chunk-size', type=int, default=GENERATOR_CHUNK_SIZE)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--db', help='SQLite-файл (схема BreastCancerDB)')
+    target.add_argument('--out', help='столбцовый файл: .arrow, .parquet или папка .npy')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    chunks = generate_chunks(args.patients, args.seed, args.chunk_size)
+    if args.db:
+        n = write_sqlite(chunks, args.db)
+        # patients, tumor_dynamics, treatment_results и tumor_series
+        rows = n * (1 + len(MEASUREMENT_TYPES) + 1 + 1)
+    else:
+        from cohort_export import write_cohort
+        n = write_cohort(cohort_chunks(chunks), args.out, total=args.patients)
+        rows = n
+    elapsed = time.perf_counter() - started
+    print(f"Пациентов: {n}, строк: {rows}, {elapsed:.1f} с ({rows / elapsed:,.0f} строк/с)")
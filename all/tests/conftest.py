@@ -0,0 +1,36 @@
+import pytest
+
+from database import BreastCancerDB
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'test.db')
+
+
+@pytest.fixture
+def db(db_path):
+    database = BreastCancerDB(db_path, pool_size=2)
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def flask_app(db_path, tmp_path):
+    from app import create_app
+
+    # папка без артефактов: модель не загружается, API данных работает
+    application = create_app(db_path, model_dir=str(tmp_path / 'no-model'))
+    yield application
+    application.extensions['api'].db.close()
+
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+
+def patient(**fields):
+    row = {'age': 55, 'cancer_type': 'TNBC', 'cancer_stage': '2', 'initial_tumor_size': 2.5}
+    row.update(fields)
+    return row
@@ -0,0 +1,47 @@
+from contextlib import ExitStack
+
+from conftest import patient
+
+
+def test_bulk_ndjson_bad_utf8_line_is_row_error(client):
+    body = b'\n'.join([
+        b'{"age": 50, "cancer_type": "TNBC", "cancer_stage": "1"}',
+        b'{"age": 51, "cancer_type": "\xff\xfe"}',
+        b'{"age": 52, "cancer_type": "TNBC", "cancer_stage": "2"}',
+    ])
+    response = client.post('/api/patients/bulk', data=body, content_type='application/x-ndjson')
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [r['patient_code'] is not None for r in results] == [True, False, True]
+    assert 'UTF-8' in results[1]['error']
+
+
+def test_bulk_csv_bad_utf8_keeps_committed_rows(client):
+    body = (b'age,cancer_type,cancer_stage\n'
+            b'50,TNBC,1\n'
+            b'51,TNBC,2\n'
+            b'52,\xff,3\n'
+            b'53,TNBC,1\n')
+    response = client.post('/api/patients/bulk', data=body, content_type='text/csv')
+
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert payload['inserted'] == 2
+    assert [r['patient_code'] is not None for r in payload['results']] == [True, True, False]
+    assert 'UTF-8' in payload['results'][-1]['error']
+
+
+def test_add_patients_releases_connection_between_chunks(db):
+    db.pool.busy_timeout = 0.05
+
+    def rows():
+        for i in range(5):
+            # add_patients не держит соединение, пока читает вход
+            with ExitStack() as stack:
+                for _ in range(db.pool.size):
+                    stack.enter_context(db.pool.connection())
+            yield patient(age=40 + i)
+
+    results = db.add_patients(rows(), chunk_size=2)
+    assert all(r['patient_code'] for r in results) and len(results) == 5
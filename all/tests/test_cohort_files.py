@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cohort_export import write_cohort
+from synthetic_cohort import cohort_chunks, generate_chunks
+from tumor_growth.cohort import read_cohort
+
+
+@pytest.mark.parametrize('name', ['cohort', 'cohort.arrow'])
+def test_read_cohort_from_export(tmp_path, name):
+    if name.endswith('.arrow'):
+        pytest.importorskip('pyarrow')
+    path = str(tmp_path / name)  # без расширения – папка .npy
+    write_cohort(cohort_chunks(generate_chunks(40, seed=3)), path, total=40)
+
+    df = read_cohort([path])
+    assert len(df) == 40
+    assert df['molecular_subtype'].dtype == object
+    assert df['new_molecular_subtype'].notna().all()
+
+
+def test_train_model_r_writes_no_catboost_info(tmp_path, monkeypatch):
+    from tumor_growth.training import train_model_r
+
+    df = pd.DataFrame(next(cohort_chunks(generate_chunks(60, seed=5))))
+    df['r_fit'] = np.random.default_rng(0).uniform(0.01, 0.3, len(df))
+    monkeypatch.chdir(tmp_path)
+    train_model_r(df)
+    assert not (tmp_path / 'catboost_info').exists()
@@ -0,0 +1,115 @@
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import patient
+from database import COUNTED_COLUMNS, SCHEMA_VERSION, UNKNOWN_VALUE, BreastCancerDB, migrate
+
+SHIPPED_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'breast_cancer_database.db')
+
+
+def expected_counts(connection):
+    """patient_counts прямым GROUP BY по patients"""
+    counts = {}
+    for col in COUNTED_COLUMNS:
+        bucket = counts[col] = {}
+        for value, count in connection.execute(f'SELECT {col}, COUNT(*) FROM patients GROUP BY {col}'):
+            key = value or UNKNOWN_VALUE
+            bucket[key] = bucket.get(key, 0) + count
+    return counts
+
+
+def test_shipped_database_migrates_to_latest(tmp_path):
+    path = str(tmp_path / 'shipped.db')
+    shutil.copyfile(SHIPPED_DB, path)
+
+    # строки, записанные до миграций: старые коды, NULL в группах, измерения
+    connection = sqlite3.connect(path)
+    assert connection.execute('PRAGMA user_version').fetchone()[0] == 0
+    connection.executemany(
+        'INSERT INTO patients (patient_code, age, cancer_type, cancer_stage, treatment_type) '
+        'VALUES (?, ?, ?, ?, ?)',
+        [('BC_1A2B3C4D', 50, 'TNBC', '2', 'surgery_chemo'),
+         ('BC_5E6F7A8B', 61, 'HR+HER2-A', None, None)]
+    )
+    connection.executemany(
+        'INSERT INTO tumor_dynamics (patient_code, measurement_date, tumor_size, measurement_type) '
+        'VALUES (?, ?, ?, ?)',
+        [('BC_1A2B3C4D', '2024-01-10', 3.0, 'before'), ('BC_1A2B3C4D', '2024-04-10', 1.5, '3m')]
+    )
+    connection.commit()
+    connection.close()
+
+    database = BreastCancerDB(path, pool_size=2)
+    try:
+        with database.pool.connection() as connection:
+            assert connection.execute('PRAGMA user_version').fetchone()[0] == SCHEMA_VERSION
+            assert database.get_patient_counts() == expected_counts(connection)
+
+        assert database.get_tumor_series('BC_1A2B3C4D')['tumor_sizes'] == [3.0, 1.5]
+        assert database.get_response_curves('cancer_stage')['2']['3m']['response_rate'] == 1.0
+        assert database.get_data_version('patients')[0] >= 0
+
+        code = database.add_patient(patient())
+        assert code.startswith('BC_') and len(code) == len('BC_') + 10
+    finally:
+        database.close()
+
+    # актуальная схема – повторный запуск ничего не меняет
+    assert migrate(path) == SCHEMA_VERSION
+
+
+def test_patient_counts_follow_writes(db):
+    codes = [db.add_patient(patient(cancer_stage=stage, treatment_type=treatment))
+             for stage, treatment in [('1', 'surgery_only'), ('2', None), (None, 'unknown'),
+                                      ('3', 'surgery_chemo'), ('2', 'surgery_only')]]
+
+    with db.pool.connection() as connection:
+        assert db.get_patient_counts() == expected_counts(connection)
+        # NULL и настоящее значение 'unknown' – одна корзина
+        assert db.get_patient_counts()['treatment_type'][UNKNOWN_VALUE] == 2
+
+        connection.execute('BEGIN IMMEDIATE')
+        connection.execute("UPDATE patients SET treatment_type = NULL, cancer_stage = '1' "
+                           "WHERE patient_code = ?", (codes[0],))
+        connection.execute("UPDATE patients SET cancer_stage = '3', cancer_type = 'HR-HER2+' "
+                           "WHERE patient_code = ?", (codes[2],))
+        connection.execute('DELETE FROM patients WHERE patient_code = ?', (codes[3],))
+        connection.commit()
+
+        assert db.get_patient_counts() == expected_counts(connection)
+        assert 'surgery_chemo' not in db.get_patient_counts()['treatment_type']
+
+
+def test_keyset_pages_with_same_second_inserts(db):
+    for i in range(7):
+        db.add_patient(patient(age=30 + i))
+    with db.pool.connection() as connection:
+        connection.execute('BEGIN IMMEDIATE')
+        connection.execute("UPDATE patients SET created_date = '2024-05-01 12:00:00'")
+        connection.commit()
+    expected = [p['id'] for p in db.iter_patients()]
+    assert expected == sorted(expected, reverse=True)
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = db.get_patients_page(3, after=cursor)
+        seen.extend(p['id'] for p in page)
+        if cursor is None:
+            break
+        # новая строка в ту же секунду – впереди курсора, уже выданные не сдвигает
+        db.add_patient(patient(age=80))
+        with db.pool.connection() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute("UPDATE patients SET created_date = '2024-05-01 12:00:00' "
+                               "WHERE created_date != '2024-05-01 12:00:00'")
+            connection.commit()
+
+    assert seen == expected
+
+
+def test_bad_cursor_rejected(db):
+    with pytest.raises(ValueError):
+        db.get_patients_page(10, after='not-a-cursor')
@@ -0,0 +1,70 @@
+import math
+import time
+
+import pytest
+
+from conftest import patient
+from http_cache import cache_headers, is_not_modified
+
+ENDPOINTS = ('/api/patients', '/api/stage-statistics', '/api/statistics')
+
+
+def wait_for_last_modified(db):
+    """Last-Modified отправляется только после секунды последней записи"""
+    _, modified = db.get_data_version('patients')
+    time.sleep(max(0.0, math.ceil(modified) - time.time()) + 0.05)
+
+
+def test_last_modified_withheld_within_modification_second():
+    headers = cache_headers(3, 1000.25, now=1000.5)
+    assert 'Last-Modified' not in headers
+    assert cache_headers(3, 1000.25, now=1001.0)['Last-Modified'] == 'Thu, 01 Jan 1970 00:16:41 GMT'
+
+
+def test_if_modified_since_same_second_write_is_modified():
+    last_modified = cache_headers(1, 1000.25, now=1001.0)['Last-Modified']
+    assert is_not_modified(None, last_modified, 1, 1000.25)
+    # запись после отправки заголовка
+    assert not is_not_modified(None, last_modified, 2, 1001.3)
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_if_none_match_round_trip(client, flask_app, endpoint):
+    db = flask_app.extensions['api'].db
+    db.add_patient(patient())
+
+    first = client.get(endpoint)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert client.get(endpoint, headers={'If-None-Match': etag}).status_code == 304
+
+    db.add_patient(patient(cancer_stage='3'))
+    changed = client.get(endpoint, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('endpoint', ENDPOINTS)
+def test_if_modified_since_round_trip(client, flask_app, endpoint):
+    db = flask_app.extensions['api'].db
+    db.add_patient(patient())
+    wait_for_last_modified(db)
+
+    first = client.get(endpoint)
+    last_modified = first.headers['Last-Modified']
+    assert client.get(endpoint, headers={'If-Modified-Since': last_modified}).status_code == 304
+
+    db.add_patient(patient(cancer_stage='1'))
+    assert client.get(endpoint, headers={'If-Modified-Since': last_modified}).status_code == 200
+
+
+def test_if_none_match_has_priority(client, flask_app):
+    db = flask_app.extensions['api'].db
+    db.add_patient(patient())
+    wait_for_last_modified(db)
+
+    last_modified = client.get('/api/statistics').headers['Last-Modified']
+    response = client.get('/api/statistics', headers={
+        'If-None-Match': 'W/"other"', 'If-Modified-Since': last_modified
+    })
+    assert response.status_code == 200
@@ -0,0 +1,32 @@
+import json
+
+from conftest import patient
+from database import EXPORT_FETCH_SIZE
+
+
+def test_ndjson_export_pages_without_holding_connection(flask_app, client, monkeypatch):
+    api_db = flask_app.extensions['api'].db
+    total = 2 * EXPORT_FETCH_SIZE + 7
+    api_db.add_patients(patient(age=30 + i % 50) for i in range(total))
+
+    borrowed = []
+    connection = api_db.pool.connection
+
+    def counting_connection():
+        borrowed.append(1)
+        return connection()
+
+    monkeypatch.setattr(api_db.pool, 'connection', counting_connection)
+    response = client.get('/api/patients?format=ndjson')
+
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == len({r['patient_code'] for r in rows}) == total
+    assert len(borrowed) == 3  # по соединению на страницу
+
+
+def test_iter_patients_resumes_after_cursor(db):
+    for i in range(5):
+        db.add_patient(patient(age=40 + i))
+    first, cursor = db.get_patients_page(2)
+    rest = list(db.iter_patients(after=cursor, fetch_size=2))
+    assert [p['id'] for p in first + rest] == [p['id'] for p in db.iter_patients(fetch_size=10)]
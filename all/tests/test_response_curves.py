@@ -0,0 +1,92 @@
+import statistics
+
+import pytest
+
+from conftest import patient
+from database import ANALYTICS_GROUPS, UNKNOWN_VALUE
+
+
+def expected_curves(db, group_by):
+    """Кривые прямым подсчётом по patients и tumor_dynamics"""
+    with db.pool.connection() as connection:
+        rows = connection.execute(f'''
+            SELECT p.{group_by} AS grp, d.measurement_type, d.tumor_size, b.tumor_size AS baseline
+            FROM tumor_dynamics d
+            JOIN patients p ON p.patient_code = d.patient_code
+            LEFT JOIN tumor_dynamics b
+              ON b.patient_code = d.patient_code AND b.measurement_type = 'before'
+        ''').fetchall()
+    samples = {}
+    for row in rows:
+        key = (row['grp'] or UNKNOWN_VALUE, row['measurement_type'])
+        samples.setdefault(key, []).append((row['tumor_size'], row['baseline']))
+
+    curves = {}
+    for (grp, measurement_type), points in samples.items():
+        sizes = [size for size, _ in points]
+        rated = [(size, base) for size, base in points if base]
+        q25, median, q75 = (statistics.quantiles(sizes, n=4, method='inclusive')
+                            if len(sizes) > 1 else sizes * 3)
+        curves.setdefault(grp, {})[measurement_type] = {
+            'n': len(sizes), 'mean': statistics.fmean(sizes),
+            'q25': q25, 'median': median, 'q75': q75,
+            'response_rate': (sum(size <= 0.7 * base for size, base in rated) / len(rated)
+                              if rated else None),
+            'progression_rate': (sum(size >= 1.2 * base for size, base in rated) / len(rated)
+                                 if rated else None),
+        }
+    return curves
+
+
+def assert_curves_match(db):
+    for group_by in ANALYTICS_GROUPS:
+        actual = db.get_response_curves(group_by)
+        expected = expected_curves(db, group_by)
+        assert actual.keys() == expected.keys()
+        for grp, points in expected.items():
+            assert actual[grp].keys() == points.keys()
+            for measurement_type, point in points.items():
+                assert actual[grp][measurement_type] == pytest.approx(point)
+
+
+@pytest.fixture
+def cohort(db):
+    codes = []
+    for i in range(12):
+        code = db.add_patient(patient(
+            cancer_stage=str(1 + i % 3), treatment_type=None if i % 4 == 0 else 'surgery_only'))
+        db.add_tumor_measurement(code, {'tumor_size': 2.0 + i % 5, 'measurement_type': 'before'})
+        db.add_tumor_measurement(code, {'tumor_size': 1.0 + i * 0.4, 'measurement_type': '6m'})
+        codes.append(code)
+    return codes
+
+
+def test_curves_match_direct_computation(db, cohort):
+    assert_curves_match(db)
+    assert db.get_response_curves('treatment_type')[UNKNOWN_VALUE]['before']['n'] == 3
+
+
+def test_curves_follow_inserts_updates_and_deletes(db, cohort):
+    db.get_response_curves('cancer_stage')
+
+    db.add_tumor_measurement(cohort[0], {'tumor_size': 0.5, 'measurement_type': '12m'})
+    new = db.add_patient(patient(cancer_stage='3'))
+    db.add_tumor_measurement(new, {'tumor_size': 9.0, 'measurement_type': '6m'})
+    with db.pool.connection() as connection:
+        connection.execute('BEGIN IMMEDIATE')
+        # смена группы, исходного размера, удаление baseline и пациента
+        connection.execute("UPDATE patients SET cancer_stage = '1', treatment_type = NULL "
+                           "WHERE patient_code = ?", (cohort[1],))
+        connection.execute("UPDATE tumor_dynamics SET tumor_size = 10 "
+                           "WHERE patient_code = ? AND measurement_type = 'before'", (cohort[2],))
+        connection.execute("DELETE FROM tumor_dynamics "
+                           "WHERE patient_code = ? AND measurement_type = 'before'", (cohort[3],))
+        connection.execute('DELETE FROM patients WHERE patient_code = ?', (cohort[4],))
+        connection.commit()
+
+    assert_curves_match(db)
+
+
+def test_unknown_group_by_rejected(db):
+    with pytest.raises(ValueError):
+        db.get_response_curves('age')
@@ -0,0 +1,37 @@
+import sqlite3
+from contextlib import ExitStack
+
+import pytest
+
+from sqlite_pool import PoolExhaustedError, SQLiteConnectionPool
+
+
+def test_exhausted_pool_raises_operational_error(db_path):
+    pool = SQLiteConnectionPool(db_path, size=1, busy_timeout=0.05)
+    try:
+        with pool.connection():
+            with pytest.raises(PoolExhaustedError, match='исчерпан') as info:
+                with pool.connection():
+                    pass
+        assert isinstance(info.value, sqlite3.OperationalError)
+
+        # возвращённое соединение снова выдаётся
+        with pool.connection() as connection:
+            assert connection.execute('SELECT 1').fetchone()[0] == 1
+    finally:
+        pool.close()
+
+
+def test_exhausted_pool_maps_to_503(flask_app, client):
+    pool = flask_app.extensions['api'].db.pool
+    pool.busy_timeout = 0.05
+    with ExitStack() as stack:
+        for _ in range(pool.size):
+            stack.enter_context(pool.connection())
+        response = client.get('/api/statistics')
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert response.get_json()['success'] is False
+
+    assert client.get('/api/statistics').status_code == 200
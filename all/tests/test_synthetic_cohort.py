@@ -0,0 +1,22 @@
+from conftest import patient
+from database import BreastCancerDB
+from synthetic_cohort import generate_chunks, write_sqlite
+
+
+def test_same_seed_reload_appends_patients(db_path):
+    assert write_sqlite(generate_chunks(30, seed=7, chunk_size=20), db_path) == 30
+    assert write_sqlite(generate_chunks(30, seed=7, chunk_size=20), db_path) == 30
+
+    database = BreastCancerDB(db_path, pool_size=2)
+    try:
+        with database.pool.connection() as connection:
+            codes = [row[0] for row in connection.execute(
+                'SELECT patient_code FROM patients ORDER BY patient_code')]
+        assert len(codes) == len(set(codes)) == 60
+        assert sum(database.get_stage_statistics().values()) == 60
+
+        # API продолжает последовательность после загруженных кодов
+        code = database.add_patient(patient())
+        assert code is not None and code > codes[-1]
+    finally:
+        database.close()
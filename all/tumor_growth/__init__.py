@@ -0,0 +1,44 @@
+"""
+Модель роста опухоли молочной железы: уравнение Гомпертца с лечением
+и резистентностью, подгонка (r, gamma) по динамике пациенток и CatBoost
+для оценки r по признакам (перенесено из breast_cancer.ipynb).
+
+Имена пакета импортируют свои подмодули при первом обращении: воркерам
+API (dynamics, intervals, compiled) не нужны pandas, scipy и CatBoost.
+Подмодули training и predict импортируются отдельно – им нужен CatBoost.
+"""
+from importlib import import_module
+
+_EXPORTS = {
+    'TIMES': 'dynamics',
+    'TUMOR_SIZE_COLS': 'dynamics',
+    'add_molecular_subtype': 'dynamics',
+    'cohort_K': 'dynamics',
+    'define_breast_cancer_subtype': 'dynamics',
+    'gompertz_treated_exact': 'dynamics',
+    'molecular_subtype_codes': 'dynamics',
+    'patient_series': 'dynamics',
+    'simulate_patient': 'dynamics',
+    'treatment_effect_coeff': 'dynamics',
+    'treatment_effect_coeffs': 'dynamics',
+    'fit_cohort': 'fitting',
+    'fit_cohort_vectorized': 'fitting',
+    'fit_patient': 'fitting',
+    'FitStore': 'fit_store',
+    'fit_input_hashes': 'fit_store',
+    'refit_cohort': 'fit_store',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,45 @@
+"""
+Файлы модели в папке артефактов и их загрузка.
+
+model_r.npz (скомпилированные деревья, compiled.py) загружается без
+catboost и pandas; CatBoost импортируется только для папок, где есть
+лишь model_r.cbm (или npz собран из другой версии модели).
+"""
+import json
+import os
+
+from .compiled import COMPILED_FILE, CompiledTreeModel
+
+# артефакты модели: CatBoost для r и метаданные (признаки, K, gamma по подтипам)
+MODEL_FILE = 'model_r.cbm'
+META_FILE = 'model_meta.json'
+
+
+def load_meta(model_dir: str) -> dict:
+    with open(os.path.join(model_dir, META_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_model(model_dir: str, compiled: bool = True) -> tuple:
+    """
+    (model_r, meta) из папки с артефактами. model_r – CompiledTreeModel,
+    если есть model_r.npz той же версии, иначе CatBoostRegressor;
+    predict у обоих принимает одинаковые строки признаков.
+    """
+    meta = load_meta(model_dir)
+
+    compiled_path = os.path.join(model_dir, COMPILED_FILE)
+    if compiled and os.path.exists(compiled_path):
+        model_r = CompiledTreeModel.load(compiled_path)
+        if model_r.version == meta.get('version'):
+            return model_r, meta
+
+    model_path = os.path.join(model_dir, MODEL_FILE)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Файл модели не найден: {model_path}")
+
+    from catboost import CatBoostRegressor
+
+    model_r = CatBoostRegressor()
+    model_r.load_model(model_path)
+    return model_r, meta
@@ -0,0 +1,153 @@
+"""
+Командная строка модели роста опухоли:
+
+  tumor-growth fit     --cohort cohort.arrow [--store fit_store.db]
+  tumor-growth train   --cohort cohort.arrow [--store fit_store.db] [--model-dir model]
+  tumor-growth predict --patients patients.json [--model-dir model] [--t-end 36 --dt 0.25] [--intervals]
+  tumor-growth compile [--model-dir model] [--cohort cohort.arrow]
+
+fit и train переподгоняют только новых и изменившихся пациенток (FitStore),
+train затем обучает CatBoost на всей объединённой когорте. compile собирает
+model_r.npz (модель r без CatBoost) для папки, экспортированной ноутбуком.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from .cohort import read_cohort
+from .fit_store import FitStore, refit_cohort
+
+
+def _refit(args) -> tuple:
+    started = time.perf_counter()
+    df = read_cohort(args.cohort)
+    store = FitStore(args.store)
+    try:
+        fits, K, n_refit = refit_cohort(df, store)
+    finally:
+        store.close()
+    print(f"Подгонка: {n_refit} из {len(df)} пациенток пересчитано, K = {K:.4f}, "
+          f"{time.perf_counter() - started:.1f} с", file=sys.stderr)
+    return df, fits, K
+
+
+def cmd_fit(args):
+    _refit(args)
+
+
+def cmd_train(args):
+    from .training import export_model, select_training_rows, train_model_r
+
+    df, fits, K = _refit(args)
+    df_train_r = select_training_rows(df, fits)
+    print(f"Пациенток с хорошей подгонкой: {len(df_train_r)}", file=sys.stderr)
+
+    model_r, feature_cols, cat_features_idx, X_train, metrics = train_model_r(df_train_r)
+    version = export_model(args.model_dir, model_r, feature_cols, cat_features_idx, K, df_train_r, X_train,
+                           r_residual_quantiles=metrics.pop('r_residual_quantiles'))
+    print(json.dumps({'version': version, 'model_dir': args.model_dir, **metrics}, ensure_ascii=False))
+
+
+def _read_patients(path: str) -> pd.DataFrame:
+    """JSON-массив пациентов, NDJSON или файл когорты"""
+    if path.endswith(('.json', '.ndjson', '.jsonl')) or path == '-':
+        text = sys.stdin.read() if path == '-' else open(path, encoding='utf-8').read()
+        text = text.strip()
+        if text.startswith('['):
+            return pd.DataFrame(json.loads(text))
+        return pd.DataFrame([json.loads(line) for line in text.splitlines() if line.strip()])
+    return read_cohort([path])
+
+
+def cmd_predict(args):
+    from .artifacts import load_model
+    from .intervals import INTERVAL_PERCENTILES, IntervalSampler
+    from .predict import predict_patients
+
+    model_r, meta = load_model(args.model_dir)
+    sampler = IntervalSampler(meta) if args.intervals else None
+    patients = _read_patients(args.patients)
+    t_grid, V_pred, params = predict_patients(patients, model_r, meta, t_end=args.t_end, dt=args.dt)
+
+    ids = patients['patient_id'] if 'patient_id' in patients.columns else patients.index
+    subtypes = patients['molecular_subtype'] if 'molecular_subtype' in patients.columns else [None] * len(patients)
+    times = t_grid.tolist()
+    for patient_id, V, p, subtype, V0 in zip(ids, V_pred, params.to_dict('records'), subtypes,
+                                             patients['tumor_size_before'].astype(float)):
+        record = {
+            'patient_id': patient_id if isinstance(patient_id, str) else int(patient_id),
+            'times': times,
+            'tumor_size': V.tolist(),
+            'params': p,
+            'model_version': meta.get('version'),
+        }
+        if sampler is not None:
+            bands = sampler.intervals(t_grid, V0, p['r_est'], p['K'], p['base_eff'], subtype)
+            record['intervals'] = {f'p{q:g}': band.tolist() for q, band in zip(INTERVAL_PERCENTILES, bands)}
+        print(json.dumps(record, ensure_ascii=False))
+
+
+def cmd_compile(args):
+    from catboost import CatBoostRegressor
+
+    from .artifacts import MODEL_FILE, load_meta
+    from .compiled import COMPILED_FILE, compile_model
+    from .predict import feature_frame
+
+    meta = load_meta(args.model_dir)
+    model_r = CatBoostRegressor()
+    model_r.load_model(os.path.join(args.model_dir, MODEL_FILE))
+
+    # сверка с CatBoost: пример из meta и, если задана, когорта
+    check = pd.DataFrame([meta['example_patient']]) if meta.get('example_patient') else None
+    if args.cohort:
+        cohort = read_cohort(args.cohort)
+        check = pd.concat([check, cohort[meta['feature_cols']]], ignore_index=True)
+    if check is not None:
+        check = feature_frame(check, meta['feature_cols'], meta['cat_features_idx'])
+
+    path = os.path.join(args.model_dir, COMPILED_FILE)
+    compile_model(model_r, path, version=meta.get('version'), check_rows=check)
+    print(json.dumps({'version': meta.get('version'), 'compiled': path,
+                      'checked_rows': 0 if check is None else len(check)}, ensure_ascii=False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='tumor-growth', description='Модель роста опухоли (Гомпертц + CatBoost)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name, func, help_text in (
+        ('fit', cmd_fit, 'подгонка (r, gamma) с хранилищем по хэшу входов'),
+        ('train', cmd_train, 'подгонка и обучение CatBoost, экспорт артефактов'),
+    ):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('--cohort', nargs='+', required=True,
+                       help='файлы когорты: CSV ноутбука, .arrow/.feather или .parquet')
+        p.add_argument('--store', default='fit_store.db', help='SQLite-файл с подгонками')
+        if name == 'train':
+            p.add_argument('--model-dir', default='model', help='куда сохранить model_r.cbm и model_meta.json')
+        p.set_defaults(func=func)
+
+    p = sub.add_parser('predict', help='прогноз динамики опухоли (NDJSON в stdout)')
+    p.add_argument('--patients', required=True, help="JSON/NDJSON с пациентами, файл когорты или '-' (stdin)")
+    p.add_argument('--model-dir', default='model')
+    p.add_argument('--t-end', type=float, default=36.0)
+    p.add_argument('--dt', type=float, default=0.25)
+    p.add_argument('--intervals', action='store_true', help='добавить перцентили p5/p50/p95 (Монте-Карло)')
+    p.set_defaults(func=cmd_predict)
+
+    p = sub.add_parser('compile', help='model_r.npz: модель r для воркеров без CatBoost')
+    p.add_argument('--model-dir', default='model')
+    p.add_argument('--cohort', nargs='+', help='файлы когорты для сверки с CatBoost')
+    p.set_defaults(func=cmd_compile)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
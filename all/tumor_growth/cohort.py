@@ -0,0 +1,36 @@
+import os
+from typing import Sequence
+
+import pandas as pd
+
+from .dynamics import add_molecular_subtype
+
+# форматы выгрузки cohort_export.py (папка .npy – любой каталог)
+COLUMNAR_EXTENSIONS = ('.arrow', '.feather', '.parquet')
+
+
+def read_cohort_file(path: str) -> pd.DataFrame:
+    """
+    Когорта из CSV ноутбука (десятичная запятая) или из выгрузки
+    cohort_export.py – .arrow / .feather, .parquet или папка .npy –
+    через cohort_export.load_cohort (модуль лежит рядом с пакетом).
+    """
+    if os.path.isdir(path) or os.path.splitext(path)[1].lower() in COLUMNAR_EXTENSIONS:
+        from cohort_export import load_cohort
+        return load_cohort(path)
+
+    df = pd.read_csv(path, decimal=',')
+    bool_cols = df.select_dtypes(include=['bool']).columns
+    df[bool_cols] = df[bool_cols].astype(int)
+
+    # строки – object (CatBoost не принимает строковые dtype pandas)
+    for col in df.columns:
+        if pd.api.types.is_string_dtype(df[col]):
+            df[col] = df[col].astype(object)
+    return df
+
+
+def read_cohort(paths: Sequence[str]) -> pd.DataFrame:
+    """Объединённая когорта из нескольких файлов с колонкой new_molecular_subtype"""
+    df = pd.concat([read_cohort_file(path) for path in paths], ignore_index=True)
+    return add_molecular_subtype(df)
@@ -0,0 +1,437 @@
+"""
+Модель r без CatBoost: деревья и кодирование категориальных признаков
+(хэши строк, CTR-счётчики) в массивах numpy, файл model_r.npz.
+
+compile_model переводит обученную CatBoostRegressor (через её JSON-дамп)
+в массивы, CompiledTreeModel.predict считает то же, что model_r.predict,
+только на numpy: воркерам API не нужны catboost и pandas.
+
+Порядок вычислений повторяет CatBoost: числовые признаки сравниваются
+с границами во float32, CTR = (счётчик + prior) / (всего + prior) во float32,
+хэш категории – младшие 32 бита CityHash64 строки (вариант CityHash v1.0.2
+из util/digest/city CatBoost), хэш комбинации признаков – CalcHash CatBoost.
+"""
+import json
+import os
+import tempfile
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+COMPILED_FILE = 'model_r.npz'
+
+# виды элементов комбинации CTR (проекции)
+ELEMENT_CAT_VALUE = 0     # хэш категории
+ELEMENT_FLOAT_BORDER = 1  # числовой признак > границы
+ELEMENT_CAT_EXACT = 2     # категория равна значению (one-hot)
+
+_ELEMENT_KINDS = {
+    'cat_feature_value': ELEMENT_CAT_VALUE,
+    'float_feature': ELEMENT_FLOAT_BORDER,
+    'cat_feature_exact_value': ELEMENT_CAT_EXACT,
+}
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_K0 = 0xc3a5c85c97cb3127
+_K1 = 0xb492b66fbe98f273
+_K2 = 0x9ae16a3b2f90404f
+_K3 = 0xc949d7c7509e6557
+_K_MUL = 0x9ddfea08eb382d69
+_CTR_HASH_MULT = np.uint64(0x4906ba494954cb65)
+
+
+# --- CityHash64 (хэш категориальных значений CatBoost) ---
+
+def _fetch64(s: bytes, i: int) -> int:
+    return int.from_bytes(s[i:i + 8], 'little')
+
+
+def _fetch32(s: bytes, i: int) -> int:
+    return int.from_bytes(s[i:i + 4], 'little')
+
+
+def _rotate(v: int, shift: int) -> int:
+    return v if shift == 0 else ((v >> shift) | (v << (64 - shift))) & _MASK64
+
+
+def _shift_mix(v: int) -> int:
+    return v ^ (v >> 47)
+
+
+def _hash_len16(u: int, v: int) -> int:
+    a = ((u ^ v) * _K_MUL) & _MASK64
+    a ^= a >> 47
+    b = ((v ^ a) * _K_MUL) & _MASK64
+    b ^= b >> 47
+    return (b * _K_MUL) & _MASK64
+
+
+def _hash_len0to16(s: bytes, n: int) -> int:
+    if n > 8:
+        a = _fetch64(s, 0)
+        b = _fetch64(s, n - 8)
+        return _hash_len16(a, _rotate((b + n) & _MASK64, n)) ^ b
+    if n >= 4:
+        return _hash_len16((n + (_fetch32(s, 0) << 3)) & _MASK64, _fetch32(s, n - 4))
+    if n > 0:
+        y = s[0] + (s[n >> 1] << 8)
+        z = n + (s[n - 1] << 2)
+        return (_shift_mix(((y * _K2) ^ (z * _K3)) & _MASK64) * _K2) & _MASK64
+    return _K2
+
+
+def _hash_len17to32(s: bytes, n: int) -> int:
+    a = (_fetch64(s, 0) * _K1) & _MASK64
+    b = _fetch64(s, 8)
+    c = (_fetch64(s, n - 8) * _K2) & _MASK64
+    d = (_fetch64(s, n - 16) * _K0) & _MASK64
+    return _hash_len16((_rotate((a - b) & _MASK64, 43) + _rotate(c, 30) + d) & _MASK64,
+                       (a + _rotate(b ^ _K3, 20) - c + n) & _MASK64)
+
+
+def _hash_len33to64(s: bytes, n: int) -> int:
+    z = _fetch64(s, 24)
+    a = (_fetch64(s, 0) + (n + _fetch64(s, n - 16)) * _K0) & _MASK64
+    b = _rotate((a + z) & _MASK64, 52)
+    c = _rotate(a, 37)
+    a = (a + _fetch64(s, 8)) & _MASK64
+    c = (c + _rotate(a, 7)) & _MASK64
+    a = (a + _fetch64(s, 16)) & _MASK64
+    vf = (a + z) & _MASK64
+    vs = (b + _rotate(a, 31) + c) & _MASK64
+    a = (_fetch64(s, 16) + _fetch64(s, n - 32)) & _MASK64
+    z = _fetch64(s, n - 8)
+    b = _rotate((a + z) & _MASK64, 52)
+    c = _rotate(a, 37)
+    a = (a + _fetch64(s, n - 24)) & _MASK64
+    c = (c + _rotate(a, 7)) & _MASK64
+    a = (a + _fetch64(s, n - 16)) & _MASK64
+    wf = (a + z) & _MASK64
+    ws = (b + _rotate(a, 31) + c) & _MASK64
+    r = _shift_mix(((vf + ws) * _K2 + (wf + vs) * _K0) & _MASK64)
+    return (_shift_mix((r * _K0 + vs) & _MASK64) * _K2) & _MASK64
+
+
+def _weak_hash_len32(s: bytes, i: int, a: int, b: int) -> tuple:
+    w, x, y, z = _fetch64(s, i), _fetch64(s, i + 8), _fetch64(s, i + 16), _fetch64(s, i + 24)
+    a = (a + w) & _MASK64
+    b = _rotate((b + a + z) & _MASK64, 21)
+    c = a
+    a = (a + x + y) & _MASK64
+    b = (b + _rotate(a, 44)) & _MASK64
+    return (a + z) & _MASK64, (b + c) & _MASK64
+
+
+def city_hash64(s: bytes) -> int:
+    n = len(s)
+    if n <= 16:
+        return _hash_len0to16(s, n)
+    if n <= 32:
+        return _hash_len17to32(s, n)
+    if n <= 64:
+        return _hash_len33to64(s, n)
+
+    x = _fetch64(s, 0)
+    y = _fetch64(s, n - 16) ^ _K1
+    z = _fetch64(s, n - 56) ^ _K0
+    v = _weak_hash_len32(s, n - 64, n, y)
+    w = _weak_hash_len32(s, n - 32, (n * _K1) & _MASK64, _K0)
+    z = (z + _shift_mix(v[1]) * _K1) & _MASK64
+    x = (_rotate((z + x) & _MASK64, 39) * _K1) & _MASK64
+    y = (_rotate(y, 33) * _K1) & _MASK64
+
+    left = (n - 1) & ~63
+    i = 0
+    while left:
+        x = (_rotate((x + y + v[0] + _fetch64(s, i + 16)) & _MASK64, 37) * _K1) & _MASK64
+        y = (_rotate((y + v[1] + _fetch64(s, i + 48)) & _MASK64, 42) * _K1) & _MASK64
+        x ^= w[1]
+        y ^= v[0]
+        z = _rotate(z ^ w[0], 33)
+        v = _weak_hash_len32(s, i, (v[1] * _K1) & _MASK64, (x + w[0]) & _MASK64)
+        w = _weak_hash_len32(s, i + 32, (z + w[1]) & _MASK64, y)
+        z, x = x, z
+        i += 64
+        left -= 64
+    return _hash_len16((_hash_len16(v[0], w[0]) + _shift_mix(y) * _K1 + z) & _MASK64,
+                       (_hash_len16(v[1], w[1]) + x) & _MASK64)
+
+
+@lru_cache(maxsize=4096)
+def cat_feature_hash(value: str) -> int:
+    """Хэш категориального значения, как в CatBoost: int32 из младших 32 бит CityHash64"""
+    h = city_hash64(value.encode('utf-8')) & 0xFFFFFFFF
+    return h - (1 << 32) if h >= 1 << 31 else h
+
+
+# --- компиляция ---
+
+def _ctr_counts(ctr: dict, table: dict) -> tuple:
+    """(ключи uint64, числитель, знаменатель) CTR по таблице счётчиков CatBoost"""
+    stride = int(table['hash_stride'])
+    flat = table['hash_map']
+    keys = np.array([int(h) for h in flat[0::stride]], dtype=np.uint64)
+    counts = np.array([flat[i::stride] for i in range(1, stride)], dtype=np.float64).reshape(stride - 1, -1)
+
+    ctr_type = ctr['ctr_type']
+    border_idx = int(ctr.get('target_border_idx', 0))
+    if ctr_type in ('Counter', 'FeatureFreq'):
+        num = counts[0]
+        den = np.full_like(num, float(table['counter_denominator']))
+    elif ctr_type == 'Buckets':
+        num = counts[border_idx]
+        den = counts.sum(axis=0)
+    elif ctr_type == 'Borders':
+        num = counts[border_idx + 1:].sum(axis=0)
+        den = counts.sum(axis=0)
+    else:
+        raise ValueError(f'CTR типа {ctr_type} не поддерживается компилятором модели')
+
+    # пустые ячейки хэш-таблицы CatBoost помечены ключом 2^64 - 1
+    used = keys != np.uint64(_MASK64)
+    order = np.argsort(keys[used], kind='stable')
+    return keys[used][order], num[used][order], den[used][order]
+
+
+def compile_json(model_json: dict, version: Optional[str] = None) -> dict:
+    """Массивы CompiledTreeModel из JSON-дампа CatBoost (save_model(format='json'))"""
+    info = model_json['features_info']
+    float_features = info.get('float_features', [])
+    cat_features = info.get('categorical_features', [])
+    ctrs = info.get('ctrs', [])
+
+    arrays = {
+        'float_columns': np.array([f['flat_feature_index'] for f in float_features], dtype=np.int32),
+        'float_nan_true': np.array([f.get('nan_value_treatment') == 'AsTrue' for f in float_features], dtype=bool),
+        'cat_columns': np.array([f['flat_feature_index'] for f in cat_features], dtype=np.int32),
+    }
+
+    # бинарные признаки в порядке split_index CatBoost: границы числовых, one-hot, границы CTR
+    float_split_feature, float_split_border = [], []
+    for i, f in enumerate(float_features):
+        for border in f.get('borders') or []:
+            float_split_feature.append(i)
+            float_split_border.append(border)
+    onehot_split_feature, onehot_split_value = [], []
+    for i, f in enumerate(cat_features):
+        for value in f.get('values', []):
+            onehot_split_feature.append(i)
+            onehot_split_value.append(value)
+    ctr_split_ctr, ctr_split_border = [], []
+    for i, ctr in enumerate(ctrs):
+        for border in ctr['borders']:
+            ctr_split_ctr.append(i)
+            ctr_split_border.append(border)
+    arrays.update({
+        'float_split_feature': np.array(float_split_feature, dtype=np.int32),
+        'float_split_border': np.array(float_split_border, dtype=np.float32),
+        'onehot_split_feature': np.array(onehot_split_feature, dtype=np.int32),
+        'onehot_split_value': np.array(onehot_split_value, dtype=np.int32),
+        'ctr_split_ctr': np.array(ctr_split_ctr, dtype=np.int32),
+        'ctr_split_border': np.array(ctr_split_border, dtype=np.float32),
+    })
+    n_splits = len(float_split_border) + len(onehot_split_value) + len(ctr_split_border)
+
+    # CTR: проекции (комбинации признаков) без повторов, таблицы счётчиков CatBoost
+    # (общие для CTR с одним identifier) и числители/знаменатели каждого CTR
+    projections, tables = {}, {}
+    table_projection, table_keys, ctr_table = [], [], []
+    params = {'ctr_prior_num': [], 'ctr_prior_denom': [], 'ctr_shift': [], 'ctr_scale': []}
+    num, den, offsets = [], [], [0]
+    for ctr in ctrs:
+        if ctr['identifier'] not in tables:
+            elements = tuple(
+                (_ELEMENT_KINDS[e['combination_element']],
+                 e.get('cat_feature_index', e.get('float_feature_index')),
+                 e.get('border', 0.0), e.get('value', 0))
+                for e in ctr['elements']
+            )
+            tables[ctr['identifier']] = len(tables)
+            table_projection.append(projections.setdefault(elements, len(projections)))
+            table_keys.append(None)
+        table = tables[ctr['identifier']]
+        ctr_table.append(table)
+        keys, n, d = _ctr_counts(ctr, model_json['ctr_data'][ctr['identifier']])
+        table_keys[table] = keys
+        num.append(n)
+        den.append(d)
+        offsets.append(offsets[-1] + len(n))
+        params['ctr_prior_num'].append(ctr['prior_numerator'])
+        params['ctr_prior_denom'].append(ctr['prior_denomerator'])
+        params['ctr_shift'].append(ctr['shift'])
+        params['ctr_scale'].append(ctr['scale'])
+
+    elements = [e for projection in projections for e in projection]
+    arrays.update({
+        'projection_offsets': np.cumsum([0] + [len(p) for p in projections]).astype(np.int32),
+        'element_kind': np.array([e[0] for e in elements], dtype=np.int8),
+        'element_feature': np.array([e[1] for e in elements], dtype=np.int32),
+        'element_border': np.array([e[2] for e in elements], dtype=np.float32),
+        'element_value': np.array([e[3] for e in elements], dtype=np.int32),
+        'table_projection': np.array(table_projection, dtype=np.int32),
+        'table_offsets': np.cumsum([0] + [len(k) for k in table_keys]).astype(np.int64),
+        'table_keys': np.concatenate(table_keys) if table_keys else np.zeros(0, dtype=np.uint64),
+        'ctr_table': np.array(ctr_table, dtype=np.int32),
+        'ctr_offsets': np.array(offsets, dtype=np.int64),
+        'ctr_num': np.concatenate(num).astype(np.float32) if num else np.zeros(0, dtype=np.float32),
+        'ctr_den': np.concatenate(den).astype(np.float32) if den else np.zeros(0, dtype=np.float32),
+    })
+    arrays.update({name: np.array(values, dtype=np.float32) for name, values in params.items()})
+
+    # симметричные деревья: номера бинарных признаков по уровням и листья;
+    # деревья меньшей глубины дополнены всегда ложным признаком n_splits
+    trees = model_json['oblivious_trees']
+    depth = max((len(tree['splits'] or []) for tree in trees), default=0)
+    tree_splits = np.full((len(trees), depth), n_splits, dtype=np.int32)
+    leaf_values = np.zeros((len(trees), 1 << depth), dtype=np.float64)
+    for i, tree in enumerate(trees):
+        splits = [split['split_index'] for split in tree['splits'] or []]  # у дерева глубины 0 splits = null
+        if len(tree['leaf_values']) != 1 << len(splits):
+            raise ValueError('Компилятор поддерживает только модели с одним выходом (регрессия)')
+        tree_splits[i, :len(splits)] = splits
+        leaf_values[i, :len(tree['leaf_values'])] = tree['leaf_values']
+
+    scale, bias = model_json.get('scale_and_bias', [1.0, [0.0]])
+    arrays.update({
+        'tree_splits': tree_splits,
+        'leaf_values': leaf_values,
+        'scale_and_bias': np.array([scale, bias[0] if isinstance(bias, list) else bias], dtype=np.float64),
+        'n_features': np.array(
+            max([f['flat_feature_index'] for f in float_features + cat_features], default=-1) + 1
+        ),
+        'version': np.array(version or ''),
+    })
+    return arrays
+
+
+def compile_model(model_r, path: str, version: Optional[str] = None, check_rows=None) -> 'CompiledTreeModel':
+    """
+    Сохранение model_r (CatBoostRegressor) в path (.npz). С check_rows
+    предсказания сверяются с model_r.predict и при расхождении файл не пишется.
+    """
+    fd, json_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        model_r.save_model(json_path, format='json')
+        with open(json_path, encoding='utf-8') as f:
+            arrays = compile_json(json.load(f), version=version)
+    finally:
+        os.remove(json_path)
+
+    compiled = CompiledTreeModel(arrays)
+    if check_rows is not None:
+        expected = np.asarray(model_r.predict(check_rows), dtype=np.float64)
+        actual = compiled.predict(check_rows)
+        if not np.array_equal(expected, actual):
+            diff = float(np.max(np.abs(expected - actual)))
+            raise ValueError(f'Скомпилированная модель расходится с CatBoost (макс. разница {diff:.3g})')
+
+    np.savez(path, **arrays)
+    return compiled
+
+
+# --- вычисление ---
+
+class CompiledTreeModel:
+    """Симметричные деревья CatBoost на numpy; predict принимает те же строки, что model_r.predict"""
+
+    def __init__(self, arrays: dict):
+        for name, value in arrays.items():
+            setattr(self, name, value)
+        self.version = str(self.version)
+        self.n_features = int(self.n_features)
+        # номер листа i-го дерева в плоском массиве листьев
+        self._leaf_offsets = (np.arange(len(self.leaf_values), dtype=np.int32) * self.leaf_values.shape[1])[:, None]
+        self._leaves = self.leaf_values.ravel()
+
+        # хэши проекций считаются по уровням: на уровне j – j-е элементы всех проекций длиннее j
+        lengths = np.diff(self.projection_offsets)
+        self._levels = []
+        for j in range(int(lengths.max(initial=0))):
+            projections = np.flatnonzero(lengths > j)
+            e = self.projection_offsets[projections] + j
+            kind = self.element_kind[e]
+            feature = self.element_feature[e]
+            self._levels.append((
+                projections, kind,
+                np.where(kind == ELEMENT_FLOAT_BORDER, 0, feature), np.where(kind == ELEMENT_FLOAT_BORDER, feature, 0),
+                self.element_border[e], self.element_value[e], bool((kind == ELEMENT_FLOAT_BORDER).any()),
+            ))
+        self._tables = [
+            (int(p), self.table_keys[self.table_offsets[t]:self.table_offsets[t + 1]])
+            for t, p in enumerate(self.table_projection)
+        ]
+        # позиция в ctr_num/ctr_den = начало CTR + позиция ключа в таблице; ненайденные – в ячейку нулей
+        self._ctr_start = self.ctr_offsets[:-1, None]
+        self._ctr_empty = len(self.ctr_num)
+        self._ctr_num = np.append(self.ctr_num, np.float32(0))
+        self._ctr_den = np.append(self.ctr_den, np.float32(0))
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledTreeModel':
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def _columns(self, rows) -> tuple:
+        """
+        Числовые признаки (float32) и хэши категориальных (int32) из строк
+        признаков – по строке массива на признак, столбец на пациента
+        """
+        X = np.asarray(rows, dtype=object)
+        if X.ndim != 2 or X.shape[1] < self.n_features:
+            raise ValueError(f'Ожидается таблица из {self.n_features} признаков, форма {X.shape}')
+        floats = X[:, self.float_columns].T.astype(np.float64).astype(np.float32)
+        hashes = np.array(
+            [[cat_feature_hash(str(value)) for value in column] for column in X[:, self.cat_columns].T],
+            dtype=np.int32
+        ).reshape(len(self.cat_columns), len(X))
+        return floats, hashes
+
+    def _float_bits(self, floats: np.ndarray, feature: np.ndarray, border: np.ndarray) -> np.ndarray:
+        x = floats[feature]
+        # NaN > border ложно; при nan_mode=Max (AsTrue) NaN выше всех границ
+        return (x > border[:, None]) | (np.isnan(x) & self.float_nan_true[feature][:, None])
+
+    def _ctr_values(self, floats: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        n = floats.shape[1]
+        h = np.zeros((len(self.projection_offsets) - 1, n), dtype=np.uint64)
+        for projections, kind, cat_feature, float_feature, border, value, has_float in self._levels:
+            kind = kind[:, None]
+            # int32 расширяется со знаком, как (ui64)(int) в CatBoost
+            bits = hashes[cat_feature].astype(np.int64).view(np.uint64)
+            bits = np.where(kind == ELEMENT_CAT_EXACT, hashes[cat_feature] == value[:, None], bits)
+            if has_float:
+                bits = np.where(kind == ELEMENT_FLOAT_BORDER, self._float_bits(floats, float_feature, border), bits)
+            h[projections] = _CTR_HASH_MULT * (h[projections] + _CTR_HASH_MULT * bits.astype(np.uint64))
+
+        positions = np.empty((len(self._tables), n), dtype=np.int64)
+        for t, (p, keys) in enumerate(self._tables):
+            pos = np.minimum(keys.searchsorted(h[p]), len(keys) - 1)
+            positions[t] = np.where(keys[pos] == h[p], pos, -1) if len(keys) else -1
+
+        # нет в таблице – CTR по одним prior, как у CatBoost для новых значений
+        pos = positions[self.ctr_table]
+        index = np.where(pos >= 0, self._ctr_start + pos, self._ctr_empty)
+        ctr = (self._ctr_num[index] + self.ctr_prior_num[:, None]) / (self._ctr_den[index] + self.ctr_prior_denom[:, None])
+        return (ctr + self.ctr_shift[:, None]) * self.ctr_scale[:, None]
+
+    def predict(self, rows) -> np.ndarray:
+        """r для строк признаков (список списков или DataFrame в порядке feature_cols)"""
+        floats, hashes = self._columns(rows)
+        n = floats.shape[1]
+        bits = [self._float_bits(floats, self.float_split_feature, self.float_split_border)]
+        bits.append(hashes[self.onehot_split_feature] == self.onehot_split_value[:, None])
+        if len(self.ctr_split_ctr):
+            ctrs = self._ctr_values(floats, hashes)
+            bits.append(ctrs[self.ctr_split_ctr] > self.ctr_split_border[:, None])
+        bits.append(np.zeros((1, n), dtype=bool))
+        bits = np.concatenate(bits).view(np.uint8)  # (бинарные признаки, пациенты)
+
+        leaf = np.zeros((len(self.tree_splits), n), dtype=np.uint16)  # глубина деревьев CatBoost – до 16
+        for depth in range(self.tree_splits.shape[1]):
+            leaf |= bits[self.tree_splits[:, depth]].astype(np.uint16) << np.uint16(depth)
+        # сумма по деревьям по порядку (редукция по оси 0 не попарная), как в CatBoost
+        total = np.take(self._leaves, leaf + self._leaf_offsets).sum(axis=0)
+        scale, bias = self.scale_and_bias
+        return scale * total + bias
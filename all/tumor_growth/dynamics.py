@@ -0,0 +1,268 @@
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# точки измерения размера опухоли (в месяцах) и соответствующие колонки когорты
+TIMES = np.array([0.0, 3.0, 6.0, 12.0, 24.0])
+TUMOR_SIZE_COLS = ['tumor_size_before', 'tumor_size_3m', 'tumor_size_6m',
+                   'tumor_size_12m', 'tumor_size_24m']
+
+# K по когорте: чуть больше максимального наблюдаемого размера
+K_MARGIN = 1.2
+
+# допустимые параметры модели (границы подгонки)
+R_BOUNDS = (0.01, 1.2)
+GAMMA_BOUNDS = (0.0, 0.5)  # 0 – нет роста резистентности, 0.5 – очень быстро
+
+
+def define_breast_cancer_subtype(er, pr, her2, ki67):
+    """
+    Определяет молекулярный подтип рака молочной железы
+
+    Args:
+        er: статус рецепторов эстрогена (bool)
+        pr: статус рецепторов прогестерона (bool)
+        her2: статус HER2 (bool)
+        ki67: уровень Ki-67 (%)
+
+    Returns:
+        (str, str): название и код молекулярного подтипа
+    """
+
+    ki67 = float(ki67)
+
+    # Тройной негативный (Базальноподобный)
+    if not er and not pr and not her2:
+        return 'Базальноподобный', 'TNBC'
+
+    # HER2 положительный не-люминальный
+    if her2 and not er and not pr:
+        return 'HER2 положительный (не люминальный)', 'HR-HER2+'
+
+    # Люминальные типы
+    if er:
+        if her2:
+            return 'Люминальный В (HER2 положительный)', 'HR+HER2+B'
+        elif ki67 >= 20 or not pr:  # Высокий Ki67 ИЛИ низкие РП
+            return 'Люминальный В (HER2 отрицательный)', 'HR+HER2-B'
+        else:  # Низкий Ki67 И высокие РП
+            return 'Люминальный А', 'HR+HER2-A'
+
+    return 'Неопределенный', None
+
+
+# коды подтипов в порядке правил define_breast_cancer_subtype; индекс
+# len(SUBTYPE_CODES) – неопределённый подтип (код None)
+SUBTYPE_CODES = ('TNBC', 'HR-HER2+', 'HR+HER2+B', 'HR+HER2-B', 'HR+HER2-A')
+
+# базовая эффективность лечения: без учёта подтипа или по молекулярному подтипу
+FLAT_TREATMENT_EFFECTS = {
+    'no_treatment': 0.0,
+    'surgery_only': 0.3,
+}
+SUBTYPE_TREATMENT_EFFECTS = {
+    'surgery_chemo': {
+        'HR+HER2-A': 0.25,
+        'HR+HER2-B': 0.45,
+        'HR+HER2+B': 1.00,
+        'HR-HER2+': 1.40,
+        'TNBC': 1.20
+    },
+    'surgery_target': {
+        'HR+HER2-A': 0.60,
+        'HR+HER2-B': 0.55,
+        'HR+HER2+B': 1.60,
+        'HR-HER2+': 2.00,
+        'TNBC': 0.45
+    },
+}
+TREATMENTS = tuple(FLAT_TREATMENT_EFFECTS) + tuple(SUBTYPE_TREATMENT_EFFECTS)
+
+
+def treatment_effect_coeff(patient_data) -> float:
+    """Базовая эффективность лечения по терапии и молекулярному подтипу"""
+    treatment = patient_data["treatment"]
+    subtype = patient_data["new_molecular_subtype"]
+
+    if treatment in FLAT_TREATMENT_EFFECTS:
+        return FLAT_TREATMENT_EFFECTS[treatment]
+
+    effects = SUBTYPE_TREATMENT_EFFECTS.get(treatment)
+    if effects is None:
+        raise ValueError(f"Неизвестный тип лечения: {treatment}")
+
+    return effects.get(subtype, 0.0)
+
+
+# base_eff для каждой пары (TREATMENTS × SUBTYPE_CODES); последний столбец – неизвестный подтип
+TREATMENT_EFFECT_TABLE = np.array([
+    [treatment_effect_coeff({'treatment': t, 'new_molecular_subtype': s}) for s in SUBTYPE_CODES + (None,)]
+    for t in TREATMENTS
+])
+_TREATMENT_INDEX = {t: i for i, t in enumerate(TREATMENTS)}
+_SUBTYPE_INDEX = {s: i for i, s in enumerate(SUBTYPE_CODES)}
+
+
+def _as_bool(values) -> np.ndarray:
+    # как `not value` в define_breast_cancer_subtype: строки и объекты – по истинности
+    values = np.asarray(values)
+    if values.dtype.kind in 'OUS':
+        values = values.astype(object)
+    return values.astype(bool)
+
+
+def _lookup_index(values, index: dict) -> np.ndarray:
+    """Позиции значений в index (-1 – нет такого)"""
+    values = values.tolist() if hasattr(values, 'tolist') else list(values)
+    return np.array([index.get(value, -1) for value in values], dtype=np.intp)
+
+
+def molecular_subtype_index(er, pr, her2, ki67) -> np.ndarray:
+    """
+    Индексы в SUBTYPE_CODES для массивов ER/PR/HER2/Ki-67 – правила
+    define_breast_cancer_subtype масками; len(SUBTYPE_CODES) – неопределённый подтип.
+    """
+    er, pr, her2 = _as_bool(er), _as_bool(pr), _as_bool(her2)
+    ki67 = np.asarray(ki67, dtype=float)
+    return np.select(
+        [
+            ~er & ~pr & ~her2,
+            her2 & ~er & ~pr,
+            er & her2,
+            er & ((ki67 >= 20) | ~pr),
+            er,
+        ],
+        [0, 1, 2, 3, 4],
+        default=len(SUBTYPE_CODES),
+    )
+
+
+def molecular_subtype_codes(er, pr, her2, ki67) -> np.ndarray:
+    """Коды define_breast_cancer_subtype для целой когорты (массив object, None – неопределённый)"""
+    codes = np.array(SUBTYPE_CODES + (None,), dtype=object)
+    return codes[molecular_subtype_index(er, pr, her2, ki67)]
+
+
+def treatment_effect_coeffs(treatment, subtype) -> np.ndarray:
+    """
+    treatment_effect_coeff для массивов терапий и подтипов: одна выборка
+    из TREATMENT_EFFECT_TABLE вместо вызова на строку.
+    """
+    treatment_idx = _lookup_index(treatment, _TREATMENT_INDEX)
+    if (treatment_idx < 0).any():
+        unknown = list(treatment)[int(np.argmax(treatment_idx < 0))]
+        raise ValueError(f"Неизвестный тип лечения: {unknown}")
+
+    subtype_idx = _lookup_index(subtype, _SUBTYPE_INDEX)
+    subtype_idx[subtype_idx < 0] = len(SUBTYPE_CODES)
+    return TREATMENT_EFFECT_TABLE[treatment_idx, subtype_idx]
+
+
+def add_molecular_subtype(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """Колонка new_molecular_subtype по ER/PR/HER2/Ki-67 (если её ещё нет)"""
+    if 'new_molecular_subtype' not in df.columns:
+        df = df.copy()
+        df['new_molecular_subtype'] = molecular_subtype_codes(
+            df['er_status'], df['pr_status'], df['her2_status'], df['ki67_level']
+        )
+    return df
+
+
+def cohort_K(df: 'pd.DataFrame') -> float:
+    """Глобальный предел размера K для когорты"""
+    return float(df[TUMOR_SIZE_COLS].max().max() * K_MARGIN)
+
+
+def _expm1_ratio(d, t, derivative=True):
+    """
+    g(d) = (exp(d·t) - 1) / d и её производная g'(d) по d (None при derivative=False).
+    При d -> 0 используется ряд Тейлора, чтобы не делить 0 на 0.
+    """
+    d = np.asarray(d, dtype=float)
+    t = np.asarray(t, dtype=float)
+    dt_ = d * t
+    small = np.abs(dt_) < 1e-6
+    d_safe = np.where(small, 1.0, d)
+
+    g = np.where(small, t * (1.0 + dt_ / 2.0 + dt_ ** 2 / 6.0), np.expm1(dt_) / d_safe)
+    if not derivative:
+        return g, None
+    g_prime = np.where(
+        small,
+        t ** 2 * (0.5 + dt_ / 3.0 + dt_ ** 2 / 8.0),
+        (t * np.exp(dt_) - g) / d_safe,
+    )
+    return g, g_prime
+
+
+def gompertz_treated_exact(t, V0, r, K, base_eff, gamma, return_grad=False):
+    """
+    Точное решение dV/dt = r·V·ln(K/V) - base_eff·exp(-gamma·t)·V.
+
+    После замены u = ln V уравнение становится линейным:
+      du/dt = r·(ln K - u) - base_eff·exp(-gamma·t)
+    и его решение
+      u(t) = ln K + (ln V0 - ln K)·exp(-r·t) - base_eff·phi(t),
+      phi(t) = (exp(-gamma·t) - exp(-r·t)) / (r - gamma)   (= t·exp(-r·t) при r = gamma)
+
+    Все аргументы могут быть массивами (broadcast по numpy).
+    При return_grad=True дополнительно возвращает аналитические dV/dr и dV/dgamma.
+    """
+    t = np.asarray(t, dtype=float)
+    log_K = np.log(K)
+
+    e_rt = np.exp(-r * t)
+    g, g_prime = _expm1_ratio(r - gamma, t, derivative=return_grad)
+    phi = e_rt * g
+
+    u = log_K + (np.log(V0) - log_K) * e_rt - base_eff * phi
+    V = np.exp(u)
+
+    if not return_grad:
+        return V
+
+    # dphi/dr = exp(-r·t)·(g' - t·g),  dphi/dgamma = -exp(-r·t)·g'
+    du_dr = -t * (np.log(V0) - log_K) * e_rt - base_eff * e_rt * (g_prime - t * g)
+    du_dgamma = base_eff * e_rt * g_prime
+
+    return V, V * du_dr, V * du_dgamma
+
+
+def patient_series(patient_data):
+    """
+    Нерегулярный ряд пациентки (t, V_obs) или None, если его нет.
+    Ряд – measurement_months и tumor_sizes (как в BreastCancerDB.get_tumor_series),
+    t отсчитывается от первого измерения ряда, оно же – V0.
+    """
+    months = patient_data.get('measurement_months')
+    if months is None:
+        return None
+
+    t = np.asarray(months, dtype=float)
+    V_obs = np.asarray(patient_data['tumor_sizes'], dtype=float)
+    if t.ndim != 1 or t.shape != V_obs.shape or t.size == 0:
+        raise ValueError('measurement_months и tumor_sizes должны быть непустыми рядами одной длины')
+    order = np.argsort(t, kind='stable')
+    return t[order] - t[order[0]], V_obs[order]
+
+
+def simulate_patient(params, patient_data, K: float, t=None):
+    """
+    V(t) для одной пациентки при params = (r, gamma).
+    patient_data – строка DataFrame или словарь с treatment, new_molecular_subtype
+    и tumor_size_before либо нерегулярным рядом (patient_series).
+    t по умолчанию – даты измерений ряда или TIMES.
+    """
+    r, gamma = params
+    base_eff = treatment_effect_coeff(patient_data)
+
+    series = patient_series(patient_data)
+    if series is None:
+        V0, t_obs = patient_data['tumor_size_before'], TIMES
+    else:
+        t_obs, V_obs = series
+        V0 = V_obs[0]
+    return gompertz_treated_exact(t_obs if t is None else t, V0, r, K, base_eff, gamma)
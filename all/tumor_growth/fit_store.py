@@ -0,0 +1,119 @@
+import hashlib
+import sqlite3
+from typing import Optional, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .dynamics import TIMES, TUMOR_SIZE_COLS, cohort_K, treatment_effect_coeffs
+from .fitting import fit_cohort
+
+# меняется вместе с алгоритмом подгонки – старые записи перестают совпадать по хэшу
+FIT_VERSION = 1
+
+FIT_COLUMNS = ['r_fit', 'gamma_fit', 'fit_sse']
+
+
+def fit_input_hashes(df: pd.DataFrame, K: float, t=TIMES) -> list:
+    """
+    Хэш всего, от чего зависит подгонка пациентки: размеры опухоли, base_eff
+    (лечение и подтип), K, точки измерения и версия алгоритма.
+    """
+    sizes = df[TUMOR_SIZE_COLS].to_numpy(dtype=float).tolist()
+    base_eff = treatment_effect_coeffs(df['treatment'], df['new_molecular_subtype']).tolist()
+    prefix = f"{FIT_VERSION}|{float(K)!r}|{','.join(repr(float(x)) for x in t)}"
+    return [
+        hashlib.blake2b(
+            f"{prefix}|{','.join(map(repr, row))}|{float(b)!r}".encode(), digest_size=16
+        ).hexdigest()
+        for row, b in zip(sizes, base_eff)
+    ]
+
+
+class FitStore:
+    """
+    Хранилище подгонок (r, gamma) в SQLite по хэшу входов пациентки.
+    Одинаковые входы не подгоняются повторно, поэтому при дообучении
+    считаются только новые и изменившиеся пациентки.
+    """
+
+    def __init__(self, path: str = 'fit_store.db'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript('''
+            CREATE TABLE IF NOT EXISTS fits (
+                input_hash TEXT PRIMARY KEY,
+                r_fit REAL,
+                gamma_fit REAL,
+                fit_sse REAL,
+                fitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+        ''')
+
+    def get_K(self) -> Optional[float]:
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'K'").fetchone()
+        return float(row[0]) if row else None
+
+    def set_K(self, K: float):
+        self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('K', ?)", (repr(float(K)),))
+        self.connection.commit()
+
+    def lookup(self, hashes: Sequence[str]) -> Dict[str, tuple]:
+        """Готовые подгонки для известных хэшей: {hash: (r_fit, gamma_fit, fit_sse)}"""
+        self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS wanted (input_hash TEXT PRIMARY KEY) WITHOUT ROWID')
+        self.connection.execute('DELETE FROM wanted')
+        self.connection.executemany('INSERT OR IGNORE INTO wanted VALUES (?)', ((h,) for h in hashes))
+        rows = self.connection.execute('''
+            SELECT f.input_hash, f.r_fit, f.gamma_fit, f.fit_sse
+            FROM wanted w JOIN fits f ON f.input_hash = w.input_hash
+        ''').fetchall()
+        self.connection.execute('DELETE FROM wanted')
+        self.connection.commit()
+        return {h: tuple(np.nan if v is None else v for v in values) for h, *values in rows}
+
+    def save(self, hashes: Sequence[str], fits: pd.DataFrame):
+        """Запись подгонок (NaN хранится как NULL – неудачная подгонка тоже не повторяется)"""
+        values = fits[FIT_COLUMNS].astype(object).where(fits[FIT_COLUMNS].notna(), None).values.tolist()
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO fits (input_hash, r_fit, gamma_fit, fit_sse) VALUES (?, ?, ?, ?)',
+            ((h, *v) for h, v in zip(hashes, values))
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def refit_cohort(df: pd.DataFrame, store: FitStore, K: Optional[float] = None, t=TIMES) -> tuple:
+    """
+    Подгонки для всей когорты: известные берутся из store, остальные
+    считаются fit_cohort_vectorized и сохраняются.
+
+    K по умолчанию – сохранённый в store, пока когорта в него помещается;
+    если новые размеры больше, K пересчитывается и все хэши меняются
+    (полная переподгонка – иначе модель была бы другой).
+
+    Возвращает (DataFrame r_fit/gamma_fit/fit_sse с индексом df, K, число подогнанных).
+    """
+    if K is None:
+        K_cohort = cohort_K(df)
+        K_stored = store.get_K()
+        K = K_stored if K_stored is not None and K_cohort <= K_stored else K_cohort
+
+    hashes = fit_input_hashes(df, K, t)
+    known = store.lookup(hashes)
+
+    missing = [i for i, h in enumerate(hashes) if h not in known]
+    if missing:
+        fits = fit_cohort(df.iloc[missing], K, t)
+        missing_hashes = [hashes[i] for i in missing]
+        store.save(missing_hashes, fits)
+        known.update(zip(missing_hashes, map(tuple, fits[FIT_COLUMNS].to_numpy())))
+    store.set_K(K)
+
+    result = pd.DataFrame([known[h] for h in hashes], columns=FIT_COLUMNS, index=df.index, dtype=float)
+    return result, K, len(missing)
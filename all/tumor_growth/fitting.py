@@ -0,0 +1,195 @@
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from .dynamics import (
+    GAMMA_BOUNDS,
+    R_BOUNDS,
+    TIMES,
+    TUMOR_SIZE_COLS,
+    gompertz_treated_exact,
+    patient_series,
+    treatment_effect_coeff,
+    treatment_effect_coeffs,
+)
+
+GAMMA_INIT = 0.05  # стартовое значение для фита, не константа модели
+
+
+def patient_observations(patient_data) -> np.ndarray:
+    """Наблюдаемые размеры опухоли в точках TIMES"""
+    return np.array([patient_data[col] for col in TUMOR_SIZE_COLS], dtype=float)
+
+
+def patient_fit_data(patient_data, t=None) -> tuple:
+    """
+    (t, V0, V_obs) для подгонки: нерегулярный ряд пациентки (patient_series),
+    если он есть, иначе колонки TUMOR_SIZE_COLS в точках t (по умолчанию TIMES).
+    """
+    series = patient_series(patient_data)
+    if series is not None:
+        t_obs, V_obs = series
+        return t_obs, V_obs[0], V_obs
+    t = TIMES if t is None else np.asarray(t, dtype=float)
+    return t, patient_data['tumor_size_before'], patient_observations(patient_data)
+
+
+def _loss_and_grad(param_array, t, V0, V_obs, K: float, base_eff: float):
+    r = float(param_array[0])
+    gamma = float(param_array[1])
+
+    V_model, dV_dr, dV_dgamma = gompertz_treated_exact(
+        t, V0, r, K, base_eff, gamma, return_grad=True
+    )
+
+    if np.any(~np.isfinite(V_model)):
+        return 1e6, np.zeros(2)
+
+    resid = V_model - V_obs
+    grad = 2.0 * np.array([np.sum(resid * dV_dr), np.sum(resid * dV_dgamma)])
+
+    return float(np.sum(resid ** 2)), grad
+
+
+def loss_and_grad_for_patient(param_array, patient_data, K: float, t=None):
+    """SSE модели против наблюдений и аналитический градиент [dSSE/dr, dSSE/dgamma]"""
+    return _loss_and_grad(param_array, *patient_fit_data(patient_data, t), K,
+                          treatment_effect_coeff(patient_data))
+
+
+def fit_patient(patient_data, K: float, t=None):
+    """
+    Подгоняет (r, gamma) для одной пациентки методом L-BFGS-B – по колонкам
+    в точках t (TIMES) или по её нерегулярному ряду измерений.
+    Возвращает (r_fit, gamma_fit, SSE).
+    """
+    fit_data = patient_fit_data(patient_data, t)
+    base_eff = treatment_effect_coeff(patient_data)
+    result = minimize(
+        lambda x: _loss_and_grad(x, *fit_data, K, base_eff),
+        x0=np.array([0.3, GAMMA_INIT]),
+        jac=True,
+        bounds=[R_BOUNDS, GAMMA_BOUNDS],
+        method='L-BFGS-B',
+        options={'maxiter': 80}
+    )
+
+    if not result.success:
+        return np.nan, np.nan, result.fun
+
+    return float(result.x[0]), float(result.x[1]), result.fun
+
+
+def fit_cohort_vectorized(V0, V_obs, base_eff, K,
+                          t=TIMES,
+                          max_iter: int = 100,
+                          tol: float = 1e-10) -> pd.DataFrame:
+    """
+    Подгоняет (r, gamma) одновременно для всех пациенток
+    методом Левенберга–Марквардта с проекцией на границы.
+
+    V0       – (N,)   начальные размеры опухоли
+    V_obs    – (N, T) наблюдаемые размеры в точках t
+    base_eff – (N,)   базовая эффективность лечения
+    K        – предел размера (число или (N,))
+    t        – (T,) общая сетка или (N, T) свои сетки пациенток (нерегулярные ряды),
+               дополненные NaN до общей длины – такие точки в подгонку не входят
+
+    Возвращает DataFrame с колонками r_fit, gamma_fit, fit_sse.
+    """
+    V0 = np.asarray(V0, dtype=float)
+    V_obs = np.asarray(V_obs, dtype=float)
+    base_eff = np.asarray(base_eff, dtype=float)
+    K = np.broadcast_to(np.asarray(K, dtype=float), V0.shape)
+    t = np.broadcast_to(np.asarray(t, dtype=float), V_obs.shape)
+    n = V0.shape[0]
+
+    padding = ~np.isfinite(t)
+    if padding.any():
+        t = np.where(padding, 0.0, t)
+    else:
+        padding = None
+
+    lo = np.array([R_BOUNDS[0], GAMMA_BOUNDS[0]])
+    hi = np.array([R_BOUNDS[1], GAMMA_BOUNDS[1]])
+
+    def residuals(theta):
+        V, dV_dr, dV_dgamma = gompertz_treated_exact(
+            t, V0[:, None], theta[:, 0:1], K[:, None],
+            base_eff[:, None], theta[:, 1:2], return_grad=True
+        )
+        resid, J = V - V_obs, np.stack([dV_dr, dV_dgamma], axis=-1)
+        if padding is not None:
+            resid = np.where(padding, 0.0, resid)
+            J = np.where(padding[:, :, None], 0.0, J)
+        return resid, J
+
+    observed = np.isfinite(V_obs) if padding is None else np.isfinite(V_obs) | padding
+    valid = np.all(observed, axis=1) & np.isfinite(V0) & np.isfinite(base_eff)
+
+    theta = np.tile([0.3, GAMMA_INIT], (n, 1))  # тот же старт, что в fit_patient
+    lam = np.full(n, 1e-2)
+    active = valid.copy()
+
+    resid, J = residuals(theta)
+    sse = np.sum(resid ** 2, axis=1)
+
+    for _ in range(max_iter):
+        if not active.any():
+            break
+
+        # нормальные уравнения (J^T J + lam * diag) delta = -J^T resid, по 2x2 на пациентку
+        JtJ = np.einsum('ntp,ntq->npq', J, J)
+        Jtr = np.einsum('ntp,nt->np', J, resid)
+
+        # параметры, упёршиеся в границу с градиентом наружу, не двигаем
+        pinned = ((theta <= lo) & (Jtr > 0)) | ((theta >= hi) & (Jtr < 0))
+
+        A = JtJ + lam[:, None, None] * (np.eye(2) * (np.diagonal(JtJ, axis1=1, axis2=2)[:, :, None] + 1e-12))
+        b = -Jtr
+        A[:, 0, 1] = np.where(pinned.any(axis=1), 0.0, A[:, 0, 1])
+        A[:, 1, 0] = A[:, 0, 1]
+        A[:, 0, 0] = np.where(pinned[:, 0], 1.0, A[:, 0, 0])
+        A[:, 1, 1] = np.where(pinned[:, 1], 1.0, A[:, 1, 1])
+        b = np.where(pinned, 0.0, b)
+
+        det = A[:, 0, 0] * A[:, 1, 1] - A[:, 0, 1] * A[:, 1, 0]
+        det = np.where(np.abs(det) > 0, det, np.inf)
+        delta = np.stack([
+            (A[:, 1, 1] * b[:, 0] - A[:, 0, 1] * b[:, 1]) / det,
+            (A[:, 0, 0] * b[:, 1] - A[:, 1, 0] * b[:, 0]) / det,
+        ], axis=1)
+
+        theta_new = np.clip(theta + delta, lo, hi)
+        resid_new, J_new = residuals(theta_new)
+        sse_new = np.sum(resid_new ** 2, axis=1)
+
+        improved = active & np.isfinite(sse_new) & (sse_new < sse)
+        converged = active & (
+            (np.abs(sse - sse_new) <= tol * (1.0 + sse))
+            | (np.max(np.abs(theta_new - theta), axis=1) <= tol)
+        )
+
+        theta = np.where(improved[:, None], theta_new, theta)
+        sse = np.where(improved, sse_new, sse)
+        resid = np.where(improved[:, None], resid_new, resid)
+        J = np.where(improved[:, None, None], J_new, J)
+        lam = np.where(improved, lam / 3.0, lam * 2.0)
+        active &= ~converged & (lam < 1e12)
+
+    r_fit = np.where(valid, theta[:, 0], np.nan)
+    gamma_fit = np.where(valid, theta[:, 1], np.nan)
+    sse = np.where(valid & np.isfinite(sse), sse, np.nan)
+
+    return pd.DataFrame({'r_fit': r_fit, 'gamma_fit': gamma_fit, 'fit_sse': sse})
+
+
+def fit_cohort(df: pd.DataFrame, K: float, t=TIMES) -> pd.DataFrame:
+    """fit_cohort_vectorized по колонкам когорты (нужны tumor_size_*, treatment, new_molecular_subtype)"""
+    return fit_cohort_vectorized(
+        V0=df['tumor_size_before'].to_numpy(dtype=float),
+        V_obs=df[TUMOR_SIZE_COLS].to_numpy(dtype=float),
+        base_eff=treatment_effect_coeffs(df['treatment'], df['new_molecular_subtype']),
+        K=K,
+        t=t,
+    )
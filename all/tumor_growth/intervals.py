@@ -0,0 +1,136 @@
+"""
+Интервалы прогноза: распределения остатков r и gamma из meta модели
+и Монте-Карло по ним (IntervalSampler). Только numpy – модуль
+импортируется воркерами API вместе со скомпилированной моделью r.
+"""
+import threading
+from statistics import NormalDist
+from typing import Optional, Sequence
+
+import numpy as np
+
+from .dynamics import R_BOUNDS, gompertz_treated_exact
+
+# интервалы прогноза (Монте-Карло по неопределённости r, gamma и base_eff)
+INTERVAL_PERCENTILES = (5.0, 50.0, 95.0)
+INTERVAL_SAMPLES = 1000
+QUANTILE_POINTS = 101  # распределения хранятся в meta квантилями 0%, 1%, ..., 100%
+MIN_SUBTYPE_FITS = 30  # меньше подгонок в подтипе – gamma берётся по всей когорте
+BASE_EFF_LOG_SD = 0.2  # разброс base_eff вокруг табличного значения (логнормальный)
+
+
+def distribution_quantiles(values) -> list:
+    """Эмпирическое распределение в виде QUANTILE_POINTS квантилей (для meta)"""
+    return np.quantile(np.asarray(values, dtype=float), np.linspace(0.0, 1.0, QUANTILE_POINTS)).tolist()
+
+
+def interval_meta(df_train_r, r_residual_quantiles: Sequence[float]) -> dict:
+    """
+    Поля meta для интервалов прогноза: остатки CatBoost для r на валидации
+    и распределение подогнанной gamma (по всей когорте и по подтипам).
+    """
+    meta = {
+        'r_residual_quantiles': list(r_residual_quantiles),
+        'gamma_quantiles': distribution_quantiles(df_train_r['gamma_fit']),
+        'gamma_quantiles_by_subtype': {},
+        'base_eff_log_sd': BASE_EFF_LOG_SD,
+    }
+    if 'molecular_subtype' in df_train_r.columns:
+        for subtype, gamma in df_train_r.groupby('molecular_subtype')['gamma_fit']:
+            if len(gamma) >= MIN_SUBTYPE_FITS:
+                meta['gamma_quantiles_by_subtype'][str(subtype)] = distribution_quantiles(gamma)
+    return meta
+
+
+_ndtri = np.vectorize(NormalDist().inv_cdf, otypes=[float])
+
+
+class IntervalSampler:
+    """
+    Интервалы прогноза методом Монте-Карло, одной операцией numpy над
+    матрицей (время × выборки).
+
+    Выборка не зависит от пациентки: остаток r (eps), gamma и множитель
+    base_eff берутся один раз (латинский гиперкуб, фиксированный seed),
+    поэтому интервалы воспроизводимы. В логарифме точного решения
+      u(t) = ln K + (ln V0 - ln K)·exp(-r·t) - base_eff·(exp(-gamma·t) - exp(-r·t)) / (r - gamma)
+    при r = r_est + eps множитель exp(-r·t) = exp(-r_est·t)·exp(-eps·t), так что
+    exp(-eps·t) и exp(-gamma·t) считаются один раз на сетку времени, а на запрос
+    остаются умножения и сортировка. Квантили считаются для u – exp монотонна.
+    """
+
+    def __init__(self, meta: dict, n_samples: int = INTERVAL_SAMPLES, seed: int = 0):
+        if 'r_residual_quantiles' not in meta:
+            raise ValueError('В meta нет распределений для интервалов: переобучите модель')
+
+        self.n_samples = n_samples
+        rng = np.random.default_rng(seed)
+
+        def stratified():
+            # латинский гиперкуб по одной координате: по точке в каждой из n_samples полос
+            return (rng.permutation(n_samples) + rng.random(n_samples)) / n_samples
+
+        grid = np.linspace(0.0, 1.0, QUANTILE_POINTS)
+        self.eps = np.interp(stratified(), grid, meta['r_residual_quantiles'])
+        u_gamma = stratified()
+        self.gamma = {None: np.interp(u_gamma, grid, meta['gamma_quantiles'])}
+        for subtype, quantiles in meta.get('gamma_quantiles_by_subtype', {}).items():
+            # те же u для всех подтипов – интервалы разных подтипов сравнимы
+            self.gamma[subtype] = np.interp(u_gamma, grid, quantiles)
+        self.eff_factor = np.exp(meta.get('base_eff_log_sd', BASE_EFF_LOG_SD) * _ndtri(stratified()))
+
+        self._grids = {}
+        self._lock = threading.Lock()
+
+    def _matrices(self, t_grid: np.ndarray, subtype) -> tuple:
+        """exp(-eps·t) и exp(-gamma·t) для сетки (float32), кэш на сетку и подтип"""
+        key = (t_grid.tobytes(), subtype)
+        with self._lock:
+            cached = self._grids.get(key)
+        if cached is None:
+            t = t_grid[:, None]
+            cached = (
+                np.exp(-t * self.eps[None, :]).astype(np.float32),
+                np.exp(-t * self.gamma[subtype][None, :]).astype(np.float32),
+            )
+            with self._lock:
+                if len(self._grids) >= 32:
+                    self._grids.clear()
+                self._grids[key] = cached
+        return cached
+
+    def intervals(self, t_grid: Sequence[float], V0: float, r_est: float, K: float, base_eff: float,
+                  subtype: Optional[str] = None,
+                  percentiles: Sequence[float] = INTERVAL_PERCENTILES) -> np.ndarray:
+        """Кривые-перцентили размера опухоли, форма (len(percentiles), len(t_grid))"""
+        t_grid = np.asarray(t_grid, dtype=float)
+        if subtype not in self.gamma:
+            subtype = None
+        E_eps, E_gamma = self._matrices(t_grid, subtype)
+        gamma = self.gamma[subtype]
+
+        r = r_est + self.eps
+        d = r - gamma
+        log_ratio = np.log(V0) - np.log(K)
+        # r вне границ подгонки и r ≈ gamma (деление близких чисел во float32) – точная формула
+        exact = (r < R_BOUNDS[0]) | (r > R_BOUNDS[1]) | (np.abs(d) < 1e-3)
+        coeff = base_eff * self.eff_factor / np.where(exact, 1.0, d)
+
+        e_r = E_eps * np.float32(np.exp(-r_est * t_grid))[:, None]
+        u = e_r * (np.float32(log_ratio) + coeff.astype(np.float32))
+        u -= E_gamma * coeff.astype(np.float32)
+
+        if exact.any():
+            V_exact = gompertz_treated_exact(
+                t_grid[:, None], V0, np.clip(r[exact], *R_BOUNDS), K,
+                base_eff * self.eff_factor[exact], gamma[exact]
+            )
+            u[:, exact] = np.log(V_exact) - np.log(K)
+
+        u.sort(axis=1)
+        positions = np.asarray(percentiles, dtype=float) / 100.0 * (self.n_samples - 1)
+        lower = np.floor(positions).astype(int)
+        upper = np.minimum(lower + 1, self.n_samples - 1)
+        weight = positions - lower
+        q = u[:, lower] * (1.0 - weight) + u[:, upper] * weight
+        return np.exp(np.log(K) + q.T.astype(float))
@@ -0,0 +1,64 @@
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .dynamics import add_molecular_subtype, gompertz_treated_exact, treatment_effect_coeffs
+
+
+def feature_frame(patients: pd.DataFrame, feature_cols: Sequence[str],
+                  cat_features_idx: Sequence[int]) -> pd.DataFrame:
+    """Признаки модели: категориальные – строки, остальные – float"""
+    X = pd.DataFrame(index=patients.index)
+    for i, col in enumerate(feature_cols):
+        X[col] = patients[col].astype(str).astype(object) if i in cat_features_idx else patients[col].astype(float)
+    return X
+
+
+def predict_patients(patients,
+                     model_r,
+                     meta: dict,
+                     t_grid: Optional[Sequence[float]] = None,
+                     t_end: float = 36.0,
+                     dt: float = 0.25):
+    """
+    Пакетный прогноз динамики опухоли для пациенток без истории роста:
+    r – одним вызовом model_r (CatBoost или скомпилированная модель из
+    artifacts.load_model), траектории – точным решением для матрицы
+    (пациентки × время). Возвращает (t_grid, V_pred формы (N, T), DataFrame параметров).
+    """
+    X = patients if isinstance(patients, pd.DataFrame) else pd.DataFrame(list(patients))
+    if 'new_molecular_subtype' not in X.columns and 'er_status' in X.columns:
+        X = add_molecular_subtype(X)
+
+    if t_grid is None:
+        t_grid = np.arange(0.0, t_end + dt, dt)
+    t_grid = np.asarray(t_grid, dtype=float)
+
+    K = float(meta['K_global'])
+    gamma_global = float(meta['gamma_global'])
+    gamma_by_subtype = meta.get('gamma_by_subtype', {})
+
+    r_est = np.asarray(model_r.predict(
+        feature_frame(X, meta['feature_cols'], meta['cat_features_idx'])
+    ), dtype=float)
+    base_eff = treatment_effect_coeffs(X['treatment'], X['new_molecular_subtype'])
+    if 'molecular_subtype' in X.columns:
+        gamma_est = X['molecular_subtype'].map(gamma_by_subtype).fillna(gamma_global).to_numpy(dtype=float)
+    else:
+        gamma_est = np.full(len(X), gamma_global)
+    V0 = X['tumor_size_before'].to_numpy(dtype=float)
+
+    V_pred = gompertz_treated_exact(
+        t_grid[None, :], V0[:, None], r_est[:, None], K,
+        base_eff[:, None], gamma_est[:, None]
+    )
+
+    params = pd.DataFrame({
+        'r_est': r_est,
+        'K': K,
+        'base_eff': base_eff,
+        'gamma_est': gamma_est,
+    }, index=X.index)
+
+    return t_grid, V_pred, params
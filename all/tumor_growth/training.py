@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from catboost import CatBoostRegressor, Pool
+from sklearn.metrics import mean_squared_error, r2_score
+from sklearn.model_selection import train_test_split
+
+from .artifacts import MODEL_FILE, META_FILE
+from .compiled import COMPILED_FILE, compile_model
+from .dynamics import TIMES
+from .intervals import distribution_quantiles, interval_meta
+
+# признаки для предсказания r (используются те, что есть в когорте)
+PATIENT_FEATURES = [
+    'tumor_size_before',
+    'age',
+    'ki67_level',
+    'tumor_grade',
+    'molecular_subtype',
+    'brca_mutation',
+    'family_history',
+    'performance_status',
+    'menopausal_status',
+]
+
+RMSE_THRESHOLD = 1.0  # см
+
+
+def select_training_rows(df: pd.DataFrame, fits: pd.DataFrame,
+                         rmse_threshold: float = RMSE_THRESHOLD, t=TIMES) -> pd.DataFrame:
+    """Когорта вместе с подгонками; только пациентки с хорошей подгонкой (RMSE < порога)"""
+    df = df.join(fits)
+    df['fit_rmse'] = np.sqrt(df['fit_sse'] / len(t))
+    return (
+        df[df['fit_rmse'] < rmse_threshold]
+        .dropna(subset=['r_fit', 'gamma_fit'])
+        .reset_index(drop=True)
+    )
+
+
+def train_model_r(df_train_r: pd.DataFrame, features: Sequence[str] = PATIENT_FEATURES) -> tuple:
+    """
+    CatBoost для r по признакам пациентки (как в ноутбуке).
+    Возвращает (model_r, feature_cols, cat_features_idx, X_train, метрики на валидации).
+    В метриках r_residual_quantiles – распределение остатков r на валидации
+    для интервалов прогноза (export_model).
+    """
+    feature_cols = [col for col in features if col in df_train_r.columns]
+
+    X_r = df_train_r[feature_cols].copy()
+    # строковые dtype pandas CatBoost не принимает – как после read_csv, object
+    for col in feature_cols:
+        if pd.api.types.is_string_dtype(X_r[col]):
+            X_r[col] = X_r[col].astype(object)
+    y_r = df_train_r['r_fit'].copy()
+
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_r,
+        y_r,
+        test_size=0.2,
+        random_state=42,
+    )
+
+    cat_features_idx = [
+        i for i, col in enumerate(feature_cols)
+        if X_r[col].dtype == 'object'
+           or str(X_r[col].dtype).startswith('category')
+           or X_r[col].dtype == bool
+    ]
+
+    train_pool = Pool(X_train, y_train, cat_features=cat_features_idx)
+    val_pool = Pool(X_val, y_val, cat_features=cat_features_idx)
+
+    model_r = CatBoostRegressor(
+        loss_function='RMSE',
+        depth=4,
+        learning_rate=0.05,
+        iterations=400,
+        random_seed=42,
+        verbose=False,
+        # без catboost_info/ в текущей папке: кривые обучения не нужны,
+        # а параллельные запуски train не пишут в один каталог
+        allow_writing_files=False
+    )
+    model_r.fit(train_pool, eval_set=val_pool, verbose=False)
+
+    y_val_pred = model_r.predict(val_pool)
+    metrics = {
+        'rmse_val': float(np.sqrt(mean_squared_error(y_val, y_val_pred))),
+        'r2_val': float(r2_score(y_val, y_val_pred)),
+        'n_train': int(len(X_train)),
+        'n_val': int(len(X_val)),
+        'r_residual_quantiles': distribution_quantiles(y_val - y_val_pred),
+    }
+    return model_r, feature_cols, cat_features_idx, X_train, metrics
+
+
+def export_model(model_dir: str,
+                 model_r: CatBoostRegressor,
+                 feature_cols: Sequence[str],
+                 cat_features_idx: Sequence[int],
+                 K: float,
+                 df_train_r: pd.DataFrame,
+                 X_train: pd.DataFrame,
+                 r_residual_quantiles: Optional[Sequence[float]] = None) -> str:
+    """
+    Сохранение артефактов для API (model_service.TumorModel.load):
+    model_r.cbm, model_meta.json и model_r.npz – деревья для воркеров без
+    CatBoost, сверенные с model_r.predict на X_train. Версия – хэш файла модели.
+    С r_residual_quantiles (из метрик train_model_r) в meta попадают
+    распределения для интервалов прогноза.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+
+    model_path = os.path.join(model_dir, MODEL_FILE)
+    model_r.save_model(model_path)
+
+    with open(model_path, 'rb') as f:
+        model_version = hashlib.sha256(f.read()).hexdigest()[:12]
+
+    model_meta = {
+        'version': model_version,
+        'feature_cols': list(feature_cols),
+        'cat_features_idx': list(cat_features_idx),
+        'K_global': float(K),
+        'gamma_global': float(df_train_r['gamma_fit'].mean()),
+        'gamma_by_subtype': (
+            df_train_r.groupby('molecular_subtype')['gamma_fit'].mean().astype(float).to_dict()
+            if 'molecular_subtype' in df_train_r.columns else {}
+        ),
+        # строка для прогрева модели при старте сервера
+        'example_patient': json.loads(X_train.iloc[[0]].to_json(orient='records'))[0],
+    }
+    if r_residual_quantiles is not None:
+        model_meta.update(interval_meta(df_train_r, r_residual_quantiles))
+
+    compile_model(model_r, os.path.join(model_dir, COMPILED_FILE), version=model_version, check_rows=X_train)
+
+    with open(os.path.join(model_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(model_meta, f, ensure_ascii=False, indent=2)
+
+    return model_version
@@ -0,0 +1,189 @@
+"""
+Ряды измерений опухоли с произвольными датами визитов.
+
+По строке на пациента в tumor_series: даты (дни от 1970-01-01, по
+возрастанию) и размеры – упакованные массивы float64 little-endian в BLOB.
+Вся история читается одним поиском по первичному ключу, диапазон дат –
+бинарным поиском в распакованном массиве; пачка новых точек дописывается
+одной транзакцией – чтение и перезапись одной строки на пациента.
+"""
+import math
+import sqlite3
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+# месяц для сетки модели роста (t в месяцах от первого измерения)
+DAYS_PER_MONTH = 30.44
+
+# SQLite ограничивает число параметров запроса
+SELECT_CHUNK_SIZE = 500
+
+_EPOCH = datetime(1970, 1, 1)
+
+SERIES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS tumor_series (
+        patient_code TEXT PRIMARY KEY,
+        n INTEGER NOT NULL,
+        first_day REAL NOT NULL,
+        last_day REAL NOT NULL,
+        days BLOB NOT NULL,
+        sizes BLOB NOT NULL,
+        FOREIGN KEY (patient_code) REFERENCES patients(patient_code) ON DELETE CASCADE
+    ) WITHOUT ROWID;
+
+    CREATE INDEX IF NOT EXISTS idx_tumor_series_span ON tumor_series(last_day, first_day);
+'''
+
+SERIES_UPSERT_SQL = '''
+    INSERT OR REPLACE INTO tumor_series (patient_code, n, first_day, last_day, days, sizes)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+
+def pack(values) -> bytes:
+    packed = array('d', values)
+    if sys.byteorder != 'little':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack(blob: bytes) -> array:
+    values = array('d')
+    values.frombytes(blob)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def to_day(value) -> float:
+    """Дата визита (date, datetime или ISO-строка) в днях от 1970-01-01; время суток – дробная часть"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return (value - _EPOCH).total_seconds() / 86400.0
+    if isinstance(value, date):
+        return float((value - _EPOCH.date()).days)
+    raise ValueError(f'Некорректная дата измерения: {value!r}')
+
+
+def day_to_iso(day: float) -> str:
+    """'YYYY-MM-DD' для целых дней, иначе 'YYYY-MM-DDTHH:MM:SS'"""
+    if day == int(day):
+        return (_EPOCH.date() + timedelta(days=int(day))).isoformat()
+    return (_EPOCH + timedelta(days=day)).isoformat(timespec='seconds')
+
+
+def today() -> str:
+    """Дата по UTC, как CURRENT_DATE в SQLite"""
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def measurement_point(measurement: Dict) -> Tuple[float, float]:
+    """(день, размер) из {'measurement_date', 'tumor_size'}; ValueError для некорректных"""
+    day = to_day(measurement.get('measurement_date') or today())
+    size = float(measurement['tumor_size'])
+    if not (math.isfinite(size) and size > 0):
+        raise ValueError(f'Некорректный размер опухоли: {measurement["tumor_size"]!r}')
+    return day, size
+
+
+def merge_points(days: array, sizes: array, new: Dict[float, float],
+                 removed: Iterable[float] = ()) -> Tuple[array, array]:
+    """
+    Ряд с новыми точками (тот же день – размер заменяется) и без removed.
+    Визиты обычно новее последнего – тогда ряд просто дописывается.
+    """
+    removed = set(removed)
+    if not new and not removed:
+        return days, sizes
+    if not removed and (not days or min(new) > days[-1]):
+        order = sorted(new)
+        return days + array('d', order), sizes + array('d', (new[d] for d in order))
+
+    points = dict(zip(days, sizes))
+    for day in removed:
+        points.pop(day, None)
+    points.update(new)
+    order = sorted(points)
+    return array('d', order), array('d', (points[d] for d in order))
+
+
+def read_series(connection: sqlite3.Connection, patient_code: str) -> Optional[Tuple[array, array]]:
+    row = connection.execute(
+        'SELECT days, sizes FROM tumor_series WHERE patient_code = ?', (patient_code,)
+    ).fetchone()
+    if row is None:
+        return None
+    return unpack(row[0]), unpack(row[1])
+
+
+def append_points(connection: sqlite3.Connection, points: Dict[str, Dict[float, float]],
+                  removed: Optional[Dict[str, Iterable[float]]] = None) -> int:
+    """
+    Дописать точки {patient_code: {день: размер}} (и убрать removed) в текущей
+    транзакции: один SELECT на SELECT_CHUNK_SIZE пациентов и executemany.
+    Возвращает число записанных точек.
+    """
+    removed = removed or {}
+    codes = list(points)
+    stored = {}
+    for i in range(0, len(codes), SELECT_CHUNK_SIZE):
+        chunk = codes[i:i + SELECT_CHUNK_SIZE]
+        rows = connection.execute(
+            f"SELECT patient_code, days, sizes FROM tumor_series "
+            f"WHERE patient_code IN ({', '.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        stored.update((row[0], (unpack(row[1]), unpack(row[2]))) for row in rows)
+
+    rows, emptied = [], []
+    for code in codes:
+        days, sizes = stored.get(code, (array('d'), array('d')))
+        days, sizes = merge_points(days, sizes, points[code], removed.get(code, ()))
+        if days:
+            rows.append((code, len(days), days[0], days[-1], pack(days), pack(sizes)))
+        else:
+            emptied.append((code,))
+    connection.executemany(SERIES_UPSERT_SQL, rows)
+    connection.executemany('DELETE FROM tumor_series WHERE patient_code = ?', emptied)
+    return sum(len(p) for p in points.values())
+
+
+def series_slice(days: array, sizes: array, start: Optional[float] = None,
+                 end: Optional[float] = None) -> Tuple[array, array]:
+    """Точки с start <= день <= end (границы включительно, None – без границы)"""
+    lo = 0 if start is None else bisect_left(days, start)
+    hi = len(days) if end is None else bisect_right(days, end)
+    return days[lo:hi], sizes[lo:hi]
+
+
+def series_record(patient_code: str, days: array, sizes: array,
+                  start: Optional[float] = None, end: Optional[float] = None) -> Dict:
+    """
+    Ряд пациента для API: даты, размеры и месяцы от первого измерения всего
+    ряда – measurement_months и tumor_sizes принимают simulate_patient и fit_patient.
+    """
+    first = days[0]
+    days, sizes = series_slice(days, sizes, start, end)
+    return {
+        'patient_code': patient_code,
+        'measurement_dates': [day_to_iso(d) for d in days],
+        'measurement_months': [(d - first) / DAYS_PER_MONTH for d in days],
+        'tumor_sizes': list(sizes),
+    }
+
+
+def backfill_from_dynamics(connection: sqlite3.Connection):
+    """Миграция: ряды из уже записанных точек tumor_dynamics"""
+    points = {}
+    for code, measurement_date, size in connection.execute(
+            'SELECT patient_code, measurement_date, tumor_size FROM tumor_dynamics'):
+        try:
+            points.setdefault(code, {})[to_day(measurement_date)] = float(size)
+        except (TypeError, ValueError):
+            continue
+    append_points(connection, points)
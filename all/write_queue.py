@@ -0,0 +1,159 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Sequence
+
+from sqlite_pool import CONNECTION_PRAGMAS, TimedConnection
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Очередь записи с групповым коммитом (write-behind).
+
+    Запросы из любых потоков складываются в очередь, один поток-писатель
+    выполняет их пачкой в одной транзакции: до batch_size запросов или
+    всё, что пришло за flush_interval секунд после первого. Ошибка ограничения
+    (UNIQUE, CHECK) откатывает только свой оператор и достаётся только его Future.
+
+    submit() возвращает Future: он завершается после COMMIT пачки
+    (True или исключение sqlite3.Error). У писателя synchronous=FULL,
+    так что подтверждение означает запись на диск, а fsync делится
+    на всю пачку.
+    """
+
+    def __init__(self, db_name: str, batch_size: int = 256,
+                 flush_interval: float = 0.005, busy_timeout: float = 5.0):
+        self.db_name = db_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.busy_timeout = busy_timeout
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self._thread.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # транзакциями управляем сами (BEGIN/COMMIT), поэтому isolation_level=None
+        conn = sqlite3.connect(self.db_name, timeout=self.busy_timeout,
+                               isolation_level=None, check_same_thread=False,
+                               factory=TimedConnection)
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute('PRAGMA synchronous=FULL')
+        return conn
+
+    def submit(self, sql, params: Sequence = ()) -> Future:
+        """
+        Поставить запрос в очередь; Future завершится после коммита его пачки.
+        sql – текст запроса или функция f(connection, *params).
+        """
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Очередь записи закрыта')
+            self._queue.put((sql, params, future))
+        return future
+
+    def _next_batch(self) -> tuple:
+        """Пачка запросов и признак остановки"""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+
+        batch = [item]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        connection = self._connect()
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._next_batch()
+                if batch:
+                    self._flush(connection, batch)
+        finally:
+            connection.close()
+
+    def _flush(self, connection: sqlite3.Connection, batch: list):
+        outcomes = []
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            for sql, params, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if callable(sql):
+                    outcomes.append((future, self._call(connection, sql, params)))
+                    continue
+                try:
+                    connection.execute(sql, params)
+                    outcomes.append((future, None))
+                except sqlite3.Error as e:
+                    # нарушение ограничения откатывает только этот оператор;
+                    # если SQLite откатил всю транзакцию – пачка не записана
+                    if not connection.in_transaction:
+                        raise
+                    outcomes.append((future, e))
+            connection.execute('COMMIT')
+        except Exception as e:
+            # пачка не записана целиком (BEGIN не прошёл, SQLite откатил транзакцию,
+            # не-sqlite ошибка в _call) – ошибку получают все её запросы,
+            # в том числе ещё не начатые: иначе их .result() ждал бы вечно
+            if connection.in_transaction:
+                try:
+                    connection.execute('ROLLBACK')
+                except sqlite3.Error:
+                    pass
+            for _, _, future in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(e)
+            return
+
+        for future, error in outcomes:
+            if error is None:
+                future.set_result(True)
+            else:
+                future.set_exception(error)
+
+    @staticmethod
+    def _call(connection: sqlite3.Connection, func, params: Sequence) -> Optional[Exception]:
+        """Запись из нескольких операторов: ошибка откатывает их все (до точки сохранения)"""
+        connection.execute('SAVEPOINT write_call')
+        try:
+            func(connection, *params)
+        except Exception as e:
+            if not connection.in_transaction:
+                raise
+            connection.execute('ROLLBACK TO write_call')
+            connection.execute('RELEASE write_call')
+            return e
+        connection.execute('RELEASE write_call')
+        return None
+
+    def close(self):
+        """Дописать всё, что уже в очереди, и остановить писателя"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()